@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Random Forest inference benchmark for Berlin landmarks
+Compares sklearn's predict_proba with the array-backed forest engine
+over batch sizes from 1 to 4096, and checks that both agree exactly.
+"""
+
+import os
+import json
+import time
+import pickle
+import argparse
+import tempfile
+import numpy as np
+from features import extract_features, load_image_array
+from forest_model import export_forest, load_forest
+from pack_dataset import find_processed_images
+
+BATCH_SIZES = [1, 4, 16, 64, 256, 1024, 4096]
+MIN_SECONDS = 0.5
+
+def time_call(fn, X):
+    """Best-of-repeats seconds per call, repeating for at least MIN_SECONDS."""
+    fn(X)  # warm-up
+    timings = []
+    deadline = time.perf_counter() + MIN_SECONDS
+    while len(timings) < 3 or time.perf_counter() < deadline:
+        start_time = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+def load_features(model, data_dir, limit=512):
+    """Feature vectors of real processed images, as the model expects them."""
+    spec = getattr(model, 'feature_spec_', {"name": "raw", "img_size": 224})
+    samples, _ = find_processed_images(data_dir, spec["img_size"])
+    images = np.stack([load_image_array(path, spec["img_size"]) for path, _ in samples[:limit]])
+    return extract_features(images, spec["name"])
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Benchmark sklearn vs array-backed Random Forest inference.")
+    parser.add_argument('--model', default='berlin_landmarks_model.pkl',
+                        help="pickled Random Forest (default: berlin_landmarks_model.pkl)")
+    parser.add_argument('--data-dir', default=".",
+                        help="folder containing the *_processed folders (default: .)")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=BATCH_SIZES,
+                        help="batch sizes to measure (default: 1 4 16 ... 4096)")
+    parser.add_argument('--output', help="also write the results as JSON")
+    return parser.parse_args()
+
+def main():
+    """Run the benchmark."""
+    args = parse_args()
+
+    print("🌲 Random Forest Inference Benchmark")
+    print("=" * 50)
+
+    if not os.path.exists(args.model):
+        print(f"❌ Error: {args.model} not found!")
+        return
+
+    with open(args.model, 'rb') as f:
+        model = pickle.load(f)
+    # Tree order accumulation, the reference the engine matches exactly
+    model.n_jobs = 1
+
+    # Export to a scratch location so an existing .forest is left untouched
+    scratch = tempfile.TemporaryDirectory()
+    forest_path = os.path.join(scratch.name, 'model.forest')
+    export_forest(model, forest_path, [str(c) for c in model.classes_])
+    forest = load_forest(forest_path)
+
+    features = load_features(model, args.data_dir)
+    rng = np.random.default_rng(0)
+
+    print(f"Trees: {len(forest.root)}, nodes: {len(forest.feature)}, features: {features.shape[1]}")
+    print(f"\n{'Batch':>6} {'sklearn img/s':>14} {'engine img/s':>13} {'Speedup':>8} {'Exact':>6}")
+
+    results = []
+    for batch_size in args.batch_sizes:
+        X = features[rng.integers(0, len(features), batch_size)]
+
+        exact = bool(np.array_equal(model.predict_proba(X), forest.predict_proba(X)))
+        sklearn_time = time_call(model.predict_proba, X)
+        engine_time = time_call(forest.predict_proba, X)
+
+        result = {
+            "batch_size": batch_size,
+            "sklearn_images_per_sec": batch_size / sklearn_time,
+            "engine_images_per_sec": batch_size / engine_time,
+            "speedup": sklearn_time / engine_time,
+            "exact": exact,
+        }
+        results.append(result)
+        print(f"{batch_size:>6} {result['sklearn_images_per_sec']:>14.1f} {result['engine_images_per_sec']:>13.1f} "
+              f"{result['speedup']:>7.2f}x {'✅' if exact else '❌':>5}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📁 Results saved as: {args.output}")
+
+    del forest
+    scratch.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Cross-backend benchmark suite for Berlin landmarks models
+Runs the pickled Random Forest, its .forest export, the Keras model, the
+TFLite model and the retrieval index over the same held-out images and
+compares load time, latency, throughput, peak memory, artifact size and
+accuracy against a stored baseline.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from queue import Empty
+import numpy as np
+from memory_usage import peak_rss_mb
+
+BACKENDS = {
+    "random_forest": "berlin_landmarks_model.pkl",
+    "forest": "berlin_landmarks_model.forest",
+    "keras": "berlin_landmarks_model.h5",
+    "tflite": "berlin_landmarks_model.tflite",
+    "retrieval": "landmark_index",
+}
+BASELINE_PATH = "benchmark_baseline.json"
+EVAL_SAMPLES = 200
+LATENCY_SAMPLES = 50
+BATCH_SIZE = 32
+WARMUP = 3
+# Longest a backend may run before it is stopped and reported as failed
+BACKEND_TIMEOUT = 600
+RESULT_POLL_S = 1.0
+
+# Allowed change against the baseline before a run counts as a regression
+MAX_SLOWDOWN = 0.20
+MAX_MEMORY_GROWTH = 0.10
+MAX_ACCURACY_DROP = 0.01
+
+# (metric, higher is better, limit kind)
+METRICS = [
+    ("load_s", False, "slowdown"),
+    ("latency_p50_ms", False, "slowdown"),
+    ("throughput_img_s", True, "slowdown"),
+    ("peak_rss_mb", False, "memory"),
+    ("size_mb", False, "memory"),
+    ("accuracy", True, "accuracy"),
+]
+
+def artifact_size(model_path):
+    """Size on disk in MB (both files for a .forest export, every file of an index folder)."""
+    if model_path.endswith('.forest'):
+        return sum(os.path.getsize(model_path + ext) for ext in ('.json', '.bin')) / (1024 * 1024)
+    if os.path.isdir(model_path):
+        return sum(entry.stat().st_size for entry in os.scandir(model_path) if entry.is_file()) / (1024 * 1024)
+    return os.path.getsize(model_path) / (1024 * 1024)
+
+def artifact_exists(model_path):
+    """Whether a model file (or .forest export) is present."""
+    return os.path.exists(model_path + '.json' if model_path.endswith('.forest') else model_path)
+
+def benchmark_backend(model_path, labels_path, image_paths, true_labels,
+                      batch_size=BATCH_SIZE, latency_samples=LATENCY_SAMPLES):
+    """Measure one backend; meant to run in a fresh process.
+
+    Load time includes importing the backend's libraries, since that is
+    part of what a cold start pays.
+    """
+    from features import load_image_array
+
+    start_time = time.perf_counter()
+    from serve import load_backend
+    backend = load_backend(model_path, labels_path, num_threads=None)
+    load_time = time.perf_counter() - start_time
+
+    images = np.stack([load_image_array(path, backend.img_size) for path in image_paths])
+
+    # Per-image latency
+    for image in images[:WARMUP]:
+        backend.predict(image[np.newaxis], 1)
+    timings = []
+    for image in images[:latency_samples]:
+        start_time = time.perf_counter()
+        backend.predict(image[np.newaxis], 1)
+        timings.append(time.perf_counter() - start_time)
+    timings = np.array(timings) * 1000
+
+    # Batch throughput, which also gives the predictions for accuracy
+    predictions = []
+    start_time = time.perf_counter()
+    for start in range(0, len(images), batch_size):
+        predictions.extend(result[0][0] for result in backend.predict(images[start:start + batch_size], 1))
+    batch_time = time.perf_counter() - start_time
+
+    return {
+        "load_s": load_time,
+        "latency_p50_ms": float(np.percentile(timings, 50)),
+        "latency_p99_ms": float(np.percentile(timings, 99)),
+        "throughput_img_s": len(images) / batch_time,
+        "peak_rss_mb": peak_rss_mb(),
+        "size_mb": artifact_size(model_path),
+        "accuracy": float(np.mean(np.array(predictions) == np.array(true_labels))),
+    }
+
+def _run_isolated(queue, *args):
+    try:
+        queue.put(benchmark_backend(*args))
+    except Exception as e:
+        queue.put({"error": str(e)})
+
+def run_isolated(*args, timeout=BACKEND_TIMEOUT):
+    """Run benchmark_backend in a new interpreter so RSS and load time are not shared.
+
+    A child that crashes (or is OOM-killed) before reporting, or that runs
+    longer than `timeout` seconds, gives an error result instead of a hang.
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_isolated, args=(queue, *args))
+    process.start()
+    deadline = time.monotonic() + timeout
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=RESULT_POLL_S)
+        except Empty:
+            if not process.is_alive():
+                # A result put right before exiting may still be in the pipe
+                try:
+                    result = queue.get(timeout=RESULT_POLL_S)
+                except Empty:
+                    result = {"error": f"benchmark process exited with code {process.exitcode} without a result"}
+            elif time.monotonic() > deadline:
+                process.kill()
+                result = {"error": f"no result within {timeout:g}s"}
+    process.join()
+    return result
+
+def load_eval_images(data_dir, labels_path, count=EVAL_SAMPLES):
+    """Held-out test images (the trainers' split) and their label names."""
+    from pack_dataset import load_split_images
+
+    with open(labels_path, 'r') as f:
+        labels = [line.strip().split(': ')[1] for line in f]
+    _, test_paths, y_test = load_split_images(data_dir)
+    return test_paths[:count], [labels[i] for i in y_test[:count]]
+
+def find_regressions(results, baseline, limits, backends=BACKENDS):
+    """List of (backend, metric, baseline, current) that exceed the limits.
+
+    A backend that failed counts as an "error" regression, and one of
+    `backends` that the baseline has but this run lacks as "missing".
+    """
+    regressions = []
+    for name in backends:
+        if name in baseline and name not in results:
+            regressions.append((name, "missing", None, None))
+    for name, current in results.items():
+        if "error" in current:
+            regressions.append((name, "error", None, current["error"]))
+            continue
+        previous = baseline.get(name)
+        if not previous or "error" in previous:
+            continue
+        for metric, higher_is_better, kind in METRICS:
+            old, new = previous[metric], current[metric]
+            if kind == "accuracy":
+                regressed = old - new > limits[kind]
+            elif higher_is_better:
+                regressed = new < old * (1 - limits[kind])
+            else:
+                regressed = new > old * (1 + limits[kind])
+            if regressed:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+def format_regression(name, metric, old, new):
+    """One line of the regression report."""
+    if metric == "error":
+        return f"{name}: failed: {new}"
+    if metric == "missing":
+        return f"{name}: in the baseline but not benchmarked ({BACKENDS[name]} not found)"
+    return f"{name}: {metric} {old:.4g} -> {new:.4g}"
+
+def print_table(results):
+    """Side-by-side table of all measured backends."""
+    print(f"\n{'Backend':<14} {'Load s':>7} {'p50 ms':>8} {'p99 ms':>8} {'img/s':>8} "
+          f"{'RSS MB':>8} {'Size MB':>8} {'Acc':>7}")
+    for name, r in results.items():
+        if "error" in r:
+            print(f"{name:<14} ❌ {r['error']}")
+            continue
+        print(f"{name:<14} {r['load_s']:>7.2f} {r['latency_p50_ms']:>8.2f} {r['latency_p99_ms']:>8.2f} "
+              f"{r['throughput_img_s']:>8.1f} {r['peak_rss_mb']:>8.0f} {r['size_mb']:>8.2f} {r['accuracy']:>7.2%}")
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Benchmark every Berlin landmarks backend and check for regressions.")
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), default=list(BACKENDS),
+                        help="backends to run (default: all whose model file exists)")
+    parser.add_argument('--data-dir', default=".",
+                        help="folder containing the *_processed folders (default: .)")
+    parser.add_argument('--labels', default='landmark_labels.txt',
+                        help="label mapping (default: landmark_labels.txt)")
+    parser.add_argument('--samples', type=int, default=EVAL_SAMPLES,
+                        help=f"held-out images to run (default: {EVAL_SAMPLES})")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f"batch size for the throughput run (default: {BATCH_SIZE})")
+    parser.add_argument('--baseline', default=BASELINE_PATH,
+                        help=f"baseline results to compare against (default: {BASELINE_PATH})")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="store this run as the new baseline instead of comparing")
+    parser.add_argument('--max-slowdown', type=float, default=MAX_SLOWDOWN,
+                        help=f"allowed relative loss in load time, latency or throughput (default: {MAX_SLOWDOWN})")
+    parser.add_argument('--max-memory-growth', type=float, default=MAX_MEMORY_GROWTH,
+                        help=f"allowed relative growth of peak RSS and size (default: {MAX_MEMORY_GROWTH})")
+    parser.add_argument('--max-accuracy-drop', type=float, default=MAX_ACCURACY_DROP,
+                        help=f"allowed absolute accuracy drop (default: {MAX_ACCURACY_DROP})")
+    parser.add_argument('--timeout', type=float, default=BACKEND_TIMEOUT,
+                        help=f"seconds a backend may take before it counts as failed (default: {BACKEND_TIMEOUT})")
+    parser.add_argument('--output', help="also write this run's results as JSON")
+    return parser.parse_args()
+
+def main():
+    """Run the benchmark suite."""
+    args = parse_args()
+
+    print("📊 Berlin Landmarks Backend Benchmark")
+    print("=" * 50)
+
+    image_paths, true_labels = load_eval_images(args.data_dir, args.labels, args.samples)
+    if not image_paths:
+        print("❌ Error: no *_processed images found!")
+        sys.exit(1)
+    print(f"📸 {len(image_paths)} held-out images")
+
+    results = {}
+    for name in args.backends:
+        model_path = BACKENDS[name]
+        if not artifact_exists(model_path):
+            print(f"⏭️  Skipping {name}: {model_path} not found")
+            continue
+        print(f"⏱️  Benchmarking {name} ({model_path})...")
+        results[name] = run_isolated(model_path, args.labels, image_paths, true_labels,
+                                     args.batch_size, min(LATENCY_SAMPLES, len(image_paths)), timeout=args.timeout)
+
+    print_table(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📁 Baseline saved as: {args.baseline}")
+        return
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    limits = {
+        "slowdown": args.max_slowdown,
+        "memory": args.max_memory_growth,
+        "accuracy": args.max_accuracy_drop,
+    }
+    regressions = find_regressions(results, baseline, limits, args.backends)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) against {args.baseline}:")
+        for regression in regressions:
+            print(f"  {format_regression(*regression)}")
+        sys.exit(1)
+    print(f"\n✅ No regressions against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
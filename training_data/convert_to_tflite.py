@@ -1,18 +1,68 @@
 #!/usr/bin/env python3
 """
 Convert TensorFlow model to TensorFlow Lite for mobile deployment
+Supports float16 weights, dynamic-range and full-integer int8 quantization,
+and checks every conversion against the Keras model on held-out images.
 """
 
-import tensorflow as tf
 import numpy as np
 import os
+import sys
+import json
+import time
+import argparse
+from features import load_image_array
+from pack_dataset import load_split_images
+import tracing
 
-def convert_to_tflite(model_path, output_path):
+IMG_SIZE = 224
+REPRESENTATIVE_SAMPLES = 200
+EVAL_SAMPLES = 500
+MIN_AGREEMENT = 0.98
+BENCHMARK_THREADS = [1, 2, 4]
+BENCHMARK_BATCH_SIZES = [1, 4, 16]
+BENCHMARK_WARMUP = 5
+BENCHMARK_ITERATIONS = 50
+BENCHMARK_PATH = "tflite_benchmark.json"
+
+QUANTIZATION_MODES = {
+    "float16": "Quantized (FP16)",
+    "dynamic": "Dynamic range (INT8 weights)",
+    "int8": "Full integer (INT8)",
+}
+
+def representative_dataset(image_paths, img_size=IMG_SIZE, count=REPRESENTATIVE_SAMPLES):
+    """Calibration inputs for int8 conversion, preprocessed like training."""
+    rng = np.random.default_rng(42)
+    chosen = rng.permutation(len(image_paths))[:count]
+    
+    def generator():
+        for i in chosen:
+            image = load_image_array(image_paths[i], img_size).astype(np.float32) / 255.0
+            yield [image[np.newaxis]]
+    
+    return generator
+
+def model_input_size(model_path):
+    """Square input resolution a saved Keras model was trained at."""
+    import tensorflow as tf
+    
+    model = tf.keras.models.load_model(model_path, compile=False)
+    return int(model.input_shape[1])
+
+def convert_to_tflite(model_path, output_path, quantization="float16", calibration_paths=None,
+                      representative_samples=REPRESENTATIVE_SAMPLES, img_size=None):
     """Convert TensorFlow model to TensorFlow Lite."""
-    print(f"🔄 Converting {model_path} to TensorFlow Lite...")
+    import tensorflow as tf
+    
+    print(f"🔄 Converting {model_path} to TensorFlow Lite ({quantization})...")
     
     # Load the trained model
-    model = tf.keras.models.load_model(model_path)
+    with tracing.span("load_model"):
+        model = tf.keras.models.load_model(model_path)
+    if img_size is not None and model.input_shape[1] != img_size:
+        raise ValueError(f"{model_path} takes {model.input_shape[1]}x{model.input_shape[2]} input, not "
+                         f"{img_size}x{img_size}; retrain with train_model.py --img-size {img_size}")
     
     # Create TensorFlow Lite converter
     converter = tf.lite.TFLiteConverter.from_keras_model(model)
@@ -20,15 +70,30 @@ def convert_to_tflite(model_path, output_path):
     # Set optimization flags for mobile deployment
     converter.optimizations = [tf.lite.Optimize.DEFAULT]
     
-    # Enable quantization for smaller model size
-    converter.target_spec.supported_types = [tf.float16]
+    if quantization == "float16":
+        # Enable quantization for smaller model size
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        # Full integer: calibrate activation ranges on real processed images,
+        # and take uint8 pixels in / uint8 scores out
+        if not calibration_paths:
+            raise ValueError("int8 quantization needs *_processed images for calibration")
+        converter.representative_dataset = representative_dataset(
+            calibration_paths, model.input_shape[1], representative_samples
+        )
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+        converter.inference_output_type = tf.uint8
+    # "dynamic" needs nothing more: Optimize.DEFAULT alone quantizes weights to int8
     
     # Convert the model
-    tflite_model = converter.convert()
+    with tracing.span("convert", quantization=quantization):
+        tflite_model = converter.convert()
     
     # Save the TensorFlow Lite model
-    with open(output_path, 'wb') as f:
-        f.write(tflite_model)
+    with tracing.span("save_tflite"):
+        with open(output_path, 'wb') as f:
+            f.write(tflite_model)
     
     # Get model size
     model_size = os.path.getsize(output_path) / (1024 * 1024)  # MB
@@ -39,8 +104,129 @@ def convert_to_tflite(model_path, output_path):
     
     return model_size
 
+def resize_batch(interpreter, batch_size):
+    """Resize the interpreter input to a batch size; returns the input details."""
+    input_details = interpreter.get_input_details()[0]
+    if input_details['shape'][0] != batch_size:
+        interpreter.resize_tensor_input(input_details['index'], [batch_size, *input_details['shape'][1:]])
+        interpreter.allocate_tensors()
+        input_details = interpreter.get_input_details()[0]
+    return input_details
+
+def quantize_input(input_details, images):
+    """Turn uint8 RGB images into the interpreter's input tensor."""
+    x = images.astype(np.float32) / 255.0
+    scale, zero_point = input_details['quantization']
+    if input_details['dtype'] != np.float32 and scale:
+        # Clip before the cast so out-of-range values saturate instead of wrapping
+        info = np.iinfo(input_details['dtype'])
+        x = np.clip(np.round(x / scale + zero_point), info.min, info.max)
+    return x.astype(input_details['dtype'])
+
+def run_tflite(interpreter, images):
+    """Class probabilities for a batch of uint8 RGB images on a TFLite interpreter."""
+    input_details = resize_batch(interpreter, len(images))
+    output_details = interpreter.get_output_details()[0]
+    
+    interpreter.set_tensor(input_details['index'], quantize_input(input_details, images))
+    interpreter.invoke()
+    
+    output = interpreter.get_tensor(output_details['index']).astype(np.float32)
+    scale, zero_point = output_details['quantization']
+    if output_details['dtype'] != np.float32 and scale:
+        output = (output - zero_point) * scale
+    return output
+
+def evaluate_agreement(model_path, tflite_path, image_paths, y_true, batch_size=32):
+    """Top-1 agreement between Keras and TFLite, plus accuracy of both."""
+    import tensorflow as tf
+    
+    print(f"\n🔍 Comparing against Keras on {len(image_paths)} held-out images...")
+    
+    model = tf.keras.models.load_model(model_path)
+    img_size = model.input_shape[1]
+    interpreter = tf.lite.Interpreter(model_path=tflite_path)
+    interpreter.allocate_tensors()
+    
+    keras_top1, tflite_top1 = [], []
+    for start in range(0, len(image_paths), batch_size):
+        batch = np.stack([load_image_array(path, img_size) for path in image_paths[start:start + batch_size]])
+        keras_top1.append(np.argmax(model.predict(batch.astype(np.float32) / 255.0, verbose=0), axis=1))
+        tflite_top1.append(np.argmax(run_tflite(interpreter, batch), axis=1))
+    keras_top1 = np.concatenate(keras_top1)
+    tflite_top1 = np.concatenate(tflite_top1)
+    
+    results = {
+        "samples": len(image_paths),
+        "top1_agreement": float(np.mean(keras_top1 == tflite_top1)),
+        "keras_accuracy": float(np.mean(keras_top1 == y_true)),
+        "tflite_accuracy": float(np.mean(tflite_top1 == y_true)),
+    }
+    print(f"  Top-1 agreement: {results['top1_agreement']:.2%}")
+    print(f"  Accuracy: Keras {results['keras_accuracy']:.2%}, TFLite {results['tflite_accuracy']:.2%}")
+    
+    return results
+
+def benchmark_tflite_model(tflite_path, image_paths, thread_counts=BENCHMARK_THREADS,
+                           batch_sizes=BENCHMARK_BATCH_SIZES, warmup=BENCHMARK_WARMUP,
+                           iterations=BENCHMARK_ITERATIONS):
+    """Latency and throughput of a TFLite model for each num_threads / batch size.
+    
+    Batches are built from real preprocessed images (repeated when there
+    are fewer images than the batch size). Each setting gets `warmup`
+    untimed invokes, then `iterations` timed ones.
+    """
+    import tensorflow as tf
+    
+    print(f"\n⏱️  Benchmarking {tflite_path} ({warmup} warm-up, {iterations} timed runs)...")
+    
+    probe = tf.lite.Interpreter(model_path=tflite_path)
+    img_size = int(probe.get_input_details()[0]['shape'][1])
+    count = min(len(image_paths), max(batch_sizes))
+    images = np.stack([load_image_array(path, img_size) for path in image_paths[:count]])
+    
+    print(f"{'Threads':>7} {'Batch':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'img/s':>9}")
+    results = []
+    for num_threads in thread_counts:
+        interpreter = tf.lite.Interpreter(model_path=tflite_path, num_threads=num_threads)
+        interpreter.allocate_tensors()
+        
+        for batch_size in batch_sizes:
+            input_details = resize_batch(interpreter, batch_size)
+            batch = quantize_input(input_details, images[np.arange(batch_size) % len(images)])
+            
+            timings = []
+            for i in range(warmup + iterations):
+                start_time = time.perf_counter()
+                interpreter.set_tensor(input_details['index'], batch)
+                interpreter.invoke()
+                interpreter.get_tensor(interpreter.get_output_details()[0]['index'])
+                if i >= warmup:
+                    timings.append(time.perf_counter() - start_time)
+            
+            timings = np.array(timings) * 1000
+            result = {
+                "num_threads": num_threads,
+                "batch_size": batch_size,
+                "p50_ms": float(np.percentile(timings, 50)),
+                "p90_ms": float(np.percentile(timings, 90)),
+                "p99_ms": float(np.percentile(timings, 99)),
+                "images_per_sec": float(batch_size * 1000 / timings.mean()),
+            }
+            results.append(result)
+            print(f"{num_threads:>7} {batch_size:>6} {result['p50_ms']:>9.2f} {result['p90_ms']:>9.2f} "
+                  f"{result['p99_ms']:>9.2f} {result['images_per_sec']:>9.1f}")
+    
+    best = max(results, key=lambda r: r["images_per_sec"])
+    print(f"🏆 Best throughput: {best['images_per_sec']:.1f} img/s "
+          f"(num_threads={best['num_threads']}, batch_size={best['batch_size']})")
+    
+    return results
+
 def test_tflite_model(tflite_path, test_image_path=None):
     """Test the TensorFlow Lite model."""
+    import tensorflow as tf
+    
     print(f"\n🧪 Testing TensorFlow Lite model...")
     
     # Load the TensorFlow Lite model
@@ -59,20 +245,19 @@ def test_tflite_model(tflite_path, test_image_path=None):
     
     # Test with a dummy input
     input_shape = input_details[0]['shape']
-    dummy_input = np.random.random(input_shape).astype(np.float32)
-    
-    interpreter.set_tensor(input_details[0]['index'], dummy_input)
-    interpreter.invoke()
+    dummy_input = np.random.randint(0, 256, input_shape).astype(np.uint8)
     
-    output = interpreter.get_tensor(output_details[0]['index'])
+    output = run_tflite(interpreter, dummy_input)
     print(f"✅ Model test successful!")
     print(f"  Output shape: {output.shape}")
     print(f"  Output sum: {np.sum(output):.4f}")
     
     return True
 
-def create_model_info_file(tflite_path, labels_path):
+def create_model_info_file(tflite_path, labels_path, quantization="float16", agreement=None):
     """Create model information file for Firebase."""
+    import tensorflow as tf
+    
     print(f"\n📝 Creating model info file...")
     
     # Read labels
@@ -83,20 +268,29 @@ def create_model_info_file(tflite_path, labels_path):
                 labels.append(line.strip().split(': ')[1])
     
     # Create model info
+    interpreter = tf.lite.Interpreter(model_path=tflite_path)
+    input_details = interpreter.get_input_details()[0]
+    scale, zero_point = input_details['quantization']
+    input_shape = [int(d) for d in input_details['shape']]
     model_info = {
         "model_name": "berlin_landmarks_model",
         "version": "1.0",
         "description": "Custom Berlin landmarks recognition model",
-        "input_shape": [1, 224, 224, 3],
+        "input_shape": input_shape,
+        "image_size": input_shape[1:3],
+        "input_type": np.dtype(input_details['dtype']).name,
+        "input_quantization": {"scale": float(scale), "zero_point": int(zero_point)},
         "output_shape": [1, len(labels)],
         "labels": labels,
         "model_size_mb": os.path.getsize(tflite_path) / (1024 * 1024),
         "framework": "TensorFlow Lite",
-        "optimization": "Quantized (FP16)"
+        "optimization": QUANTIZATION_MODES[quantization],
+        "quantization": quantization
     }
+    if agreement is not None:
+        model_info["keras_agreement"] = agreement
     
     # Save as JSON
-    import json
     with open('model_info.json', 'w') as f:
         json.dump(model_info, f, indent=2)
     
@@ -104,11 +298,76 @@ def create_model_info_file(tflite_path, labels_path):
     
     return model_info
 
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Convert the Keras model to TensorFlow Lite.")
+    parser.add_argument('--quantization', choices=list(QUANTIZATION_MODES), default="float16",
+                        help="float16 weights, dynamic-range int8 weights, or full-integer int8 "
+                             "(default: float16)")
+    parser.add_argument('--data-dir', default=".",
+                        help="folder containing the *_processed folders (default: .)")
+    parser.add_argument('--img-size', type=int,
+                        help="expected input resolution; checked against the Keras model and used to pick "
+                             "<landmark>_processed_<size> images (default: the model's own)")
+    parser.add_argument('--representative-samples', type=int, default=REPRESENTATIVE_SAMPLES,
+                        help=f"calibration images for int8 (default: {REPRESENTATIVE_SAMPLES})")
+    parser.add_argument('--eval-samples', type=int, default=EVAL_SAMPLES,
+                        help=f"held-out images for the Keras comparison, 0 to skip (default: {EVAL_SAMPLES})")
+    parser.add_argument('--min-agreement', type=float, default=MIN_AGREEMENT,
+                        help=f"fail when top-1 agreement with Keras is lower (default: {MIN_AGREEMENT})")
+    parser.add_argument('--output', default="berlin_landmarks_model.tflite",
+                        help="TensorFlow Lite file to write (default: berlin_landmarks_model.tflite)")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="benchmark the converted model on real preprocessed images")
+    parser.add_argument('--benchmark-only', action='store_true',
+                        help="skip conversion and benchmark the existing --output model")
+    parser.add_argument('--threads', type=int, nargs='+', default=BENCHMARK_THREADS,
+                        help="num_threads values to sweep (default: 1 2 4)")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=BENCHMARK_BATCH_SIZES,
+                        help="batch sizes to sweep (default: 1 4 16)")
+    parser.add_argument('--warmup', type=int, default=BENCHMARK_WARMUP,
+                        help=f"untimed runs per setting (default: {BENCHMARK_WARMUP})")
+    parser.add_argument('--iterations', type=int, default=BENCHMARK_ITERATIONS,
+                        help=f"timed runs per setting (default: {BENCHMARK_ITERATIONS})")
+    parser.add_argument('--benchmark-output', default=BENCHMARK_PATH,
+                        help=f"JSON file for the benchmark results (default: {BENCHMARK_PATH})")
+    return parser.parse_args()
+
+def run_benchmark(args, image_paths=None):
+    """Benchmark args.output and save the results as JSON."""
+    if not os.path.exists(args.output):
+        print(f"❌ Error: {args.output} not found!")
+        return
+    if image_paths is None:
+        _, image_paths, _ = load_split_images(args.data_dir, args.img_size or IMG_SIZE)
+    if not image_paths:
+        print("❌ Error: no *_processed images to benchmark with!")
+        return
+    
+    results = benchmark_tflite_model(
+        args.output, image_paths, args.threads, args.batch_sizes, args.warmup, args.iterations
+    )
+    with open(args.benchmark_output, 'w') as f:
+        json.dump({
+            "model": args.output,
+            "model_size_mb": os.path.getsize(args.output) / (1024 * 1024),
+            "warmup": args.warmup,
+            "iterations": args.iterations,
+            "results": results,
+        }, f, indent=2)
+    print(f"📁 Benchmark saved as: {args.benchmark_output}")
+
 def main():
     """Main conversion function."""
+    args = parse_args()
+    
     print("🔄 TensorFlow to TensorFlow Lite Converter")
     print("=" * 50)
     
+    if args.benchmark_only:
+        run_benchmark(args)
+        return
+    
     # Check if trained model exists
     model_path = "berlin_landmarks_model.h5"
     if not os.path.exists(model_path):
@@ -116,16 +375,46 @@ def main():
         print("Please run train_model.py first to train the model.")
         return
     
+    img_size = args.img_size or model_input_size(model_path)
+    print(f"📐 Input size: {img_size}x{img_size}")
+    
+    # Calibration images come from the training split, evaluation from the test split
+    train_paths, test_paths, y_test = load_split_images(args.data_dir, img_size)
+    
     # Convert to TensorFlow Lite
-    tflite_path = "berlin_landmarks_model.tflite"
-    model_size = convert_to_tflite(model_path, tflite_path)
+    tflite_path = args.output
+    try:
+        model_size = convert_to_tflite(
+            model_path, tflite_path, args.quantization, train_paths, args.representative_samples, img_size
+        )
+    except ValueError as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    keras_size = os.path.getsize(model_path) / (1024 * 1024)
+    print(f"📏 Keras model: {keras_size:.2f} MB ({keras_size / model_size:.1f}x larger)")
     
     # Test the converted model
     test_tflite_model(tflite_path)
     
+    # Check the conversion did not silently change predictions
+    agreement = None
+    if args.eval_samples and test_paths:
+        with tracing.span("evaluate_agreement"):
+            agreement = evaluate_agreement(
+                model_path, tflite_path, test_paths[:args.eval_samples], y_test[:args.eval_samples]
+            )
+    
     # Create model info
     labels_path = "landmark_labels.txt"
-    model_info = create_model_info_file(tflite_path, labels_path)
+    model_info = create_model_info_file(tflite_path, labels_path, args.quantization, agreement)
+    
+    if agreement and agreement["top1_agreement"] < args.min_agreement:
+        print(f"\n❌ Top-1 agreement {agreement['top1_agreement']:.2%} is below {args.min_agreement:.0%}!")
+        print("Try --quantization dynamic or float16, or more --representative-samples.")
+        sys.exit(1)
+    
+    if args.benchmark:
+        run_benchmark(args, test_paths)
     
     print(f"\n🎉 Conversion completed successfully!")
     print(f"\n📁 Files created:")
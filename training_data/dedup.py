@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate detection for Berlin landmarks images
+Hashes every source image with a 64-bit difference hash (dHash), finds
+pairs within a small Hamming distance through a multi-index hash table,
+and groups them. The groups are saved in an index that prepare_images.py
+uses to drop duplicates and the trainers use to split by group, so
+near-identical screenshots never end up on both sides of a split.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from prepare_images import LANDMARK_FOLDERS, decode_image, find_images, sample_key
+
+INDEX_PATH = "dedup_index.json"
+HASH_BITS = 64
+HASH_CHUNKS = 3
+MAX_DISTANCE = 8
+SCALE_TEST_SIZE = 100000
+
+def dhash(image_path):
+    """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail."""
+    with Image.open(image_path) as img:
+        img = decode_image(img, 64, 'fast').convert('L').resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = np.asarray(img, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+# Set bits per byte value, for popcounts without numpy.bitwise_count (numpy >= 2.0)
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def hamming(a, b):
+    """Number of differing bits between two arrays of uint64 hashes."""
+    x = np.ascontiguousarray(np.bitwise_xor(a, b), dtype=np.uint64)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(x)
+    return POPCOUNT[x.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+def near_duplicate_pairs(values, max_distance=MAX_DISTANCE, chunks=HASH_CHUNKS):
+    """Index pairs (i < j) of hashes within max_distance bits, as an (n, 2) array.
+
+    Multi-index hashing: each hash is split into `chunks` substrings of
+    about HASH_BITS / chunks bits.
+    Two hashes within max_distance bits agree to within max_distance // chunks
+    bits on at least one substring, so only hashes whose substring lies in
+    that small neighbourhood are compared. Each substring table is a bucket
+    sort of the hashes, and all queries against it run as one vectorized join.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    radius = max_distance // chunks
+    bounds = np.linspace(0, HASH_BITS, chunks + 1).astype(int)
+
+    pairs = [np.zeros((0, 2), dtype=np.int64)]
+    for low, high in zip(bounds[:-1], bounds[1:]):
+        chunk_bits = int(high - low)
+        substrings = ((values >> np.uint64(low)) & np.uint64((1 << chunk_bits) - 1)).astype(np.int32)
+        # XOR masks of every substring within `radius` bits
+        masks = [0] + [
+            sum(1 << bit for bit in flipped)
+            for r in range(1, radius + 1)
+            for flipped in combinations(range(chunk_bits), r)
+        ]
+        order = np.argsort(substrings, kind='stable')
+        bucket_size = np.bincount(substrings, minlength=1 << chunk_bits).astype(np.int32)
+        bucket_start = np.cumsum(bucket_size) - bucket_size
+
+        for mask in masks:
+            keys = substrings ^ mask
+            counts = bucket_size[keys]
+            queries = np.flatnonzero(counts)
+            if not len(queries):
+                continue
+            # Every (query, stored hash) pair of the matching buckets
+            counts = counts[queries]
+            left = np.repeat(queries, counts)
+            offsets = np.arange(len(left)) - np.repeat(np.cumsum(counts) - counts, counts)
+            right = order[np.repeat(bucket_start[keys[queries]], counts) + offsets]
+            keep = left < right
+            left, right = left[keep], right[keep]
+            keep = hamming(values[left], values[right]) <= max_distance
+            pairs.append(np.stack([left[keep], right[keep]], axis=1))
+
+    return np.unique(np.concatenate(pairs), axis=0)
+
+def find_duplicate_groups(hashes, max_distance=MAX_DISTANCE):
+    """Connected groups (of 2+ keys) of hashes within max_distance of each other.
+
+    `hashes` maps keys to hash values. Each group is sorted, and its first
+    key is the representative that is kept.
+    """
+    keys = sorted(hashes)
+    parent = list(range(len(keys)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    values = np.array([hashes[key] for key in keys], dtype=np.uint64)
+    for i, j in near_duplicate_pairs(values, max_distance):
+        parent[find(j)] = find(i)
+
+    groups = {}
+    for i, key in enumerate(keys):
+        groups.setdefault(find(i), []).append(key)
+    return sorted(group for group in groups.values() if len(group) > 1)
+
+def load_index(path=INDEX_PATH):
+    """The saved dedup index, or None when dedup.py has not run."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def duplicate_keys(index):
+    """Sample keys of every duplicate except each group's representative."""
+    return {key for group in index["groups"] for key in group[1:]}
+
+def split_groups(files, path=INDEX_PATH):
+    """Group id per file for group-aware splits, or None when not enabled.
+
+    Files in the same duplicate group share an id; all others get their own.
+    """
+    index = load_index(path)
+    if not index or not index.get("group_splits"):
+        return None
+    group_of = {key: i for i, group in enumerate(index["groups"]) for key in group}
+    groups = np.empty(len(files), dtype=np.int64)
+    for i, path in enumerate(files):
+        groups[i] = group_of.get(sample_key(path), len(index["groups"]) + i)
+    return groups
+
+def _hash_task(image_path):
+    """(dhash, None) of one image, or (None, error message) when it cannot be decoded."""
+    try:
+        return dhash(image_path), None
+    except Exception as e:
+        return None, str(e)
+
+def compute_hashes(image_files, cached, workers=1):
+    """dHash of every image, reusing cached hashes of unchanged files.
+
+    Images that vanish or fail to decode are reported and left out of the
+    index, so they are retried on the next run.
+    """
+    hashes = {}
+    entries = {}
+    pending = []
+    for path in image_files:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entry = cached.get(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            entries[path] = entry
+        else:
+            entries[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            pending.append(path)
+
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_hash_task, pending, chunksize=max(1, len(pending) // (workers * 4))))
+    else:
+        results = [_hash_task(path) for path in pending]
+    hashed = 0
+    for path, (value, error) in zip(pending, results):
+        if error is not None:
+            print(f"Error hashing {path}: {error}")
+            del entries[path]
+            continue
+        entries[path]["hash"] = f"{value:016x}"
+        hashed += 1
+
+    for path, entry in entries.items():
+        hashes[sample_key(path)] = int(entry["hash"], 16)
+    return hashes, entries, hashed
+
+def scale_test(count=SCALE_TEST_SIZE, max_distance=MAX_DISTANCE):
+    """Time grouping `count` synthetic hashes (10% near-duplicates) against brute force."""
+    rng = np.random.default_rng(42)
+    values = rng.integers(0, np.iinfo(np.uint64).max, count, dtype=np.uint64, endpoint=True)
+    copies = values[rng.integers(0, count, count // 10)]
+    for bit in rng.integers(0, HASH_BITS, (max_distance // 2, len(copies))).astype(np.uint64):
+        copies ^= np.uint64(1) << bit
+    hashes = {f"synthetic/{i}": int(v) for i, v in enumerate(np.concatenate([values, copies]))}
+
+    print(f"\n⏱️  Grouping {len(hashes)} synthetic hashes (max distance {max_distance})...")
+    start_time = time.perf_counter()
+    groups = find_duplicate_groups(hashes, max_distance)
+    elapsed = time.perf_counter() - start_time
+
+    # Brute force on a sample, extrapolated: every query scans every hash
+    array = np.array(list(hashes.values()), dtype=np.uint64)
+    sample = array[:100]
+    start_time = time.perf_counter()
+    for value in sample:
+        hamming(array, value)
+    brute = (time.perf_counter() - start_time) / len(sample) * len(array)
+
+    print(f"  Multi-index: {elapsed:.2f}s ({len(groups)} groups)")
+    print(f"  Brute force (numpy, extrapolated): {brute:.2f}s")
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Find near-duplicate landmark images with perceptual hashes.")
+    parser.add_argument('--max-distance', type=int, default=MAX_DISTANCE,
+                        help=f"largest Hamming distance (of {HASH_BITS} bits) counted as a duplicate "
+                             f"(default: {MAX_DISTANCE})")
+    parser.add_argument('--group-splits', action='store_true',
+                        help="make the trainers put each duplicate group entirely in one split")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes for hashing new images (0 = all CPU cores, default: 1)")
+    parser.add_argument('--scale-test', type=int, nargs='?', const=SCALE_TEST_SIZE, metavar='N',
+                        help=f"time the index on N synthetic hashes and exit (default N: {SCALE_TEST_SIZE})")
+    return parser.parse_args()
+
+def main():
+    """Hash all landmark folders, group near-duplicates and save the index."""
+    args = parse_args()
+
+    print("🔍 Berlin Landmarks Near-Duplicate Finder")
+    print("=" * 50)
+
+    if args.scale_test:
+        scale_test(args.scale_test, args.max_distance)
+        return
+
+    image_files = []
+    for folder in LANDMARK_FOLDERS:
+        if os.path.exists(folder):
+            image_files.extend(sorted(find_images(folder)))
+    if not image_files:
+        print("❌ No images found in the landmark folders!")
+        sys.exit(1)
+
+    previous = load_index() or {}
+    start_time = time.perf_counter()
+    hashes, entries, hashed = compute_hashes(image_files, previous.get("hashes", {}), args.workers or os.cpu_count() or 1)
+    hash_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    groups = find_duplicate_groups(hashes, args.max_distance)
+    group_time = time.perf_counter() - start_time
+
+    # Saved where prepare_images.py, watch_images.py and the trainers look for it
+    with open(INDEX_PATH, 'w') as f:
+        json.dump({
+            "hash": f"dhash-{HASH_BITS}",
+            "max_distance": args.max_distance,
+            "group_splits": args.group_splits,
+            "groups": groups,
+            "hashes": entries,
+        }, f, indent=2)
+
+    for group in groups:
+        print(f"🔗 {group[0]} <- {', '.join(group[1:])}")
+
+    duplicates = sum(len(group) - 1 for group in groups)
+    print(f"\n📊 {len(hashes)} images, {len(groups)} duplicate groups, "
+          f"{duplicates} duplicates ({duplicates / max(len(hashes), 1):.1%})")
+    print(f"⏱️  Hashed {hashed} new images in {hash_time:.2f}s, grouped in {group_time * 1000:.1f} ms")
+    print(f"📁 Index saved as: {INDEX_PATH}")
+    print("\n📋 Next steps:")
+    print("  - python prepare_images.py --skip-duplicates   (keep one image per group)")
+    if not args.group_splits:
+        print("  - python dedup.py --group-splits              (split train/test by group)")
+
+if __name__ == "__main__":
+    main()
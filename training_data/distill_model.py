@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Knowledge distillation for the Berlin landmarks model
+Trains a small student (a reduced-width MobileNetV2 with a single-layer
+head) on the soft targets of the trained berlin_landmarks_model.h5, then
+converts teacher and student to TensorFlow Lite and reports the size,
+latency and accuracy deltas. The student is a plain Keras .h5 model with
+the same input and output as the teacher, so convert_to_tflite.py,
+serve.py and the benchmarks take it as is.
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from train_model import BATCH_SIZE, LEARNING_RATE, fit_model, load_and_preprocess_data
+from pack_dataset import split_indices
+from convert_to_tflite import benchmark_tflite_model, convert_to_tflite, evaluate_agreement
+import tracing
+
+MODEL_PATH = "berlin_landmarks_model.h5"
+STUDENT_PATH = "berlin_landmarks_student.h5"
+TEACHER_PATH = "berlin_landmarks_teacher.h5"
+REPORT_PATH = "distillation_report.json"
+STUDENT_WIDTH = 0.35
+TEMPERATURE = 4.0
+SOFT_WEIGHT = 0.7
+FINE_TUNE_LAYERS = 0
+LATENCY_ITERATIONS = 50
+
+# Layer names that mark a saved model as a distilled student
+STUDENT_LOGITS = 'student_logits'
+
+def soft_targets(probabilities, temperature=TEMPERATURE):
+    """Teacher probabilities softened with a temperature (softmax of log p / T)."""
+    logits = np.log(np.clip(probabilities, 1e-8, 1.0)) / temperature
+    logits -= logits.max(axis=1, keepdims=True)
+    softened = np.exp(logits)
+    return softened / softened.sum(axis=1, keepdims=True)
+
+def distillation_targets(labels, probabilities, temperature=TEMPERATURE):
+    """Training targets: the hard label followed by the softened teacher distribution."""
+    return np.concatenate([labels[:, np.newaxis].astype(np.float32),
+                           soft_targets(probabilities, temperature).astype(np.float32)], axis=1)
+
+def distillation_loss(temperature=TEMPERATURE, soft_weight=SOFT_WEIGHT):
+    """Weighted sum of hard-label cross-entropy and T^2-scaled soft-target cross-entropy on logits."""
+    import tensorflow as tf
+
+    def loss(y_true, logits):
+        hard = tf.cast(y_true[:, 0], tf.int32)
+        soft = y_true[:, 1:]
+        hard_loss = tf.keras.losses.sparse_categorical_crossentropy(hard, logits, from_logits=True)
+        soft_loss = tf.keras.losses.categorical_crossentropy(soft, logits / temperature, from_logits=True)
+        return (1.0 - soft_weight) * hard_loss + soft_weight * temperature ** 2 * soft_loss
+    return loss
+
+def hard_label_accuracy(y_true, logits):
+    """Top-1 accuracy against the hard label column of distillation targets."""
+    import tensorflow as tf
+
+    hard = tf.cast(y_true[:, 0], tf.int64)
+    return tf.cast(tf.equal(tf.argmax(logits, axis=1), hard), tf.float32)
+
+def create_student(num_classes, img_size, width=STUDENT_WIDTH, fine_tune_layers=FINE_TUNE_LAYERS,
+                   jit_compile=False, temperature=TEMPERATURE, soft_weight=SOFT_WEIGHT):
+    """Reduced-width MobileNetV2 with a dropout + softmax head.
+
+    Returns the training model (logits, compiled with the distillation
+    loss) and the inference model (softmax probabilities, like the
+    teacher); both share the same layers.
+    """
+    import tensorflow as tf
+    from tensorflow.keras.applications import MobileNetV2
+    from tensorflow.keras.layers import Activation, Dense, Dropout, GlobalAveragePooling2D
+    from tensorflow.keras.models import Model
+    from tensorflow.keras.optimizers import Adam
+
+    print(f"\n🏗️ Creating student: MobileNetV2 width {width}, {img_size}x{img_size} input...")
+
+    base_model = MobileNetV2(
+        weights='imagenet',
+        include_top=False,
+        input_shape=(img_size, img_size, 3),
+        alpha=width
+    )
+    base_model.trainable = fine_tune_layers > 0
+    if fine_tune_layers > 0:
+        for layer in base_model.layers[:-fine_tune_layers]:
+            layer.trainable = False
+
+    x = GlobalAveragePooling2D()(base_model.output)
+    x = Dropout(0.2, name='student_dropout')(x)
+    logits = Dense(num_classes, dtype='float32', name=STUDENT_LOGITS)(x)
+    predictions = Activation('softmax', dtype='float32', name='student_predictions')(logits)
+
+    training_model = Model(inputs=base_model.input, outputs=logits)
+    training_model.compile(
+        optimizer=Adam(learning_rate=LEARNING_RATE),
+        loss=distillation_loss(temperature, soft_weight),
+        # Logged as 'accuracy', so the val_accuracy callbacks of fit_model apply
+        metrics=[tf.keras.metrics.MeanMetricWrapper(hard_label_accuracy, name='accuracy')],
+        jit_compile=jit_compile
+    )
+    student = Model(inputs=base_model.input, outputs=predictions)
+
+    print(f"Student parameters: {student.count_params():,}")
+    return training_model, student
+
+def load_teacher(path):
+    """Load the teacher, refusing a model that is itself a distilled student."""
+    import tensorflow as tf
+
+    teacher = tf.keras.models.load_model(path)
+    if any(layer.name == STUDENT_LOGITS for layer in teacher.layers):
+        raise ValueError(f"{path} is a distilled student; pass --teacher {TEACHER_PATH}")
+    return teacher
+
+def compare_models(teacher_path, student_path, image_paths, y_test, workdir):
+    """Convert both models to TFLite (float16) and measure size, latency and accuracy."""
+    import tensorflow as tf
+
+    results = {}
+    for name, path in (("teacher", teacher_path), ("student", student_path)):
+        tflite_path = os.path.join(workdir, f"{name}.tflite")
+        with tracing.span("convert", model=name):
+            tflite_size = convert_to_tflite(path, tflite_path, "float16")
+        with tracing.span("evaluate_agreement", model=name):
+            agreement = evaluate_agreement(path, tflite_path, image_paths, y_test)
+        with tracing.span("benchmark", model=name):
+            latency = benchmark_tflite_model(tflite_path, image_paths, thread_counts=[1], batch_sizes=[1],
+                                             iterations=LATENCY_ITERATIONS)[0]
+        results[name] = {
+            "parameters": int(tf.keras.models.load_model(path).count_params()),
+            "h5_size_mb": os.path.getsize(path) / (1024 * 1024),
+            "tflite_size_mb": tflite_size,
+            "tflite_p50_ms": latency["p50_ms"],
+            "tflite_p90_ms": latency["p90_ms"],
+            "keras_accuracy": agreement["keras_accuracy"],
+            "tflite_accuracy": agreement["tflite_accuracy"],
+        }
+    return results
+
+def print_comparison(results, agreement):
+    """Teacher vs student table with relative changes."""
+    teacher, student = results["teacher"], results["student"]
+    print(f"\n📊 Teacher vs student (TFLite float16, 1 thread, batch 1)")
+    print(f"{'':<20} {'Teacher':>10} {'Student':>10} {'Change':>10}")
+    for key, label, fmt in (("parameters", "Parameters", "{:,.0f}"),
+                            ("tflite_size_mb", "TFLite size MB", "{:.2f}"),
+                            ("tflite_p50_ms", "Latency p50 ms", "{:.2f}"),
+                            ("tflite_p90_ms", "Latency p90 ms", "{:.2f}")):
+        change = student[key] / teacher[key] - 1 if teacher[key] else 0.0
+        print(f"{label:<20} {fmt.format(teacher[key]):>10} {fmt.format(student[key]):>10} {change:>+10.1%}")
+    for key, label in (("keras_accuracy", "Keras accuracy"), ("tflite_accuracy", "TFLite accuracy")):
+        delta = (student[key] - teacher[key]) * 100
+        print(f"{label:<20} {teacher[key]:>10.2%} {student[key]:>10.2%} {delta:>+7.2f} pts")
+    print(f"🤝 Student agrees with the teacher's top-1 on {agreement:.2%} of test images")
+    print(f"⚡ Student is {teacher['tflite_p50_ms'] / student['tflite_p50_ms']:.2f}x faster")
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Distill the landmark model into a smaller, faster student.")
+    parser.add_argument('--teacher', default=MODEL_PATH,
+                        help=f"trained teacher model (default: {MODEL_PATH})")
+    parser.add_argument('--width', type=float, choices=[0.35, 0.5, 0.75, 1.0], default=STUDENT_WIDTH,
+                        help=f"MobileNetV2 width multiplier of the student (default: {STUDENT_WIDTH})")
+    parser.add_argument('--temperature', type=float, default=TEMPERATURE,
+                        help=f"softmax temperature of the soft targets (default: {TEMPERATURE})")
+    parser.add_argument('--soft-weight', type=float, default=SOFT_WEIGHT,
+                        help=f"weight of the soft-target loss against the hard labels (default: {SOFT_WEIGHT})")
+    parser.add_argument('--fine-tune-layers', type=int, default=FINE_TUNE_LAYERS,
+                        help="also train the top N layers of the student backbone (default: frozen backbone)")
+    parser.add_argument('--jit-compile', action='store_true',
+                        help="compile training steps with XLA")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue an interrupted distillation run from its newest checkpoint")
+    parser.add_argument('--promote', action='store_true',
+                        help=f"save the student as {MODEL_PATH} (keeping the teacher as {TEACHER_PATH}) "
+                             "so convert_to_tflite.py and serve.py pick it up")
+    parser.add_argument('--skip-compare', action='store_true',
+                        help="skip the TFLite size/latency/accuracy comparison")
+    return parser.parse_args()
+
+def main():
+    """Distill the teacher into a student, save it and compare the two."""
+    args = parse_args()
+    import tensorflow as tf
+
+    print("🎓 Berlin Landmarks Model Distillation")
+    print("=" * 50)
+
+    if not os.path.exists(args.teacher):
+        print(f"❌ Error: {args.teacher} not found!")
+        print("Please run train_model.py first to train the teacher.")
+        sys.exit(1)
+    try:
+        with tracing.span("load_teacher"):
+            teacher = load_teacher(args.teacher)
+    except ValueError as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    img_size = int(teacher.input_shape[1])
+    print(f"👩‍🏫 Teacher: {args.teacher} ({teacher.count_params():,} parameters, {img_size}x{img_size} input)")
+
+    with tracing.span("load_dataset"):
+        X, y, label_names, files = load_and_preprocess_data(".", img_size)
+    if len(X) == 0:
+        print("❌ No images found! Please add images to the folders first.")
+        sys.exit(1)
+    if teacher.output_shape[-1] != len(label_names):
+        print(f"❌ Error: the teacher predicts {teacher.output_shape[-1]} classes, "
+              f"but there are {len(label_names)} landmark folders; retrain the teacher first")
+        sys.exit(1)
+
+    # The teacher's own split, so its test images stay unseen by both models
+    train_idx, val_idx, test_idx = split_indices(y, files)
+    print(f"\n📊 Data Split:")
+    print(f"  Training: {len(train_idx)} images")
+    print(f"  Validation: {len(val_idx)} images")
+    print(f"  Test: {len(test_idx)} images")
+
+    # Soft targets are computed once; the student never runs next to the teacher
+    print(f"\n🧠 Computing teacher soft targets (T={args.temperature})...")
+    with tracing.span("teacher_targets"):
+        teacher_probabilities = teacher.predict(X, batch_size=BATCH_SIZE, verbose=0)
+    targets = distillation_targets(y, teacher_probabilities, args.temperature)
+
+    training_model, student = create_student(len(label_names), img_size, args.width, args.fine_tune_layers,
+                                             args.jit_compile, args.temperature, args.soft_weight)
+    train_data = tf.data.Dataset.from_tensor_slices((X[train_idx], targets[train_idx]))
+    train_data = train_data.shuffle(len(train_idx), seed=42).batch(BATCH_SIZE)
+    fit_model(training_model, train_data, (X[val_idx], targets[val_idx]), len(train_idx), len(val_idx),
+              checkpoint_path='best_berlin_landmarks_student.h5', resume=args.resume)
+
+    # Student-teacher agreement on the held-out images
+    with tracing.span("evaluate"):
+        student_top1 = np.argmax(student.predict(X[test_idx], verbose=0), axis=1)
+    teacher_top1 = np.argmax(teacher_probabilities[test_idx], axis=1)
+    agreement = float(np.mean(student_top1 == teacher_top1)) if len(test_idx) else 0.0
+    print(f"\nStudent test accuracy: {np.mean(student_top1 == y[test_idx]):.4f}")
+
+    teacher_path = args.teacher
+    student_path = STUDENT_PATH
+    if args.promote:
+        if os.path.abspath(args.teacher) == os.path.abspath(MODEL_PATH):
+            shutil.copy2(MODEL_PATH, TEACHER_PATH)
+            teacher_path = TEACHER_PATH
+            print(f"📦 Teacher kept as: {TEACHER_PATH}")
+        student_path = MODEL_PATH
+    with tracing.span("save_model"):
+        student.save(student_path)
+    print(f"💾 Student saved as: {student_path}")
+
+    report = {
+        "teacher": teacher_path,
+        "student": student_path,
+        "width": args.width,
+        "temperature": args.temperature,
+        "soft_weight": args.soft_weight,
+        "fine_tune_layers": args.fine_tune_layers,
+        "test_images": len(test_idx),
+        "student_teacher_agreement": agreement,
+    }
+    if not args.skip_compare and len(test_idx):
+        test_paths = [files[i] for i in test_idx]
+        with tempfile.TemporaryDirectory() as workdir:
+            report["models"] = compare_models(teacher_path, student_path, test_paths, y[test_idx], workdir)
+        print_comparison(report["models"], agreement)
+
+    with open(REPORT_PATH, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📁 Report saved as: {REPORT_PATH}")
+
+    print(f"\n🚀 Next steps:")
+    if args.promote:
+        print(f"  1. Convert the student: python convert_to_tflite.py")
+    else:
+        print(f"  1. Promote the student: python distill_model.py --promote (or copy {STUDENT_PATH} "
+              f"to {MODEL_PATH}), then python convert_to_tflite.py")
+    print(f"  2. Compare backends: python benchmark.py")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Backbone Embedding Cache for Berlin Landmarks ML Training
+Computes the pooled MobileNetV2 features of every image once and keeps
+them on disk, so the classification head can be retrained in seconds.
+"""
+
+import os
+import json
+import glob
+import numpy as np
+from PIL import Image
+from prepare_images import file_sha256
+import tracing
+
+# Configuration
+IMG_SIZE = 224
+BATCH_SIZE = 32
+CACHE_DIR = "embedding_cache"
+# Bump whenever the backbone, its weights or the input preprocessing change
+BACKBONE_VERSION = "mobilenet_v2-imagenet-avgpool-v1"
+
+def backbone_id(img_size=IMG_SIZE):
+    """Identifier of the backbone that produced a set of embeddings."""
+    return f"{BACKBONE_VERSION}-{img_size}"
+
+def create_backbone(img_size=IMG_SIZE):
+    """Frozen MobileNetV2 with global average pooling, as used by create_model."""
+    from tensorflow.keras.applications import MobileNetV2
+
+    return MobileNetV2(
+        weights='imagenet',
+        include_top=False,
+        input_shape=(img_size, img_size, 3),
+        pooling='avg'
+    )
+
+class EmbeddingCache:
+    """Append-only on-disk store of embeddings keyed by image hash and variant.
+
+    Each call to `add` writes one new `vectors-*.npy` shard; `index.json`
+    maps every key to its shard and row. Shards are read memory-mapped.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, img_size=IMG_SIZE):
+        self.img_size = img_size
+        self.path = os.path.join(cache_dir, backbone_id(img_size))
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+        self.index_path = os.path.join(self.path, "index.json")
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                self.index = json.load(f)
+        self._shards = {}
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def _shard(self, name):
+        if name not in self._shards:
+            self._shards[name] = np.load(os.path.join(self.path, name), mmap_mode='r')
+        return self._shards[name]
+
+    def get(self, key):
+        """Embedding stored under `key`."""
+        shard, row = self.index[key]
+        return self._shard(shard)[row]
+
+    def add(self, keys, vectors):
+        """Store new embeddings in a fresh shard and update the index."""
+        if not keys:
+            return
+
+        shard = f"vectors-{len(glob.glob(os.path.join(self.path, 'vectors-*.npy'))):05d}.npy"
+        np.save(os.path.join(self.path, shard), np.asarray(vectors, dtype=np.float32))
+        for row, key in enumerate(keys):
+            self.index[key] = [shard, row]
+
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+
+def load_image(image_file, img_size=IMG_SIZE):
+    """Load an image the same way load_and_preprocess_data does."""
+    with Image.open(image_file) as img:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img = img.resize((img_size, img_size))
+        return np.asarray(img, dtype=np.float32) / 255.0
+
+def augment_variant(img_array, image_hash, variant, datagen):
+    """Deterministic augmented copy number `variant` of an image."""
+    seed = (int(image_hash[:8], 16) + variant) % (2 ** 32)
+    params = datagen.get_random_transform(img_array.shape, seed=seed)
+    return datagen.apply_transform(img_array, params)
+
+def embed_files(files, cache, variants=0, datagen=None, backbone=None, batch_size=BATCH_SIZE):
+    """Embeddings of `files` and `variants` augmented copies of each.
+
+    Returns an array of shape (len(files), variants + 1, features) where
+    variant 0 is the original image. Only embeddings missing from the
+    cache are computed, and the backbone is only built when needed.
+    """
+    hashes = [file_sha256(image_file) for image_file in files]
+    missing = [
+        (i, variant)
+        for i, image_hash in enumerate(hashes)
+        for variant in range(variants + 1)
+        if f"{image_hash}:{variant}" not in cache
+    ]
+
+    if missing:
+        if backbone is None:
+            backbone = create_backbone(cache.img_size)
+        print(f"🧠 Computing {len(missing)} embeddings ({len(hashes) * (variants + 1) - len(missing)} cached)...")
+
+        new_keys = []
+        new_vectors = []
+        for start in range(0, len(missing), batch_size):
+            batch = []
+            for i, variant in missing[start:start + batch_size]:
+                img_array = load_image(files[i], cache.img_size)
+                if variant > 0:
+                    img_array = augment_variant(img_array, hashes[i], variant, datagen)
+                batch.append(img_array)
+                new_keys.append(f"{hashes[i]}:{variant}")
+            with tracing.span("embed_batch", images=len(batch)):
+                new_vectors.append(backbone.predict_on_batch(np.stack(batch)))
+            tracing.count("embeddings_computed", len(batch))
+
+        cache.add(new_keys, np.concatenate(new_vectors))
+    else:
+        print(f"🧠 All {len(hashes) * (variants + 1)} embeddings cached")
+
+    return np.stack([
+        np.stack([cache.get(f"{image_hash}:{variant}") for variant in range(variants + 1)])
+        for image_hash in hashes
+    ])
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Feature Extractors for the Berlin Landmarks Random Forest
+Vectorized, batch feature extraction shared by training and prediction,
+so both always turn images into exactly the same feature vectors.
+"""
+
+import numpy as np
+from PIL import Image
+
+# Configuration
+IMG_SIZE = 224
+DEFAULT_EXTRACTOR = "hog"
+HIST_BINS = 16
+HIST_GRID = 2
+HOG_BINS = 9
+HOG_CELL = 16
+PROJECTION_DIM = 256
+PROJECTION_SEED = 42
+
+def _grayscale(images):
+    """Mean over the RGB channels, scaled to [0, 1]."""
+    return images.mean(axis=3) / 255.0
+
+def _downsample(images, factor):
+    """Block-mean downsampling of (N, H, W, ...) arrays by an integer factor."""
+    n, h, w = images.shape[:3]
+    h, w = h - h % factor, w - w % factor
+    blocks = images[:, :h, :w].reshape(n, h // factor, factor, w // factor, factor, *images.shape[3:])
+    return blocks.mean(axis=(2, 4))
+
+def _grid_histogram(values, weights, bins, cell_h, cell_w):
+    """Per-cell histograms of integer bin indices for a batch of 2-D maps.
+
+    `values` holds bin indices of shape (N, H, W[, C]); the result has one
+    histogram per image, grid cell (and channel), flattened per image.
+    """
+    n, h, w = values.shape[:3]
+    channels = values.shape[3] if values.ndim == 4 else 1
+    rows = np.arange(h)[:, None] // cell_h
+    cols = np.arange(w)[None, :] // cell_w
+    n_cols = w // cell_w
+    cell = (rows * n_cols + cols).reshape(1, h, w, 1)
+    values = values.reshape(n, h, w, channels)
+    weights = weights.reshape(n, h, w, channels)
+
+    n_cells = (h // cell_h) * n_cols
+    per_image = n_cells * channels * bins
+    channel = np.arange(channels).reshape(1, 1, 1, channels)
+    image = np.arange(n).reshape(n, 1, 1, 1)
+    index = image * per_image + (cell * channels + channel) * bins + values
+    hist = np.bincount(index.ravel(), weights=weights.ravel(), minlength=n * per_image)
+    return hist.reshape(n, per_image)
+
+def raw_features(images):
+    """Flattened grayscale pixels (the original Random Forest input)."""
+    return _grayscale(images).reshape(len(images), -1)
+
+def color_histogram_features(images):
+    """Per-channel colour histograms over a coarse grid of a 4x downsampled image."""
+    small = _downsample(images, 4)
+    bins = np.minimum((small * HIST_BINS / 256.0).astype(np.int64), HIST_BINS - 1)
+    cell_h = small.shape[1] // HIST_GRID
+    cell_w = small.shape[2] // HIST_GRID
+    small_bins = bins[:, :cell_h * HIST_GRID, :cell_w * HIST_GRID]
+    hist = _grid_histogram(small_bins, np.ones(small_bins.shape), HIST_BINS, cell_h, cell_w)
+    return hist / float(cell_h * cell_w)
+
+def hog_features(images):
+    """HOG-style histograms of unsigned gradient orientations per cell."""
+    gray = _downsample(_grayscale(images), 2)
+    gx = np.zeros_like(gray)
+    gy = np.zeros_like(gray)
+    gx[:, :, 1:-1] = gray[:, :, 2:] - gray[:, :, :-2]
+    gy[:, 1:-1, :] = gray[:, 2:, :] - gray[:, :-2, :]
+
+    magnitude = np.hypot(gx, gy)
+    orientation = np.rad2deg(np.arctan2(gy, gx)) % 180.0
+    bins = np.minimum((orientation * HOG_BINS / 180.0).astype(np.int64), HOG_BINS - 1)
+
+    cell = HOG_CELL // 2
+    h = gray.shape[1] - gray.shape[1] % cell
+    w = gray.shape[2] - gray.shape[2] % cell
+    hist = _grid_histogram(bins[:, :h, :w], magnitude[:, :h, :w], HOG_BINS, cell, cell)
+
+    # L2-normalize each image so lighting changes do not dominate
+    norm = np.linalg.norm(hist, axis=1, keepdims=True)
+    return hist / np.maximum(norm, 1e-6)
+
+_projection_cache = {}
+
+def _projection_matrix(input_dim):
+    """Fixed Gaussian projection matrix, regenerated identically from the seed."""
+    if input_dim not in _projection_cache:
+        rng = np.random.default_rng(PROJECTION_SEED)
+        matrix = rng.standard_normal((input_dim, PROJECTION_DIM)) / np.sqrt(PROJECTION_DIM)
+        _projection_cache[input_dim] = matrix.astype(np.float32)
+    return _projection_cache[input_dim]
+
+def random_projection_features(images):
+    """Gaussian random projection of the 4x downsampled grayscale image."""
+    gray = _downsample(_grayscale(images), 4).reshape(len(images), -1).astype(np.float32)
+    return gray @ _projection_matrix(gray.shape[1])
+
+FEATURE_TYPES = {
+    "raw": "Flattened grayscale",
+    "color_hist": "Grid colour histograms",
+    "hog": "Gradient orientation histograms",
+    "random_projection": "Random projection of grayscale",
+}
+
+EXTRACTORS = {
+    "raw": raw_features,
+    "color_hist": color_histogram_features,
+    "hog": hog_features,
+    "random_projection": random_projection_features,
+}
+
+def extract_features(images, name=DEFAULT_EXTRACTOR, chunk_size=256):
+    """Turn a batch of uint8 RGB images (N, H, W, 3) into float32 features.
+
+    Images are processed in chunks, so memory-mapped datasets are never
+    fully materialized as floats.
+    """
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown feature extractor '{name}' (choose from {', '.join(EXTRACTORS)})")
+    extractor = EXTRACTORS[name]
+
+    chunks = [
+        extractor(np.asarray(images[start:start + chunk_size])).astype(np.float32)
+        for start in range(0, len(images), chunk_size)
+    ]
+    if not chunks:
+        return np.zeros((0, feature_dim(name, images.shape[1])), dtype=np.float32)
+    return np.concatenate(chunks)
+
+def feature_dim(name=DEFAULT_EXTRACTOR, img_size=IMG_SIZE):
+    """Feature dimension produced by an extractor for square images."""
+    return extract_features(np.zeros((1, img_size, img_size, 3), dtype=np.uint8), name).shape[1]
+
+def feature_spec(name=DEFAULT_EXTRACTOR, img_size=IMG_SIZE):
+    """Description of an extractor as stored next to a trained model."""
+    return {"name": name, "dim": feature_dim(name, img_size), "img_size": img_size}
+
+def load_image_array(image_path, img_size=IMG_SIZE):
+    """Load an image as a uint8 RGB array of shape (img_size, img_size, 3)."""
+    with Image.open(image_path) as img:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img = img.resize((img_size, img_size))
+        return np.asarray(img)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Pickle-free Random Forest model format for Berlin landmarks
+Stores every tree of a trained RandomForestClassifier as flat, aligned
+numpy buffers (`<name>.bin`) described by a small JSON header
+(`<name>.json`). Loading memory-maps the buffers, so it is near-instant,
+runs no code from the file, and lets several processes share the weights
+through the page cache.
+"""
+
+import os
+import sys
+import json
+import time
+import pickle
+import numpy as np
+
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+CHUNK_SIZE = 256
+FOREST_PATH = "berlin_landmarks_model.forest"
+
+def _pack_trees(model):
+    """Concatenate the nodes of all trees into global arrays.
+
+    Leaves point to themselves on both sides, so a traversal can simply
+    run a fixed number of steps.
+    """
+    features, thresholds, lefts, rights, values = [], [], [], [], []
+    roots, depths = [], []
+
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        nodes = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold).astype(np.float64))
+        lefts.append((np.where(is_leaf, nodes, tree.children_left) + offset).astype(np.int32))
+        rights.append((np.where(is_leaf, nodes, tree.children_right) + offset).astype(np.int32))
+
+        # Same normalization as DecisionTreeClassifier.predict_proba
+        value = tree.value[:, 0, :model.n_classes_].astype(np.float64)
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        values.append(value / normalizer)
+
+        roots.append(offset)
+        depths.append(tree.max_depth)
+        offset += tree.node_count
+
+    return {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "left": np.concatenate(lefts),
+        "right": np.concatenate(rights),
+        "value": np.concatenate(values),
+        "root": np.array(roots, dtype=np.int32),
+        "depth": np.array(depths, dtype=np.int32),
+    }
+
+def export_forest(model, path, labels, feature_spec=None):
+    """Write a fitted RandomForestClassifier as `<path>.json` + `<path>.bin`."""
+    arrays = _pack_trees(model)
+
+    layout = {}
+    offset = 0
+    with open(path + '.bin', 'wb') as f:
+        for name, array in arrays.items():
+            padding = -offset % ALIGNMENT
+            f.write(b'\0' * padding)
+            offset += padding
+            array = np.ascontiguousarray(array)
+            f.write(array.tobytes())
+            layout[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+            offset += array.nbytes
+
+    header = {
+        "format": "berlin-landmarks-forest",
+        "version": FORMAT_VERSION,
+        "n_trees": len(model.estimators_),
+        "n_features": int(model.n_features_in_),
+        "classes": [int(c) for c in model.classes_],
+        "labels": list(labels),
+        "feature_spec": feature_spec or getattr(model, 'feature_spec_', None),
+        "arrays": layout,
+    }
+    with open(path + '.json', 'w') as f:
+        json.dump(header, f, indent=2)
+
+    return header
+
+class ForestModel:
+    """Random Forest loaded from the flat format, with the sklearn predict API.
+
+    Inference is vectorized over samples and trees together, and
+    `predict_proba` matches `RandomForestClassifier.predict_proba`
+    (computed with n_jobs=1) exactly: features are cast to float32, each
+    tree's leaf probabilities are summed in tree order and divided by the
+    number of trees.
+    """
+
+    def __init__(self, path):
+        with open(path + '.json', 'r') as f:
+            header = json.load(f)
+        if header.get("format") != "berlin-landmarks-forest" or header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path}.json is not a version {FORMAT_VERSION} forest model")
+
+        self.header = header
+        self.classes_ = np.array(header["classes"])
+        self.labels = header["labels"]
+        self.n_features_in_ = header["n_features"]
+        if header["feature_spec"] is not None:
+            self.feature_spec_ = header["feature_spec"]
+
+        self._buffer = np.memmap(path + '.bin', dtype=np.uint8, mode='r')
+        for name, spec in header["arrays"].items():
+            array = np.ndarray(
+                shape=tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]),
+                buffer=self._buffer, offset=spec["offset"]
+            )
+            setattr(self, name, array)
+        self.max_depth = int(self.depth.max()) if len(self.depth) else 0
+
+        # Traversal tables: node 2*i is the right child of i, 2*i + 1 the left
+        self._feature = self.feature.astype(np.intp)
+        self._children = np.stack([self.right, self.left], axis=1).ravel().astype(np.intp)
+
+    def predict_proba(self, X):
+        """Class probabilities for a batch of feature vectors."""
+        X = np.asarray(X, dtype=np.float32)
+        proba = np.zeros((len(X), len(self.classes_)))
+
+        for start in range(0, len(X), CHUNK_SIZE):
+            proba[start:start + CHUNK_SIZE] = self._predict_chunk(X[start:start + CHUNK_SIZE])
+
+        return proba
+
+    def _predict_chunk(self, X):
+        """Traverse all trees for all rows of X at once.
+
+        `node` holds one current node per (sample, tree); every step moves
+        all of them one level down with three gathers over the flat arrays.
+        Leaves loop onto themselves, so a fixed number of steps suffices.
+        """
+        n_samples, n_features = X.shape
+        n_trees = len(self.root)
+        flat_X = X.ravel()
+        row_offset = np.repeat(np.arange(n_samples, dtype=np.intp) * n_features, n_trees)
+
+        node = np.tile(self.root.astype(np.intp), n_samples)
+        for _ in range(self.max_depth):
+            index = np.take(self._feature, node)
+            index += row_offset
+            go_left = np.take(flat_X, index) <= np.take(self.threshold, node)
+            node *= 2
+            node += go_left
+            node = np.take(self._children, node)
+
+        # Sum per tree in tree order, exactly like sklearn accumulates
+        leaf_values = np.take(self.value, node.reshape(n_samples, n_trees), axis=0)
+        proba = np.zeros((n_samples, len(self.classes_)))
+        for tree in range(n_trees):
+            proba += leaf_values[:, tree]
+        proba /= n_trees
+        return proba
+
+    def predict(self, X):
+        """Most probable class for a batch of feature vectors."""
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+def load_forest(path=FOREST_PATH):
+    """Memory-map a forest written by export_forest."""
+    return ForestModel(path)
+
+def main():
+    """Convert a pickled model into the flat forest format."""
+    source = sys.argv[1] if len(sys.argv) > 1 else 'berlin_landmarks_model.pkl'
+    target = sys.argv[2] if len(sys.argv) > 2 else FOREST_PATH
+
+    print("🌲 Random Forest Exporter")
+    print("=" * 50)
+
+    if not os.path.exists(source):
+        print(f"❌ Error: {source} not found!")
+        return
+
+    start_time = time.perf_counter()
+    with open(source, 'rb') as f:
+        model = pickle.load(f)
+    pickle_time = time.perf_counter() - start_time
+
+    with open('landmark_labels.txt', 'r') as f:
+        labels = [line.strip().split(': ')[1] for line in f]
+
+    export_forest(model, target, labels)
+
+    start_time = time.perf_counter()
+    forest = load_forest(target)
+    load_time = time.perf_counter() - start_time
+
+    print(f"✅ Exported {source} -> {target}.json + {target}.bin")
+    print(f"📏 Size: {os.path.getsize(target + '.bin') / (1024 * 1024):.2f} MB "
+          f"({len(forest.root)} trees, {len(forest.feature)} nodes)")
+    print(f"⏱️  Load time: pickle {pickle_time * 1000:.1f} ms, forest {load_time * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
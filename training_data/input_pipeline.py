@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Streaming tf.data input pipeline for Berlin Landmarks ML Training
+Decodes images in parallel, caches them, and runs augmentation in-graph.
+"""
+
+import os
+import glob
+import hashlib
+import numpy as np
+
+# Configuration
+IMG_SIZE = 224
+BATCH_SIZE = 32
+SHUFFLE_BUFFER = 1024
+
+def create_augmentation_layers():
+    """In-graph equivalent of the ImageDataGenerator settings in train_model.py."""
+    import tensorflow as tf
+    from tensorflow.keras import layers
+
+    return tf.keras.Sequential([
+        layers.RandomRotation(20 / 360, fill_mode='nearest'),
+        layers.RandomTranslation(0.2, 0.2, fill_mode='nearest'),
+        layers.RandomFlip('horizontal'),
+        layers.RandomZoom((-0.2, 0.2), (-0.2, 0.2), fill_mode='nearest'),
+    ], name='augmentation')
+
+def _pipeline_options():
+    """Allow tf.data to reorder elements for throughput."""
+    import tensorflow as tf
+
+    options = tf.data.Options()
+    options.deterministic = False
+    return options
+
+def _finish(dataset, training, batch_size):
+    """Batch, normalize, augment and prefetch a dataset of uint8 images."""
+    import tensorflow as tf
+
+    if training:
+        augmentation = create_augmentation_layers()
+
+    dataset = dataset.batch(batch_size)
+
+    def normalize(images, labels):
+        images = tf.cast(images, tf.float32) / 255.0
+        if training:
+            images = augmentation(images, training=True)
+            # ImageDataGenerator's brightness_range=[0.8, 1.2], per image
+            brightness = tf.random.uniform([tf.shape(images)[0], 1, 1, 1], 0.8, 1.2)
+            images = tf.clip_by_value(images * brightness, 0.0, 1.0)
+        return images, labels
+
+    dataset = dataset.map(normalize, num_parallel_calls=tf.data.AUTOTUNE)
+    if training:
+        dataset = dataset.with_options(_pipeline_options())
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+def cache_path(cache_dir, files, img_size):
+    """Cache file name that changes whenever the files or their contents do."""
+    digest = hashlib.sha1(str(img_size).encode())
+    for path in files:
+        stat = os.stat(path)
+        digest.update(f"{path}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return os.path.join(cache_dir, digest.hexdigest()[:16])
+
+def remove_partial_cache(path):
+    """Delete what an interrupted caching pass left under a cache prefix.
+
+    tf.data writes a cache as `<prefix>_<shard>.*` files guarded by a
+    lockfile and only renames them to `<prefix>.*` after a full pass; a
+    stale lockfile would make the next run fail with AlreadyExistsError.
+    """
+    for leftover in glob.glob(glob.escape(path) + '_*'):
+        os.remove(leftover)
+
+def make_file_dataset(files, labels, training=False, batch_size=BATCH_SIZE, img_size=IMG_SIZE, cache_dir=None):
+    """Stream JPEG files from disk, decoding them in parallel.
+
+    Decoded uint8 images are cached after the first epoch, on disk under
+    `cache_dir` when given (keeps memory flat) or in memory otherwise.
+    """
+    import tensorflow as tf
+
+    files = [str(path) for path in files]
+    dataset = tf.data.Dataset.from_tensor_slices((files, np.asarray(labels, dtype=np.int32)))
+
+    def decode(path, label):
+        image = tf.io.decode_jpeg(tf.io.read_file(path), channels=3, dct_method='INTEGER_ACCURATE')
+        image = tf.image.resize(image, [img_size, img_size])
+        return tf.saturate_cast(image, tf.uint8), label
+
+    dataset = dataset.map(decode, num_parallel_calls=tf.data.AUTOTUNE)
+    if cache_dir:
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        path = cache_path(cache_dir, files, img_size)
+        remove_partial_cache(path)
+        dataset = dataset.cache(path)
+    else:
+        dataset = dataset.cache()
+
+    if training:
+        dataset = dataset.shuffle(SHUFFLE_BUFFER, reshuffle_each_iteration=True)
+
+    return _finish(dataset, training, batch_size)
+
+def make_packed_dataset(images, labels, indices, training=False, batch_size=BATCH_SIZE):
+    """Stream samples from a packed (memory-mapped) dataset.
+
+    Rows are gathered from the memory map in parallel reader calls, so no
+    cache is needed: the page cache already holds the decoded images.
+    """
+    import tensorflow as tf
+
+    indices = np.sort(np.asarray(indices))
+    img_shape = images.shape[1:]
+
+    def gather(index):
+        return images[index], labels[index].astype(np.int32)
+
+    def read(index):
+        image, label = tf.numpy_function(gather, [index], [tf.uint8, tf.int32])
+        image.set_shape(img_shape)
+        label.set_shape([])
+        return image, label
+
+    dataset = tf.data.Dataset.from_tensor_slices(indices)
+    if training:
+        dataset = dataset.shuffle(len(indices), reshuffle_each_iteration=True)
+    dataset = dataset.map(read, num_parallel_calls=tf.data.AUTOTUNE)
+
+    return _finish(dataset, training, batch_size)
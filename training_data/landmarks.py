@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Berlin landmarks command line
+One entry point for the training_data scripts. Each subcommand imports
+its script only when it runs, so TensorFlow, scikit-learn and matplotlib
+are never loaded for commands (or --help) that do not need them.
+"""
+
+import sys
+import argparse
+import importlib
+
+# subcommand: (module, description)
+COMMANDS = {
+    "prepare": ("prepare_images", "resize raw landmark photos into *_processed folders"),
+    "watch": ("watch_images", "keep the *_processed folders up to date as new photos arrive"),
+    "dedup": ("dedup", "find near-duplicate images and group them for leak-free splits"),
+    "pack": ("pack_dataset", "pack the processed images into a memory-mapped dataset"),
+    "train": ("train_model", "train the MobileNetV2 model (TensorFlow)"),
+    "train-simple": ("simple_train", "train the Random Forest model (scikit-learn)"),
+    "distill": ("distill_model", "distill the trained model into a smaller, faster student"),
+    "index": ("retrieval", "build or update the embedding nearest-neighbour landmark index"),
+    "convert": ("convert_to_tflite", "convert the Keras model to TensorFlow Lite"),
+    "predict": ("predict_landmark", "predict landmarks for images, folders or globs"),
+    "serve": ("serve", "serve predictions over local HTTP"),
+    "bench": ("benchmark", "benchmark every backend against the stored baseline"),
+}
+
+def parse_args(argv):
+    """Split the command line into a subcommand and its own arguments."""
+    parser = argparse.ArgumentParser(
+        prog="landmarks.py",
+        description="Berlin landmarks tools. Run 'landmarks.py <command> --help' for a command's options.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(
+            f"  {name:<14}{description}" for name, (_, description) in COMMANDS.items()
+        ),
+    )
+    parser.add_argument('--trace', metavar='PATH',
+                        help="record stage timings to a Chrome trace JSON file and print a summary")
+    parser.add_argument('command', choices=list(COMMANDS), metavar='command',
+                        help="one of: " + ", ".join(COMMANDS))
+    parser.add_argument('args', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Run a subcommand's main() with its own arguments."""
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    module_name, _ = COMMANDS[args.command]
+    if args.trace:
+        import tracing
+        tracing.enable(args.trace)
+
+    # The scripts parse sys.argv themselves; make their usage read "landmarks.py <command>"
+    sys.argv = [f"landmarks.py {args.command}", *args.args]
+    module = importlib.import_module(module_name)
+    module.main()
+
+if __name__ == "__main__":
+    main()
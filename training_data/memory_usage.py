@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Process memory readings for the Berlin landmarks scripts
+Current and peak resident memory of the running process, used by the
+benchmark suite and by simple_train.py's memory-budgeted training.
+"""
+
+import sys
+
+def _proc_status_mb(field):
+    """A memory field of /proc/self/status in MB, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def current_rss_mb():
+    """Resident memory of this process in MB (0 where /proc is unavailable)."""
+    rss = _proc_status_mb('VmRSS')
+    return 0.0 if rss is None else rss
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB.
+
+    VmHWM restarts at exec, unlike ru_maxrss, which a spawned child
+    inherits from its parent.
+    """
+    peak = _proc_status_mb('VmHWM')
+    if peak is not None:
+        return peak
+    # No resource module on Windows, so it is only imported here.
+    # ru_maxrss is reported in KB on Linux (bytes on macOS)
+    import resource
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Dataset Packing Script for Berlin Landmarks ML Training
+Packs the *_processed images into memory-mapped uint8 arrays so the
+trainers can load the whole dataset without decoding any JPEGs.
+"""
+
+import os
+import json
+import glob
+import time
+import argparse
+import numpy as np
+from PIL import Image
+from prepare_images import processed_folder_name
+
+# Configuration
+IMG_SIZE = 224
+PACK_DIR = "packed_dataset"
+IMAGES_FILE = "images.npy"
+LABELS_FILE = "labels.npy"
+META_FILE = "meta.json"
+# Train / validation / test shares
+SPLIT_FRACTIONS = (0.7, 0.15, 0.15)
+
+def find_processed_folders(data_dir, img_size=IMG_SIZE):
+    """Sorted (landmark_name, folder) pairs for one input resolution.
+
+    Uses the `<landmark>_processed_<size>` folders written by
+    `prepare_images.py --sizes` when present, and falls back to the
+    default `<landmark>_processed` folder otherwise (loaders then resize).
+    """
+    landmarks = set()
+    for pattern in ("*_processed", f"*_processed_{img_size}"):
+        for folder in glob.glob(os.path.join(data_dir, pattern)):
+            landmarks.add(os.path.join(data_dir, os.path.basename(folder).rsplit("_processed", 1)[0]))
+
+    folders = []
+    for landmark in sorted(landmarks):
+        folder = processed_folder_name(landmark, img_size)
+        if not os.path.isdir(folder):
+            folder = processed_folder_name(landmark)
+        folders.append((os.path.basename(landmark), folder))
+    return folders
+
+def find_processed_images(data_dir, img_size=IMG_SIZE):
+    """List (image_file, label) pairs and label names of all processed folders."""
+    samples = []
+    label_names = []
+    for i, (landmark_name, folder) in enumerate(find_processed_folders(data_dir, img_size)):
+        label_names.append(landmark_name)
+        for image_file in sorted(glob.glob(os.path.join(folder, "*.jpg"))):
+            samples.append((image_file, i))
+
+    return samples, label_names
+
+def pack_dataset(data_dir, pack_dir=PACK_DIR, img_size=IMG_SIZE):
+    """Decode every processed image once and write it into the packed arrays."""
+    print(f"📦 Packing {data_dir} into {pack_dir}...")
+
+    samples, label_names = find_processed_images(data_dir, img_size)
+    if not samples:
+        print("❌ No processed images found! Please run prepare_images.py first.")
+        return 0
+
+    if not os.path.exists(pack_dir):
+        os.makedirs(pack_dir)
+
+    # Images are written straight into the memory-mapped file, so the
+    # packer never holds more than one decoded image in memory
+    images = np.lib.format.open_memmap(
+        os.path.join(pack_dir, IMAGES_FILE), mode='w+', dtype=np.uint8,
+        shape=(len(samples), img_size, img_size, 3)
+    )
+    labels = np.zeros(len(samples), dtype=np.int32)
+    files = []
+
+    count = 0
+    for image_file, label in samples:
+        try:
+            with Image.open(image_file) as img:
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
+                if img.size != (img_size, img_size):
+                    img = img.resize((img_size, img_size))
+                images[count] = np.asarray(img)
+            labels[count] = label
+            files.append(image_file)
+            count += 1
+        except Exception as e:
+            print(f"Error loading {image_file}: {e}")
+
+    images.flush()
+    del images
+    np.save(os.path.join(pack_dir, LABELS_FILE), labels[:count])
+
+    # Rows past `count` (failed images) are left unused in images.npy
+    meta = {
+        "count": count,
+        "img_size": img_size,
+        "label_names": label_names,
+        "files": files
+    }
+    with open(os.path.join(pack_dir, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    return count
+
+def load_packed_dataset(pack_dir=PACK_DIR):
+    """Load a packed dataset as read-only memory maps (no copies)."""
+    print(f"📦 Loading packed dataset from {pack_dir}...")
+
+    with open(os.path.join(pack_dir, META_FILE), 'r') as f:
+        meta = json.load(f)
+
+    count = meta["count"]
+    images = np.load(os.path.join(pack_dir, IMAGES_FILE), mmap_mode='r')[:count]
+    labels = np.load(os.path.join(pack_dir, LABELS_FILE), mmap_mode='r')
+    label_names = meta["label_names"]
+
+    print(f"\n📊 Dataset Summary:")
+    print(f"  Total images: {len(images)}")
+    print(f"  Image shape: {images.shape[1:]}")
+    print(f"  Number of classes: {len(label_names)}")
+
+    # Print class distribution
+    unique, counts = np.unique(labels, return_counts=True)
+    print(f"\n📈 Class Distribution:")
+    for label, label_count in zip(unique, counts):
+        print(f"  {label_names[label]}: {label_count} images")
+
+    return images, labels, label_names
+
+def packed_files(pack_dir=PACK_DIR):
+    """Processed image path of every packed sample, in packed order."""
+    with open(os.path.join(pack_dir, META_FILE), 'r') as f:
+        return json.load(f)["files"]
+
+def split_indices(y, files=None):
+    """Stratified 70/15/15 train/validation/test split of sample indices.
+
+    With the image `files` and a dedup index saved by `dedup.py
+    --group-splits`, each near-duplicate group lands in a single split.
+    """
+    from sklearn.model_selection import train_test_split
+
+    groups = None
+    if files is not None:
+        from dedup import split_groups
+        groups = split_groups(files)
+    if groups is not None:
+        return group_split_indices(y, groups)
+
+    indices = np.arange(len(y))
+    train_idx, temp_idx = train_test_split(
+        indices, test_size=0.3, random_state=42, stratify=y
+    )
+    val_idx, test_idx = train_test_split(
+        temp_idx, test_size=0.5, random_state=42, stratify=y[temp_idx]
+    )
+    return train_idx, val_idx, test_idx
+
+def group_split_indices(y, groups):
+    """Stratified 70/15/15 split that never separates samples of one group.
+
+    Groups are visited largest first (ties in seeded random order) and each
+    goes to the split that is furthest below its share of the group's class.
+    """
+    print(f"🔗 Splitting by {len(np.unique(groups))} image groups (near-duplicates kept together)")
+    _, group_index = np.unique(groups, return_inverse=True)
+    members = np.split(np.argsort(group_index, kind='stable'), np.cumsum(np.bincount(group_index))[:-1])
+
+    rng = np.random.default_rng(42)
+    order = rng.permutation(len(members))
+    order = order[np.argsort([-len(members[g]) for g in order], kind='stable')]
+
+    class_totals = np.bincount(y)
+    filled = np.zeros((len(class_totals), len(SPLIT_FRACTIONS)))
+    split_of = np.empty(len(y), dtype=np.int64)
+    for g in order:
+        label = np.bincount(y[members[g]]).argmax()
+        split = np.argmax(np.array(SPLIT_FRACTIONS) * class_totals[label] - filled[label])
+        split_of[members[g]] = split
+        filled[label, split] += len(members[g])
+
+    return tuple(np.flatnonzero(split_of == split) for split in range(len(SPLIT_FRACTIONS)))
+
+def load_split_images(data_dir, img_size=IMG_SIZE):
+    """Training and held-out test image paths, using the trainers' split."""
+    samples, _ = find_processed_images(data_dir, img_size)
+    if not samples:
+        return [], [], np.array([], dtype=np.int32)
+    files = [path for path, _ in samples]
+    y = np.array([label for _, label in samples], dtype=np.int32)
+    train_idx, _, test_idx = split_indices(y, files)
+    return [files[i] for i in train_idx], [files[i] for i in test_idx], y[test_idx]
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Pack processed landmark images into memory-mapped arrays.")
+    parser.add_argument('--data-dir', default=".",
+                        help="folder containing the *_processed folders (default: .)")
+    parser.add_argument('--output', default=PACK_DIR,
+                        help=f"output folder for the packed dataset (default: {PACK_DIR})")
+    parser.add_argument('--img-size', type=int, default=IMG_SIZE,
+                        help=f"resolution of the packed images (default: {IMG_SIZE})")
+    return parser.parse_args()
+
+def main():
+    """Main packing function."""
+    args = parse_args()
+
+    print("🏛️ Berlin Landmarks Dataset Packer")
+    print("=" * 50)
+
+    start_time = time.perf_counter()
+    count = pack_dataset(args.data_dir, args.output, args.img_size)
+    elapsed = time.perf_counter() - start_time
+
+    if count == 0:
+        return
+
+    images_size = os.path.getsize(os.path.join(args.output, IMAGES_FILE)) / (1024 * 1024)
+
+    print(f"\n🎉 Packed {count} images in {elapsed:.2f}s")
+    print(f"📁 Saved in: {args.output}/ ({images_size:.1f} MB of uint8 images)")
+    print(f"\n🚀 Next steps:")
+    print(f"  1. python simple_train.py --packed {args.output}")
+    print(f"  2. python train_model.py --packed {args.output}")
+
+if __name__ == "__main__":
+    main()
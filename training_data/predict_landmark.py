@@ -1,46 +1,218 @@
 #!/usr/bin/env python3
 """
 Simple prediction script for Berlin landmarks model
+Scores single images, or whole folders and globs in batches.
 """
 
+import os
+import sys
+import csv
+import glob
+import json
 import pickle
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from PIL import Image
+from features import IMG_SIZE, extract_features, load_image_array
+from forest_model import FOREST_PATH, load_forest
 
-def load_model():
-    """Load the trained model."""
-    with open('berlin_landmarks_model.pkl', 'rb') as f:
-        model = pickle.load(f)
-    
-    with open('landmark_labels.txt', 'r') as f:
-        labels = [line.strip().split(': ')[1] for line in f]
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+BATCH_SIZE = 256
+TOP_K = 3
+
+def load_labels(labels_path='landmark_labels.txt'):
+    """Load the label names written by the trainers."""
+    with open(labels_path, 'r') as f:
+        return [line.strip().split(': ')[1] for line in f]
+
+def load_model(model_path=None, labels_path='landmark_labels.txt'):
+    """Load the trained model.
     
+    `.forest` models are memory-mapped and carry their own labels; other
+    paths are unpickled. Without a path the forest export is preferred.
+    """
+    if model_path is None:
+        model_path = FOREST_PATH if os.path.exists(FOREST_PATH + '.json') else 'berlin_landmarks_model.pkl'
+
+    if model_path.endswith('.forest'):
+        model = load_forest(model_path)
+        return model, model.labels
+
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+
+    labels = load_labels(labels_path)
+
     return model, labels
 
+def model_feature_spec(model):
+    """Feature extractor a model was trained with (raw pixels for older models)."""
+    return getattr(model, 'feature_spec_', {"name": "raw", "img_size": IMG_SIZE})
+
 def predict_landmark(image_path, model, labels):
     """Predict landmark from image."""
-    # Load and preprocess image
-    img = Image.open(image_path)
-    img = img.resize((224, 224))
-    img_array = np.array(img)
-    
-    # Convert to grayscale and flatten
-    if len(img_array.shape) == 3:
-        img_gray = np.mean(img_array, axis=2)
-    else:
-        img_gray = img_array
-    
-    # Normalize and flatten
-    img_normalized = img_gray / 255.0
-    img_flattened = img_normalized.flatten().reshape(1, -1)
-    
-    # Predict
-    prediction = model.predict(img_flattened)[0]
-    confidence = model.predict_proba(img_flattened)[0].max()
-    
-    return labels[prediction], confidence
+    spec = model_feature_spec(model)
+
+    # Load image and extract the features the model was trained on
+    img_array = load_image_array(image_path, spec["img_size"])
+    features = extract_features(img_array[np.newaxis], spec["name"])
+
+    # Predict; label and confidence both come from one pass over the trees
+    probabilities = model.predict_proba(features)[0]
+    best = np.argmax(probabilities)
+
+    return labels[model.classes_[best]], probabilities[best]
+
+def predict_batch(images, model, labels, top_k=TOP_K):
+    """Top-k (label, confidence) lists for a batch of uint8 RGB images."""
+    features = extract_features(images, model_feature_spec(model)["name"])
+    probabilities = model.predict_proba(features)
+
+    return top_k_labels(probabilities, [labels[c] for c in model.classes_], top_k)
+
+def top_k_labels(probabilities, class_labels, top_k=TOP_K):
+    """Top-k (label, confidence) lists for each row of a probability matrix."""
+    top_k = min(top_k, probabilities.shape[1])
+    best = np.argsort(-probabilities, axis=1, kind='stable')[:, :top_k]
+    return [
+        [(class_labels[j], float(row[j])) for j in order]
+        for row, order in zip(probabilities, best)
+    ]
+
+def expand_inputs(inputs):
+    """Expand files, folders (recursively) and glob patterns into image paths."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                paths.extend(os.path.join(root, name) for name in sorted(files)
+                             if name.lower().endswith(IMAGE_EXTENSIONS))
+        elif glob.has_magic(item):
+            paths.extend(sorted(path for path in glob.glob(item, recursive=True)
+                                if path.lower().endswith(IMAGE_EXTENSIONS)))
+        else:
+            paths.append(item)
+    return paths
+
+def _load(path, img_size):
+    """Decode one image for batch prediction, returning None on failure."""
+    try:
+        return load_image_array(path, img_size)
+    except Exception as e:
+        print(f"Error loading {path}: {e}", file=sys.stderr)
+        return None
+
+def predict_paths(paths, model, labels, batch_size=BATCH_SIZE, top_k=TOP_K, workers=None):
+    """Yield (path, top-k predictions or None) for every path, batch by batch.
+
+    Images are decoded on a thread pool; the next batch is decoded while
+    the current one is being scored, and each batch needs a single
+    `predict_proba` call.
+    """
+    img_size = model_feature_spec(model)["img_size"]
+    batches = (paths[start:start + batch_size] for start in range(0, len(paths), batch_size))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def submit(batch):
+            return batch, [executor.submit(_load, path, img_size) for path in batch]
+
+        pending = next(batches, None)
+        pending = submit(pending) if pending else None
+        while pending:
+            batch, futures = pending
+            following = next(batches, None)
+            pending = submit(following) if following else None
+
+            images = [future.result() for future in futures]
+            loaded = [i for i, image in enumerate(images) if image is not None]
+            results = [None] * len(batch)
+            if loaded:
+                predictions = predict_batch(np.stack([images[i] for i in loaded]), model, labels, top_k)
+                for i, prediction in zip(loaded, predictions):
+                    results[i] = prediction
+
+            yield from zip(batch, results)
+
+def write_csv(results, out, top_k=TOP_K):
+    """Stream predictions as CSV rows."""
+    writer = csv.writer(out)
+    header = ['path', 'label', 'confidence']
+    for k in range(2, top_k + 1):
+        header += [f'label_{k}', f'confidence_{k}']
+    writer.writerow(header)
+
+    for path, predictions in results:
+        row = [path]
+        for label, confidence in predictions or []:
+            row += [label, f"{confidence:.4f}"]
+        writer.writerow(row)
+
+def write_jsonl(results, out):
+    """Stream predictions as JSON Lines."""
+    for path, predictions in results:
+        if predictions is None:
+            record = {"path": path, "error": "could not load image"}
+        else:
+            record = {
+                "path": path,
+                "label": predictions[0][0],
+                "confidence": round(predictions[0][1], 4),
+                "top_k": [{"label": label, "confidence": round(confidence, 4)}
+                          for label, confidence in predictions]
+            }
+        out.write(json.dumps(record) + "\n")
+
+def positive_int(value):
+    """argparse type for options that need at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Predict Berlin landmarks for images, folders or globs.")
+    parser.add_argument('inputs', nargs='*',
+                        help="image files, folders or glob patterns (none: print the model classes)")
+    parser.add_argument('--model',
+                        help="model file: .forest export or pickle (default: forest export if present)")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv',
+                        help="output format (default: csv)")
+    parser.add_argument('--top-k', type=positive_int, default=TOP_K,
+                        help=f"predictions per image (default: {TOP_K})")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f"images per predict_proba call (default: {BATCH_SIZE})")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="image decoding threads (default: Python's thread pool default)")
+    parser.add_argument('--output', '-o',
+                        help="write results to this file instead of stdout")
+    return parser.parse_args()
+
+def main():
+    """Main prediction function."""
+    args = parse_args()
+    model, labels = load_model(args.model)
+
+    if not args.inputs:
+        print(f"Model loaded with {len(labels)} classes")
+        print(f"Classes: {labels}")
+        print(f"Features: {model_feature_spec(model)['name']}")
+        return
+
+    paths = expand_inputs(args.inputs)
+    print(f"📸 Scoring {len(paths)} images...", file=sys.stderr)
+
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        results = predict_paths(paths, model, labels, args.batch_size, args.top_k, args.workers)
+        if args.format == 'jsonl':
+            write_jsonl(results, out)
+        else:
+            write_csv(results, out, args.top_k)
+    finally:
+        if args.output:
+            out.close()
 
 if __name__ == "__main__":
-    model, labels = load_model()
-    print(f"Model loaded with {len(labels)} classes")
-    print(f"Classes: {labels}")
+    main()
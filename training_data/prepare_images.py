@@ -6,103 +6,474 @@ This script helps resize and prepare images for training.
 
 import os
 import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 import glob
+import tracing
 
-def resize_image(image_path, output_path, size=(224, 224)):
+IMAGE_EXTENSIONS = ['*.jpg', '*.jpeg', '*.png', '*.bmp']
+TARGET_SIZE = (224, 224)
+DEFAULT_SIZE = TARGET_SIZE[0]
+JPEG_QUALITY = 85
+MANIFEST_NAME = '.manifest.json'
+BENCHMARK_IMAGES = 50
+
+# Resize presets. "draft" lets libjpeg decode JPEGs at 1/2, 1/4 or 1/8 scale
+# and then box-reduces any image by an integer factor before the RGB
+# conversion; "reducing_gap" is how much larger than the largest output the
+# image stays before the final "resample" filter runs.
+DEFAULT_PRESET = 'quality'
+RESIZE_PRESETS = {
+    'quality': {"draft": False, "reducing_gap": 2.0, "resample": Image.Resampling.LANCZOS},
+    'balanced': {"draft": True, "reducing_gap": 2.0, "resample": Image.Resampling.LANCZOS},
+    'fast': {"draft": True, "reducing_gap": 1.0, "resample": Image.Resampling.BILINEAR},
+}
+
+LANDMARK_FOLDERS = [
+    'brandenburg_gate',
+    'museum_island', 
+    'berlin_cathedral',
+    'east_side_gallery',
+    'checkpoint_charlie',
+    'gendarmenmarkt',
+    'charlottenburg_palace',
+    'tempelhofer_feld',
+    'tiergarten_park',
+    'potsdamer_platz',
+    'victory_column',
+    'berlin_zoo',
+    'hackescher_markt',
+    'prenzlauer_berg',
+    'olympic_stadium'
+]
+
+def resize_image(image_path, output_path, size=TARGET_SIZE, quality=JPEG_QUALITY, preset=DEFAULT_PRESET):
     """Resize image to specified size while maintaining aspect ratio."""
+    return resize_image_to_sizes(image_path, [(output_path, size)], quality, preset)
+
+def decode_image(img, largest, preset=DEFAULT_PRESET):
+    """Decode an opened image as RGB, only as large as the preset needs."""
+    settings = RESIZE_PRESETS[preset]
+    if settings["draft"]:
+        target = int(largest * settings["reducing_gap"])
+        # JPEG: scale down inside the decoder (no-op for other formats)
+        img.draft('RGB', (target, target))
+        img.load()
+        # Image.reduce only takes L/RGB-like modes; palette, bilevel and
+        # 16-bit images are converted first
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        # Cheap integer box filter, before the final filter
+        factor = max(img.size) // target
+        if factor > 1:
+            img = img.reduce(factor)
+    
+    # Convert to RGB if necessary
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.load()
+    return img
+
+def resize_image_to_sizes(image_path, outputs, quality=JPEG_QUALITY, preset=DEFAULT_PRESET):
+    """Decode an image once and write a padded copy for each (output_path, size)."""
+    settings = RESIZE_PRESETS[preset]
     try:
         with Image.open(image_path) as img:
-            # Convert to RGB if necessary
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Resize with aspect ratio preservation
-            img.thumbnail(size, Image.Resampling.LANCZOS)
+            with tracing.span("decode", preset=preset):
+                img = decode_image(img, max(max(size) for _, size in outputs), preset)
+            tracing.count("images_decoded")
             
-            # Create new image with padding to reach target size
-            new_img = Image.new('RGB', size, (255, 255, 255))
-            new_img.paste(img, ((size[0] - img.width) // 2, (size[1] - img.height) // 2))
-            
-            # Save resized image
-            new_img.save(output_path, 'JPEG', quality=85)
+            for output_path, size in outputs:
+                with tracing.span("resize", size=size[0]):
+                    # Resize with aspect ratio preservation
+                    resized = img.copy()
+                    resized.thumbnail(size, settings["resample"], reducing_gap=settings["reducing_gap"])
+                    
+                    # Create new image with padding to reach target size
+                    new_img = Image.new('RGB', size, (255, 255, 255))
+                    new_img.paste(resized, ((size[0] - resized.width) // 2, (size[1] - resized.height) // 2))
+                
+                # Save resized image
+                with tracing.span("save", size=size[0]):
+                    new_img.save(output_path, 'JPEG', quality=quality)
+                tracing.count("images_written")
             return True
     except Exception as e:
         print(f"Error processing {image_path}: {e}")
         return False
 
-def prepare_landmark_folder(landmark_folder):
-    """Prepare all images in a landmark folder."""
-    print(f"\n📸 Processing {landmark_folder}...")
-    
-    # Create processed folder
-    processed_folder = f"{landmark_folder}_processed"
-    if not os.path.exists(processed_folder):
-        os.makedirs(processed_folder)
-    
-    # Get all image files
-    image_extensions = ['*.jpg', '*.jpeg', '*.png', '*.bmp']
+def find_images(landmark_folder):
+    """Find all source images in a landmark folder."""
     image_files = []
-    for ext in image_extensions:
+    for ext in IMAGE_EXTENSIONS:
         image_files.extend(glob.glob(os.path.join(landmark_folder, ext)))
         image_files.extend(glob.glob(os.path.join(landmark_folder, ext.upper())))
+    return image_files
+
+def processed_folder_name(landmark_folder, size=DEFAULT_SIZE):
+    """Processed folder of a landmark for one resolution.
+    
+    The default resolution keeps the plain `<landmark>_processed` name;
+    other resolutions go to `<landmark>_processed_<size>`.
+    """
+    if size == DEFAULT_SIZE:
+        return f"{landmark_folder}_processed"
+    return f"{landmark_folder}_processed_{size}"
+
+def sample_key(path):
+    """'<landmark>/<stem>' for a source image or any of its processed copies."""
+    folder = os.path.basename(os.path.dirname(path))
+    landmark = folder.rsplit('_processed', 1)[0]
+    return f"{landmark}/{os.path.splitext(os.path.basename(path))[0]}"
+
+def processed_path(image_path, processed_folder):
+    """Output path of a source image inside its processed folder."""
+    filename = os.path.basename(image_path)
+    return os.path.join(processed_folder, f"{os.path.splitext(filename)[0]}.jpg")
+
+def file_sha256(path):
+    """Content hash of a file, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def current_settings(size=DEFAULT_SIZE, preset=DEFAULT_PRESET):
+    """Settings that invalidate every processed image when they change."""
+    return {"size": [size, size], "quality": JPEG_QUALITY, "preset": preset}
+
+def load_manifest(processed_folder):
+    """Load the manifest of a processed folder, or an empty one."""
+    manifest_path = os.path.join(processed_folder, MANIFEST_NAME)
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(processed_folder, files, size=DEFAULT_SIZE, preset=DEFAULT_PRESET):
+    """Atomically write the manifest of a processed folder."""
+    manifest_path = os.path.join(processed_folder, MANIFEST_NAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({"settings": current_settings(size, preset), "files": files}, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def plan_landmark_folder(landmark_folder, image_files, force=False, size=DEFAULT_SIZE, preset=DEFAULT_PRESET):
+    """Compare a landmark folder against its manifest.
+    
+    Returns the manifest entries that are still up to date, the
+    (source, output, entry) triples that need processing and the outputs
+    whose source images have been deleted. Unchanged size and mtime skip a
+    file without reading it; otherwise the content hash decides. Images
+    deleted while the folder is planned count as deleted.
+    """
+    processed_folder = processed_folder_name(landmark_folder, size)
+    manifest = load_manifest(processed_folder)
+    previous_files = manifest.get("files", {})
+    if force or manifest.get("settings") != current_settings(size, preset):
+        previous = {}
+    else:
+        previous = previous_files
+    
+    up_to_date = {}
+    pending = []
+    live_outputs = set()
+    for image_path in image_files:
+        output_path = processed_path(image_path, processed_folder)
+        try:
+            stat = os.stat(image_path)
+            entry = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "output": os.path.basename(output_path)
+            }
+            
+            old = previous.get(image_path)
+            if old and old.get("output") == entry["output"] and os.path.exists(output_path):
+                if old["size"] == entry["size"] and old["mtime_ns"] == entry["mtime_ns"]:
+                    up_to_date[image_path] = old
+                    live_outputs.add(output_path)
+                    continue
+                if old["size"] == entry["size"]:
+                    entry["sha256"] = file_sha256(image_path)
+                    if entry["sha256"] == old.get("sha256"):
+                        up_to_date[image_path] = entry
+                        live_outputs.add(output_path)
+                        continue
+            
+            if "sha256" not in entry:
+                entry["sha256"] = file_sha256(image_path)
+        except FileNotFoundError:
+            continue
+        pending.append((image_path, output_path, entry))
+        live_outputs.add(output_path)
+    
+    stale_outputs = []
+    for image_path, old in previous_files.items():
+        output_path = os.path.join(processed_folder, old["output"])
+        if image_path not in up_to_date and output_path not in live_outputs:
+            stale_outputs.append(output_path)
+    
+    return up_to_date, pending, stale_outputs
+
+def remove_stale_outputs(stale_outputs):
+    """Delete processed images whose source image no longer exists."""
+    for output_path in stale_outputs:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+            print(f"🗑️  Removed {os.path.basename(output_path)} (source deleted)")
+
+def plan_sizes(landmark_folder, sizes, force=False, preset=DEFAULT_PRESET, skip=frozenset()):
+    """Plan a landmark folder for every resolution at once.
+    
+    Returns the source images, the per-size plans and one work item per
+    source image that is out of date in at least one resolution, as
+    (source, [(output, size, entry), ...]), so each image is decoded once.
+    Images whose sample key is in `skip` are left out, so earlier outputs
+    of them are removed as stale.
+    """
+    image_files = [path for path in find_images(landmark_folder) if sample_key(path) not in skip]
+    plans = {}
+    work = {}
+    for size in sizes:
+        processed_folder = processed_folder_name(landmark_folder, size)
+        if not os.path.exists(processed_folder):
+            os.makedirs(processed_folder)
+        up_to_date, pending, stale_outputs = plan_landmark_folder(landmark_folder, image_files, force, size, preset)
+        plans[size] = (up_to_date, stale_outputs)
+        for image_path, output_path, entry in pending:
+            work.setdefault(image_path, []).append((output_path, size, entry))
+    return image_files, plans, list(work.items())
+
+def _report_start(landmark_folder, image_files, plans, work, preset=DEFAULT_PRESET):
+    """Print the header of a landmark folder; returns False when it is empty."""
+    print(f"\n📸 Processing {landmark_folder}...")
+    for up_to_date, stale_outputs in plans.values():
+        remove_stale_outputs(stale_outputs)
     
     if not image_files:
+        for size, (up_to_date, _) in plans.items():
+            save_manifest(processed_folder_name(landmark_folder, size), up_to_date, size, preset)
         print(f"❌ No images found in {landmark_folder}")
-        return 0
+        return False
     
     print(f"Found {len(image_files)} images")
+    skipped = len(image_files) - len(work)
+    if skipped:
+        print(f"⏭️  Skipping {skipped} unchanged images")
+    return True
+
+def _record_result(image_path, outputs, ok, plans, elapsed):
+    """Mark a processed image as up to date in every resolution it was written for."""
+    filename = os.path.basename(image_path)
+    if ok:
+        for _, size, entry in outputs:
+            plans[size][0][image_path] = entry
+        print(f"✅ {filename} ({elapsed * 1000:.1f} ms)")
+    else:
+        print(f"❌ {filename}")
+
+def _save_manifests(landmark_folder, plans, preset=DEFAULT_PRESET):
+    for size, (up_to_date, _) in plans.items():
+        save_manifest(processed_folder_name(landmark_folder, size), up_to_date, size, preset)
+
+def _report_done(processed_count, work, total_time):
+    average = f", {total_time / len(work) * 1000:.1f} ms/image" if work else ""
+    print(f"Processed {processed_count}/{len(work)} images{average}")
+
+def prepare_landmark_folder(landmark_folder, force=False, sizes=(DEFAULT_SIZE,), preset=DEFAULT_PRESET,
+                            skip=frozenset()):
+    """Prepare all new or changed images in a landmark folder."""
+    # Get all image files and compare them with the manifests
+    with tracing.span("plan", folder=landmark_folder):
+        image_files, plans, work = plan_sizes(landmark_folder, sizes, force, preset, skip)
+    if not _report_start(landmark_folder, image_files, plans, work, preset):
+        return 0
     
-    # Process each image
+    # Process each new or changed image, decoding it once for all sizes
     processed_count = 0
-    for image_path in image_files:
-        filename = os.path.basename(image_path)
-        output_path = os.path.join(processed_folder, f"{os.path.splitext(filename)[0]}.jpg")
-        
-        if resize_image(image_path, output_path):
-            processed_count += 1
-            print(f"✅ {filename}")
-        else:
-            print(f"❌ {filename}")
+    total_time = 0.0
+    for image_path, outputs in work:
+        ok, elapsed = _resize_task(
+            (image_path, [(output_path, (size, size)) for output_path, size, _ in outputs], preset)
+        )
+        _record_result(image_path, outputs, ok, plans, elapsed)
+        processed_count += ok
+        total_time += elapsed
     
-    print(f"Processed {processed_count}/{len(image_files)} images")
+    with tracing.span("save_manifests", folder=landmark_folder):
+        _save_manifests(landmark_folder, plans, preset)
+    _report_done(processed_count, work, total_time)
     return processed_count
 
+def _resize_task(task):
+    """Process pool entry point for one source image and its outputs; returns (ok, seconds)."""
+    image_path, outputs, preset = task
+    start_time = time.perf_counter()
+    ok = resize_image_to_sizes(image_path, outputs, preset=preset)
+    return ok, time.perf_counter() - start_time
+
+def _pool_resize_task(task):
+    """Like _resize_task, plus the trace events the worker recorded for it."""
+    return (*_resize_task(task), tracing.drain())
+
+def prepare_landmark_folders_parallel(landmark_folders, workers, force=False, sizes=(DEFAULT_SIZE,),
+                                      preset=DEFAULT_PRESET, skip=frozenset()):
+    """Prepare several landmark folders with one shared process pool.
+    
+    Work from all folders is spread across the pool, while results are
+    reported per folder in the same order and format as the serial path.
+    """
+    jobs = []
+    tasks = []
+    for landmark_folder in landmark_folders:
+        with tracing.span("plan", folder=landmark_folder):
+            image_files, plans, work = plan_sizes(landmark_folder, sizes, force, preset, skip)
+        jobs.append((landmark_folder, image_files, plans, work))
+        tasks.extend(
+            (image_path, [(output_path, (size, size)) for output_path, size, _ in outputs], preset)
+            for image_path, outputs in work
+        )
+    
+    total_processed = 0
+    chunksize = max(1, len(tasks) // (workers * 4))
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_pool_resize_task, tasks, chunksize=chunksize)
+        
+        for landmark_folder, image_files, plans, work in jobs:
+            if not _report_start(landmark_folder, image_files, plans, work, preset):
+                continue
+            
+            processed_count = 0
+            total_time = 0.0
+            for image_path, outputs in work:
+                ok, elapsed, recorded = next(results)
+                tracing.merge(recorded)
+                _record_result(image_path, outputs, ok, plans, elapsed)
+                processed_count += ok
+                total_time += elapsed
+            
+            with tracing.span("save_manifests", folder=landmark_folder):
+                _save_manifests(landmark_folder, plans, preset)
+            _report_done(processed_count, work, total_time)
+            total_processed += processed_count
+    
+    return total_processed
+
+def benchmark_presets(landmark_folders, sizes, count=BENCHMARK_IMAGES):
+    """Time every resize preset on the same source images, writing to a scratch folder.
+    
+    Also reports how far each preset's output drifts from the quality
+    preset, as the mean absolute pixel difference (0-255).
+    """
+    import tempfile
+    import numpy as np
+    
+    image_files = [path for folder in landmark_folders for path in find_images(folder)][:count]
+    if not image_files:
+        print("❌ No images found to benchmark")
+        return
+    print(f"\n⏱️  Benchmarking presets on {len(image_files)} images ({', '.join(map(str, sizes))})...")
+    
+    with tempfile.TemporaryDirectory() as scratch:
+        outputs = {}
+        timings = {}
+        for preset in RESIZE_PRESETS:
+            outputs[preset] = []
+            timings[preset] = []
+            for i, image_path in enumerate(image_files):
+                targets = [(os.path.join(scratch, f"{preset}-{i}-{size}.jpg"), (size, size)) for size in sizes]
+                start_time = time.perf_counter()
+                resize_image_to_sizes(image_path, targets, preset=preset)
+                timings[preset].append(time.perf_counter() - start_time)
+                outputs[preset].append([path for path, _ in targets])
+        
+        print(f"\n{'Preset':<10} {'mean ms':>8} {'p50 ms':>8} {'max ms':>8} {'Speedup':>8} {'Pixel diff':>11}")
+        reference = sum(timings[DEFAULT_PRESET])
+        for preset, times in timings.items():
+            diffs = []
+            for paths, reference_paths in zip(outputs[preset], outputs[DEFAULT_PRESET]):
+                for path, reference_path in zip(paths, reference_paths):
+                    with Image.open(path) as a, Image.open(reference_path) as b:
+                        diffs.append(np.abs(np.asarray(a, dtype=np.int16) - np.asarray(b, dtype=np.int16)).mean())
+            times = np.array(times) * 1000
+            print(f"{preset:<10} {times.mean():>8.2f} {np.median(times):>8.2f} {times.max():>8.2f} "
+                  f"{reference / (times.sum() / 1000):>7.2f}x {np.mean(diffs):>11.2f}")
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Resize and pad landmark images for training.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of worker processes (0 = all CPU cores, default: 1)")
+    parser.add_argument('--force', action='store_true',
+                        help="ignore the manifests and reprocess every image")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[DEFAULT_SIZE],
+                        help=f"square output resolutions, all written from a single decode; "
+                             f"{DEFAULT_SIZE} goes to <landmark>_processed, others to "
+                             f"<landmark>_processed_<size> (default: {DEFAULT_SIZE})")
+    parser.add_argument('--preset', choices=list(RESIZE_PRESETS), default=DEFAULT_PRESET,
+                        help="decode/resize trade-off: quality (full decode, LANCZOS), balanced "
+                             "(JPEG draft decode and integer reduce, then LANCZOS) or fast "
+                             f"(reduce to the output size, then bilinear; default: {DEFAULT_PRESET})")
+    parser.add_argument('--skip-duplicates', action='store_true',
+                        help="leave out near-duplicates found by dedup.py, keeping one image per group")
+    parser.add_argument('--benchmark-presets', action='store_true',
+                        help=f"time every preset on up to {BENCHMARK_IMAGES} source images and exit")
+    return parser.parse_args()
+
 def main():
     """Main function to prepare all landmark folders."""
+    args = parse_args()
+    workers = args.workers or os.cpu_count() or 1
+    
     print("🏛️ Berlin Landmarks Image Preparation Tool")
     print("=" * 50)
+    print(f"📐 Output sizes: {', '.join(f'{size}x{size}' for size in args.sizes)} ({args.preset} preset)")
     
-    # Get all landmark folders
-    landmark_folders = [
-        'brandenburg_gate',
-        'museum_island', 
-        'berlin_cathedral',
-        'east_side_gallery',
-        'checkpoint_charlie',
-        'gendarmenmarkt',
-        'charlottenburg_palace',
-        'tempelhofer_feld',
-        'tiergarten_park',
-        'potsdamer_platz',
-        'victory_column',
-        'berlin_zoo',
-        'hackescher_markt',
-        'prenzlauer_berg',
-        'olympic_stadium'
-    ]
-    
-    total_processed = 0
-    
-    for folder in landmark_folders:
+    landmark_folders = []
+    for folder in LANDMARK_FOLDERS:
         if os.path.exists(folder):
-            processed = prepare_landmark_folder(folder)
-            total_processed += processed
+            landmark_folders.append(folder)
         else:
             print(f"⚠️  Folder {folder} not found")
     
+    if args.benchmark_presets:
+        benchmark_presets(landmark_folders, args.sizes)
+        return
+    
+    skip = frozenset()
+    if args.skip_duplicates:
+        from dedup import INDEX_PATH, duplicate_keys, load_index
+        index = load_index()
+        if index is None:
+            print(f"❌ Error: {INDEX_PATH} not found! Run dedup.py first.")
+            sys.exit(1)
+        skip = duplicate_keys(index)
+        print(f"🔗 Skipping {len(skip)} near-duplicates listed in {INDEX_PATH}")
+    
+    total_processed = 0
+    start_time = time.perf_counter()
+    
+    if workers > 1:
+        print(f"⚙️  Using {workers} worker processes")
+        total_processed = prepare_landmark_folders_parallel(landmark_folders, workers, args.force, args.sizes, args.preset, skip)
+    else:
+        for folder in landmark_folders:
+            total_processed += prepare_landmark_folder(folder, args.force, args.sizes, args.preset, skip)
+    
+    elapsed = time.perf_counter() - start_time
+    throughput = total_processed / elapsed if elapsed > 0 else 0.0
+    
     print("\n" + "=" * 50)
     print(f"🎉 Total images processed: {total_processed}")
+    print(f"⏱️  {total_processed} images in {elapsed:.2f}s ({throughput:.1f} images/sec, {workers} worker(s))")
     print("\n📋 Next steps:")
     print("1. Check the *_processed folders for resized images")
     print("2. Verify image quality and diversity")
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Embedding nearest-neighbour index for Berlin landmarks
+Classifies images by a top-k vote over the pooled MobileNetV2 embeddings
+of reference images, so landmarks can be added or removed without any
+retraining. Embeddings are reduced with PCA and product-quantized to a
+few bytes each; queries scan the codes with per-query lookup tables.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+INDEX_DIR = "landmark_index"
+FORMAT_VERSION = 1
+PCA_DIM = 128
+SUBVECTORS = 16
+CENTROIDS = 256
+NEIGHBOURS = 5
+TOP_K = 3
+# Rows used to fit PCA and the codebooks; the rest are only encoded
+MAX_TRAIN_ROWS = 20000
+ENCODE_BATCH = 4096
+SCALE_TEST_SIZE = 100000
+
+def _save_array(path, array):
+    """Write an .npy file atomically."""
+    tmp_path = path + '.tmp.npy'
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+class LandmarkIndex:
+    """PCA + product-quantized vectors with one landmark label per row.
+
+    Vectors are L2-normalized, centred and projected to `pca_dim` dims,
+    then split into `subvectors` parts that are each replaced by the
+    index of their nearest codebook centroid (one byte). A query builds a
+    table of its squared distance to every centroid and sums table entries
+    along each row's codes (asymmetric distance computation). Codes are
+    kept subvector-major, (subvectors, rows), so each step of the scan is
+    one contiguous gather.
+    """
+
+    def __init__(self, header, mean, components, codebooks, codes, label_ids):
+        self.header = header
+        self.labels = header["labels"]
+        self.img_size = header["img_size"]
+        self.mean = mean
+        self.components = components
+        self.codebooks = codebooks
+        self.codes = codes
+        self.label_ids = label_ids
+
+    def __len__(self):
+        return self.codes.shape[1]
+
+    @classmethod
+    def build(cls, embeddings, row_labels, img_size, backbone, pca_dim=PCA_DIM, subvectors=SUBVECTORS):
+        """Fit PCA and the codebooks on `embeddings` and index them."""
+        from sklearn.cluster import KMeans
+
+        rng = np.random.default_rng(42)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        train = embeddings[rng.permutation(len(embeddings))[:MAX_TRAIN_ROWS]]
+        train = train / np.maximum(np.linalg.norm(train, axis=1, keepdims=True), 1e-12)
+
+        # PCA through the SVD of the centred training rows
+        mean = train.mean(axis=0)
+        _, _, vt = np.linalg.svd(train - mean, full_matrices=False)
+        pca_dim = min(pca_dim, len(vt)) // subvectors * subvectors
+        if pca_dim == 0:
+            raise ValueError(f"need at least {subvectors} reference images to build an index")
+        components = np.ascontiguousarray(vt[:pca_dim].T)
+
+        # One k-means codebook per subvector
+        projected = (train - mean) @ components
+        parts = projected.reshape(len(projected), subvectors, -1)
+        centroids = min(CENTROIDS, len(np.unique(train, axis=0)))
+        codebooks = np.stack([
+            KMeans(n_clusters=centroids, n_init=1, random_state=0).fit(parts[:, m]).cluster_centers_
+            for m in range(subvectors)
+        ]).astype(np.float32)
+
+        labels, label_ids = np.unique(np.asarray(row_labels), return_inverse=True)
+        header = {
+            "format": "berlin-landmarks-retrieval",
+            "version": FORMAT_VERSION,
+            "backbone": backbone,
+            "img_size": img_size,
+            "pca_dim": pca_dim,
+            "subvectors": subvectors,
+            "neighbours": NEIGHBOURS,
+            "labels": [str(label) for label in labels],
+        }
+        index = cls(header, mean, components, codebooks, None, label_ids.astype(np.int32))
+        index.codes = index.encode(embeddings)
+        return index
+
+    def project(self, embeddings):
+        """Normalized, centred PCA projection, split into subvectors."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        projected = (embeddings - self.mean) @ self.components
+        return projected.reshape(len(projected), len(self.codebooks), -1)
+
+    def encode(self, embeddings):
+        """Product-quantization codes, one byte per subvector, as (subvectors, rows)."""
+        codes = np.empty((len(self.codebooks), len(embeddings)), dtype=np.uint8)
+        for start in range(0, len(embeddings), ENCODE_BATCH):
+            parts = self.project(embeddings[start:start + ENCODE_BATCH])
+            for m, codebook in enumerate(self.codebooks):
+                distances = ((parts[:, m, np.newaxis, :] - codebook) ** 2).sum(axis=2)
+                codes[m, start:start + ENCODE_BATCH] = np.argmin(distances, axis=1)
+        return codes
+
+    def add(self, label, embeddings):
+        """Insert (or replace) every reference vector of a landmark."""
+        self.remove(label)
+        self.labels.append(label)
+        self.codes = np.concatenate([self.codes, self.encode(embeddings)], axis=1)
+        self.label_ids = np.concatenate([
+            self.label_ids, np.full(len(embeddings), len(self.labels) - 1, dtype=np.int32)
+        ])
+
+    def remove(self, label):
+        """Drop a landmark and all its vectors; returns how many were removed."""
+        if label not in self.labels:
+            return 0
+        label_id = self.labels.index(label)
+        keep = self.label_ids != label_id
+        self.codes = self.codes[:, keep]
+        self.label_ids = self.label_ids[keep]
+        self.label_ids[self.label_ids > label_id] -= 1
+        del self.labels[label_id]
+        return int((~keep).sum())
+
+    def search(self, embeddings, k=NEIGHBOURS):
+        """Indices and approximate squared distances of the k nearest rows per query."""
+        parts = self.project(embeddings)
+        # (queries, subvectors, centroids) distance tables
+        tables = ((parts[:, :, np.newaxis, :] - self.codebooks[np.newaxis]) ** 2).sum(axis=3)
+        distances = np.zeros((len(parts), len(self)), dtype=np.float32)
+        gathered = np.empty(len(self), dtype=np.float32)
+        for query, table in enumerate(tables):
+            for m, column in enumerate(self.codes):
+                np.take(table[m], column, out=gathered)
+                distances[query] += gathered
+
+        k = min(k, len(self))
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1, kind='stable')
+        nearest = np.take_along_axis(nearest, order, axis=1)
+        return nearest, np.take_along_axis(distances, nearest, axis=1)
+
+    def predict(self, embeddings, top_k=TOP_K):
+        """Top-k (label, vote share) lists from a vote of the nearest references."""
+        nearest, _ = self.search(embeddings, self.header["neighbours"])
+        results = []
+        for row in nearest:
+            votes = {}
+            # Ties between labels go to the one with the nearer neighbour
+            for rank, label_id in enumerate(self.label_ids[row]):
+                votes[label_id] = votes.get(label_id, 0.0) + 1.0 + (len(row) - rank) * 1e-6
+            ranked = sorted(votes.items(), key=lambda item: -item[1])[:top_k]
+            results.append([(self.labels[label_id], round(score) / len(row)) for label_id, score in ranked])
+        return results
+
+    def save(self, path=INDEX_DIR):
+        """Write the index folder; labels and rows are rewritten on every change."""
+        os.makedirs(path, exist_ok=True)
+        _save_array(os.path.join(path, "pca_mean.npy"), self.mean)
+        _save_array(os.path.join(path, "pca_components.npy"), self.components)
+        _save_array(os.path.join(path, "codebooks.npy"), self.codebooks)
+        _save_array(os.path.join(path, "codes.npy"), self.codes)
+        _save_array(os.path.join(path, "label_ids.npy"), self.label_ids)
+        tmp_path = os.path.join(path, "index.json.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.header, f, indent=2)
+        os.replace(tmp_path, os.path.join(path, "index.json"))
+
+def load_index(path=INDEX_DIR):
+    """Load an index folder written by LandmarkIndex.save."""
+    with open(os.path.join(path, "index.json"), 'r') as f:
+        header = json.load(f)
+    if header.get("format") != "berlin-landmarks-retrieval" or header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path} is not a version {FORMAT_VERSION} landmark index")
+    arrays = [np.load(os.path.join(path, name)) for name in
+              ("pca_mean.npy", "pca_components.npy", "codebooks.npy", "codes.npy", "label_ids.npy")]
+    return LandmarkIndex(header, *arrays)
+
+def embed_images(files, img_size, cache_dir=None):
+    """Backbone embeddings of image files, reusing the training embedding cache."""
+    from embedding_cache import CACHE_DIR, EmbeddingCache, embed_files
+
+    cache = EmbeddingCache(cache_dir or CACHE_DIR, img_size)
+    return embed_files(files, cache)[:, 0]
+
+def build_index(args):
+    """Index every processed image, optionally reporting held-out accuracy first."""
+    from embedding_cache import backbone_id
+    from pack_dataset import find_processed_images, split_indices
+
+    samples, label_names = find_processed_images(args.data_dir, args.img_size)
+    if not samples:
+        print("❌ No processed images found! Please run prepare_images.py first.")
+        sys.exit(1)
+    files = [path for path, _ in samples]
+    y = np.array([label for _, label in samples], dtype=np.int32)
+    row_labels = [label_names[label] for label in y]
+    embeddings = embed_images(files, args.img_size)
+
+    if args.evaluate:
+        train_idx, _, test_idx = split_indices(y, files)
+        index = LandmarkIndex.build(embeddings[train_idx], [row_labels[i] for i in train_idx],
+                                    args.img_size, backbone_id(args.img_size), args.pca_dim, args.subvectors)
+        start_time = time.perf_counter()
+        predictions = index.predict(embeddings[test_idx], 1)
+        elapsed = time.perf_counter() - start_time
+        accuracy = np.mean([result[0][0] == row_labels[i] for result, i in zip(predictions, test_idx)])
+        print(f"🎯 Held-out top-1 accuracy: {accuracy:.2%} ({len(test_idx)} images, "
+              f"{elapsed / len(test_idx) * 1000:.3f} ms/query after embedding)")
+
+    start_time = time.perf_counter()
+    index = LandmarkIndex.build(embeddings, row_labels, args.img_size, backbone_id(args.img_size),
+                                args.pca_dim, args.subvectors)
+    index.save(args.index)
+    print(f"✅ Indexed {len(index)} images of {len(index.labels)} landmarks in "
+          f"{time.perf_counter() - start_time:.2f}s "
+          f"({len(index.codes)} bytes/vector instead of {embeddings.shape[1] * 4})")
+    print(f"📁 Index saved as: {args.index}/")
+
+def add_landmark(args):
+    """Embed a folder of images and insert (or replace) it as one landmark."""
+    from prepare_images import find_images
+
+    index = load_index(args.index)
+    files = sorted(find_images(args.folder))
+    if not files:
+        print(f"❌ No images found in {args.folder}")
+        sys.exit(1)
+    embeddings = embed_images(files, index.img_size)
+
+    start_time = time.perf_counter()
+    index.add(args.landmark, embeddings)
+    index.save(args.index)
+    print(f"✅ Added {args.landmark} ({len(files)} images) in {(time.perf_counter() - start_time) * 1000:.1f} ms; "
+          f"{len(index)} vectors, {len(index.labels)} landmarks")
+
+def remove_landmark(args):
+    """Drop a landmark from the index."""
+    index = load_index(args.index)
+    start_time = time.perf_counter()
+    removed = index.remove(args.landmark)
+    if not removed:
+        print(f"❌ {args.landmark} is not in the index")
+        sys.exit(1)
+    index.save(args.index)
+    print(f"✅ Removed {args.landmark} ({removed} vectors) in {(time.perf_counter() - start_time) * 1000:.1f} ms; "
+          f"{len(index.labels)} landmarks left")
+
+def query_images(args):
+    """Print the top-k landmarks for each image."""
+    from features import load_image_array
+    from embedding_cache import create_backbone
+
+    index = load_index(args.index)
+    backbone = create_backbone(index.img_size)
+    images = np.stack([load_image_array(path, index.img_size) for path in args.images])
+    embeddings = backbone.predict_on_batch(images.astype(np.float32) / 255.0)
+    for path, result in zip(args.images, index.predict(embeddings, args.top_k)):
+        print(path + "," + ",".join(f"{label},{score:.4f}" for label, score in result))
+
+def scale_test(args):
+    """Time build, insert, remove and single-image queries on synthetic vectors."""
+    rng = np.random.default_rng(42)
+    landmarks = 1000
+    # Clustered vectors: one random centre per landmark plus noise
+    centres = rng.standard_normal((landmarks, 1280)).astype(np.float32)
+    row_labels = rng.integers(0, landmarks, args.count)
+    embeddings = centres[row_labels] + rng.standard_normal((args.count, 1280)).astype(np.float32)
+
+    print(f"\n⏱️  Synthetic index: {args.count} vectors, {landmarks} landmarks")
+    start_time = time.perf_counter()
+    index = LandmarkIndex.build(embeddings, [f"landmark_{label}" for label in row_labels], 224, "synthetic",
+                                args.pca_dim, args.subvectors)
+    print(f"  Build: {time.perf_counter() - start_time:.2f}s "
+          f"({index.codes.nbytes / (1024 * 1024):.1f} MB of codes)")
+
+    new = centres[:1] + rng.standard_normal((20, 1280)).astype(np.float32)
+    start_time = time.perf_counter()
+    index.add("new_landmark", new)
+    print(f"  Insert 20 vectors: {(time.perf_counter() - start_time) * 1000:.2f} ms")
+    start_time = time.perf_counter()
+    index.remove("new_landmark")
+    print(f"  Remove landmark: {(time.perf_counter() - start_time) * 1000:.2f} ms")
+
+    queries = centres[row_labels[:200]] + rng.standard_normal((200, 1280)).astype(np.float32)
+    timings = []
+    correct = 0
+    for query, label in zip(queries, row_labels[:200]):
+        start_time = time.perf_counter()
+        result = index.predict(query[np.newaxis], 1)
+        timings.append(time.perf_counter() - start_time)
+        correct += result[0][0][0] == f"landmark_{label}"
+    timings = np.array(timings) * 1000
+    print(f"  Query: p50 {np.percentile(timings, 50):.2f} ms, p99 {np.percentile(timings, 99):.2f} ms, "
+          f"top-1 {correct / len(queries):.1%}")
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Retrain-free landmark classifier over MobileNetV2 embeddings.")
+    parser.add_argument('--index', default=INDEX_DIR, help=f"index folder (default: {INDEX_DIR})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="index every processed image")
+    build.add_argument('--data-dir', default=".",
+                       help="folder containing the *_processed folders (default: .)")
+    build.add_argument('--img-size', type=int, default=224, help="backbone input resolution (default: 224)")
+    build.add_argument('--pca-dim', type=int, default=PCA_DIM, help=f"PCA dimensions (default: {PCA_DIM})")
+    build.add_argument('--subvectors', type=int, default=SUBVECTORS,
+                       help=f"bytes per stored vector (default: {SUBVECTORS})")
+    build.add_argument('--evaluate', action='store_true',
+                       help="first report top-1 accuracy of an index built on the training split")
+
+    add = commands.add_parser('add', help="add or replace a landmark from a folder of images")
+    add.add_argument('landmark', help="landmark name")
+    add.add_argument('folder', help="folder with its reference images")
+
+    remove = commands.add_parser('remove', help="remove a landmark")
+    remove.add_argument('landmark', help="landmark name")
+
+    query = commands.add_parser('query', help="classify images")
+    query.add_argument('images', nargs='+', help="image files")
+    query.add_argument('--top-k', type=int, default=TOP_K, help=f"landmarks per image (default: {TOP_K})")
+
+    scale = commands.add_parser('scale-test', help="time the index on synthetic vectors")
+    scale.add_argument('count', type=int, nargs='?', default=SCALE_TEST_SIZE,
+                       help=f"reference vectors (default: {SCALE_TEST_SIZE})")
+    scale.add_argument('--pca-dim', type=int, default=PCA_DIM, help=f"PCA dimensions (default: {PCA_DIM})")
+    scale.add_argument('--subvectors', type=int, default=SUBVECTORS,
+                       help=f"bytes per stored vector (default: {SUBVECTORS})")
+    return parser.parse_args()
+
+def main():
+    """Run a retrieval index command."""
+    args = parse_args()
+
+    print("🔎 Berlin Landmarks Retrieval Index")
+    print("=" * 50)
+
+    commands = {
+        "build": build_index,
+        "add": add_landmark,
+        "remove": remove_landmark,
+        "query": query_images,
+        "scale-test": scale_test,
+    }
+    commands[args.command](args)
+
+if __name__ == "__main__":
+    main()
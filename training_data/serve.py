@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Local prediction server for Berlin landmarks models
+Loads the model once and answers HTTP requests on localhost or a Unix
+socket, merging concurrent requests into micro-batches.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+import numpy as np
+from PIL import Image
+from convert_to_tflite import quantize_input
+from features import load_image_array
+from forest_model import FOREST_PATH
+from predict_landmark import (
+    TOP_K, load_labels, load_model, model_feature_spec, predict_batch, top_k_labels
+)
+
+MAX_BATCH_SIZE = 64
+MAX_WAIT_MS = 5.0
+LATENCY_WINDOW = 10000
+
+class ForestBackend:
+    """Pickled Random Forest from simple_train.py."""
+
+    def __init__(self, model_path, labels_path):
+        self.model, self.labels = load_model(model_path, labels_path)
+        self.img_size = model_feature_spec(self.model)["img_size"]
+        self.name = "random_forest"
+
+    def predict(self, images, top_k):
+        return predict_batch(images, self.model, self.labels, top_k)
+
+class TFLiteBackend:
+    """TensorFlow Lite model from convert_to_tflite.py."""
+
+    def __init__(self, model_path, labels_path, num_threads=None):
+        import tensorflow as tf
+
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.img_size = int(self.input['shape'][1])
+        self.batch_size = int(self.input['shape'][0])
+        self.labels = load_labels(labels_path)
+        self.name = "tflite"
+
+    def _resize(self, batch_size):
+        """Resize the input tensor for a new batch size (only when it changes)."""
+        if batch_size != self.batch_size:
+            self.interpreter.resize_tensor_input(
+                self.input['index'], [batch_size, self.img_size, self.img_size, 3]
+            )
+            self.interpreter.allocate_tensors()
+            self.input = self.interpreter.get_input_details()[0]
+            self.output = self.interpreter.get_output_details()[0]
+            self.batch_size = batch_size
+
+    def predict(self, images, top_k):
+        self._resize(len(images))
+
+        self.interpreter.set_tensor(self.input['index'], quantize_input(self.input, images))
+        self.interpreter.invoke()
+
+        probabilities = self.interpreter.get_tensor(self.output['index']).astype(np.float32)
+        scale, zero_point = self.output['quantization']
+        if self.output['dtype'] != np.float32 and scale:
+            probabilities = (probabilities - zero_point) * scale
+        return top_k_labels(probabilities, self.labels, top_k)
+
+class KerasBackend:
+    """Keras .h5 model from train_model.py."""
+
+    def __init__(self, model_path, labels_path):
+        import tensorflow as tf
+
+        self.model = tf.keras.models.load_model(model_path)
+        self.img_size = int(self.model.input_shape[1])
+        self.labels = load_labels(labels_path)
+        self.name = "keras"
+
+    def predict(self, images, top_k):
+        probabilities = self.model.predict_on_batch(images.astype(np.float32) / 255.0)
+        return top_k_labels(np.asarray(probabilities), self.labels, top_k)
+
+class RetrievalBackend:
+    """Embedding nearest-neighbour index folder from retrieval.py."""
+
+    def __init__(self, model_path):
+        from retrieval import load_index
+        from embedding_cache import create_backbone
+
+        self.index = load_index(model_path)
+        self.img_size = self.index.img_size
+        self.backbone = create_backbone(self.img_size)
+        self.labels = self.index.labels
+        self.name = "retrieval"
+
+    def predict(self, images, top_k):
+        embeddings = self.backbone.predict_on_batch(images.astype(np.float32) / 255.0)
+        return self.index.predict(np.asarray(embeddings), top_k)
+
+def load_backend(model_path, labels_path, num_threads=None):
+    """Pick the backend from the model file extension (a folder is a retrieval index)."""
+    if os.path.isdir(model_path):
+        return RetrievalBackend(model_path)
+    if model_path.endswith('.tflite'):
+        return TFLiteBackend(model_path, labels_path, num_threads)
+    if model_path.endswith(('.h5', '.keras')):
+        return KerasBackend(model_path, labels_path)
+    return ForestBackend(model_path, labels_path)
+
+class MicroBatcher:
+    """Collects concurrent requests into batches for a single worker thread.
+
+    A batch is run as soon as it reaches `max_batch_size` or the oldest
+    request has waited `max_wait_ms`, whichever comes first.
+    """
+
+    def __init__(self, backend, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = queue.Queue()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.request_count = 0
+        self.batch_count = 0
+        self.lock = threading.Lock()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, image, top_k=TOP_K):
+        """Queue one uint8 RGB image; returns a Future of its top-k list."""
+        future = Future()
+        self.requests.put((image, top_k, future, time.perf_counter()))
+        return future
+
+    def _collect(self):
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                top_k = max(item[1] for item in batch)
+                results = self.backend.predict(np.stack([item[0] for item in batch]), top_k)
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            done = time.perf_counter()
+            with self.lock:
+                self.request_count += len(batch)
+                self.batch_count += 1
+                for _, _, _, queued in batch:
+                    self.latencies.append(done - queued)
+
+            for (_, k, future, _), result in zip(batch, results):
+                future.set_result(result[:k])
+
+    def stats(self):
+        """Queue depth, batch sizes and latency percentiles."""
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            request_count = self.request_count
+            batch_count = self.batch_count
+
+        stats = {
+            "backend": self.backend.name,
+            "queue_depth": self.requests.qsize(),
+            "requests": request_count,
+            "batches": batch_count,
+            "mean_batch_size": request_count / batch_count if batch_count else 0.0,
+        }
+        if len(latencies):
+            stats["p50_ms"] = float(np.percentile(latencies, 50))
+            stats["p99_ms"] = float(np.percentile(latencies, 99))
+        return stats
+
+def decode_upload(data, img_size):
+    """Decode uploaded image bytes into a uint8 RGB array."""
+    with Image.open(io.BytesIO(data)) as img:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        return np.asarray(img.resize((img_size, img_size)))
+
+def valid_top_k(top_k):
+    """Whether a requested top_k is a positive integer (JSON true/false are not)."""
+    return isinstance(top_k, int) and not isinstance(top_k, bool) and top_k > 0
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """POST /predict with image bytes or {"path": ...}; GET /stats and /health."""
+
+    batcher = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send_json(200, self.batcher.stats())
+        elif self.path == '/health':
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.split('?')[0] != '/predict':
+            self._send_json(404, {"error": "not found"})
+            return
+
+        start_time = time.perf_counter()
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        img_size = self.batcher.backend.img_size
+        top_k = TOP_K
+
+        try:
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                request = json.loads(data)
+                top_k = request.get('top_k', TOP_K)
+                if not valid_top_k(top_k):
+                    self._send_json(400, {"error": f"top_k must be a positive integer, got {top_k!r}"})
+                    return
+                image = load_image_array(request['path'], img_size)
+            else:
+                image = decode_upload(data, img_size)
+        except Exception as e:
+            self._send_json(400, {"error": f"could not load image: {e}"})
+            return
+
+        try:
+            predictions = self.batcher.submit(image, top_k).result()
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+
+        self._send_json(200, {
+            "label": predictions[0][0],
+            "confidence": predictions[0][1],
+            "top_k": [{"label": label, "confidence": confidence} for label, confidence in predictions],
+            "latency_ms": (time.perf_counter() - start_time) * 1000
+        })
+
+    def log_message(self, format, *args):
+        # Unix socket clients have no address; keep request logging quiet
+        pass
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    """HTTP server listening on a Unix domain socket."""
+
+    daemon_threads = True
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Serve Berlin landmark predictions over local HTTP.")
+    parser.add_argument('--model',
+                        help=".forest export, pickled Random Forest, .h5 or .tflite model, or retrieval index folder "
+                             "(default: the forest export if present, else the pickle)")
+    parser.add_argument('--labels', default='landmark_labels.txt',
+                        help="label mapping (default: landmark_labels.txt)")
+    parser.add_argument('--host', default='127.0.0.1', help="address to bind (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8000, help="port to bind (default: 8000)")
+    parser.add_argument('--unix-socket', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--max-batch-size', type=int, default=MAX_BATCH_SIZE,
+                        help=f"largest micro-batch (default: {MAX_BATCH_SIZE})")
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS,
+                        help=f"longest a request waits for its batch to fill (default: {MAX_WAIT_MS})")
+    parser.add_argument('--num-threads', type=int, default=None,
+                        help="TFLite interpreter threads (default: TFLite's choice)")
+    return parser.parse_args()
+
+def main():
+    """Start the prediction server."""
+    args = parse_args()
+
+    print("🏛️ Berlin Landmarks Prediction Server")
+    print("=" * 50)
+
+    model_path = args.model
+    if model_path is None:
+        model_path = FOREST_PATH if os.path.exists(FOREST_PATH + '.json') else 'berlin_landmarks_model.pkl'
+    if not os.path.exists(model_path + '.json' if model_path.endswith('.forest') else model_path):
+        print(f"❌ Error: {model_path} not found!")
+        return
+
+    start_time = time.perf_counter()
+    backend = load_backend(model_path, args.labels, args.num_threads)
+    print(f"✅ Loaded {model_path} ({backend.name}, {len(backend.labels)} classes) "
+          f"in {time.perf_counter() - start_time:.2f}s")
+
+    PredictionHandler.batcher = MicroBatcher(backend, args.max_batch_size, args.max_wait_ms)
+
+    if args.unix_socket:
+        if os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+        server = ThreadingUnixHTTPServer(args.unix_socket, PredictionHandler)
+        print(f"🚀 Listening on unix:{args.unix_socket}")
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), PredictionHandler)
+        print(f"🚀 Listening on http://{args.host}:{args.port}")
+    print("  POST /predict  (image bytes, or JSON {\"path\": ..., \"top_k\": 3})")
+    print("  GET  /stats    (queue depth, batch sizes, p50/p99 latency)")
+    sys.stdout.flush()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Shutting down")
+    finally:
+        server.server_close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+
+if __name__ == "__main__":
+    main()
@@ -6,72 +6,81 @@ Uses a simpler approach for training a custom model.
 
 import os
 import sys
+import time
+import argparse
 import numpy as np
-from PIL import Image
 import glob
 import json
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score, classification_report
 import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pack_dataset import (
+    IMAGES_FILE, find_processed_folders, find_processed_images, load_packed_dataset, packed_files, split_indices
+)
+from forest_model import FOREST_PATH, export_forest
+from features import EXTRACTORS, DEFAULT_EXTRACTOR, FEATURE_TYPES, extract_features, feature_spec, load_image_array
+from memory_usage import current_rss_mb, peak_rss_mb
+import tracing
 
 # Configuration
 IMG_SIZE = 224
 BATCH_SIZE = 32
+FOREST_PARAMS = {"n_estimators": 100, "max_depth": 20, "max_features": "sqrt"}
 
-def load_and_preprocess_data(data_dir):
-    """Load and preprocess images from processed folders."""
+# Hyperparameter search grid; forests grow through the tree counts with warm_start
+SEARCH_TREE_COUNTS = [25, 50, 100, 200]
+SEARCH_MAX_DEPTHS = [10, 20, None]
+SEARCH_MAX_FEATURES = ["sqrt", "log2", 0.1]
+SEARCH_RESULTS_PATH = "rf_search_results.json"
+LATENCY_SAMPLES = 20
+
+# Out-of-core training (--streaming): an incremental linear model fed one chunk at a time
+MEMORY_BUDGET_MB = 1024
+STREAM_EPOCHS = 5
+SGD_PARAMS = {"loss": "log_loss", "alpha": 1e-4}
+PROBE_IMAGES = 8
+CHUNK_HEADROOM = 1.2
+
+def load_and_preprocess_data(data_dir, img_size=IMG_SIZE):
+    """Load images from processed folders as a uint8 array."""
     print("📸 Loading training data...")
     
     images = []
     labels = []
     label_names = []
+    files = []
     
-    # Get all processed folders
-    processed_folders = glob.glob(os.path.join(data_dir, "*_processed"))
-    processed_folders.sort()
+    # Get all processed folders for this resolution
+    processed_folders = find_processed_folders(data_dir, img_size)
     
     print(f"Found {len(processed_folders)} landmark folders:")
     
-    for i, folder in enumerate(processed_folders):
-        landmark_name = os.path.basename(folder).replace("_processed", "")
+    for i, (landmark_name, folder) in enumerate(processed_folders):
         label_names.append(landmark_name)
         
         print(f"  {i+1}. {landmark_name}")
         
         # Get all images in the folder
-        image_files = glob.glob(os.path.join(folder, "*.jpg"))
+        image_files = sorted(glob.glob(os.path.join(folder, "*.jpg")))
         
         for image_file in image_files:
             try:
-                # Load and preprocess image
-                img = Image.open(image_file)
-                img = img.resize((IMG_SIZE, IMG_SIZE))
-                img_array = np.array(img)
-                
-                # Convert to grayscale and flatten
-                if len(img_array.shape) == 3:
-                    img_gray = np.mean(img_array, axis=2)
-                else:
-                    img_gray = img_array
-                
-                # Normalize and flatten
-                img_normalized = img_gray / 255.0
-                img_flattened = img_normalized.flatten()
-                
-                images.append(img_flattened)
+                # Load image as uint8 RGB; features are extracted later
+                images.append(load_image_array(image_file, img_size))
+                tracing.count("images_loaded")
                 labels.append(i)
+                files.append(image_file)
                 
             except Exception as e:
                 print(f"Error loading {image_file}: {e}")
     
     # Convert to numpy arrays
-    X = np.array(images)
+    X = np.stack(images) if images else np.zeros((0, img_size, img_size, 3), dtype=np.uint8)
     y = np.array(labels)
     
     print(f"\n📊 Dataset Summary:")
     print(f"  Total images: {len(X)}")
-    print(f"  Feature dimension: {X.shape[1]}")
+    print(f"  Image shape: {X.shape[1:]}")
     print(f"  Number of classes: {len(label_names)}")
     
     # Print class distribution
@@ -80,28 +89,36 @@ def load_and_preprocess_data(data_dir):
     for i, (label, count) in enumerate(zip(unique, counts)):
         print(f"  {label_names[label]}: {count} images")
     
-    return X, y, label_names
+    return X, y, label_names, files
 
-def train_simple_model(X_train, y_train, X_val, y_val, label_names):
+def train_simple_model(X_train, y_train, X_val, y_val, label_names, params=None):
     """Train a simple Random Forest model."""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score
+    
     print(f"\n🌲 Training Random Forest model...")
     
     # Create and train Random Forest
+    params = params or FOREST_PARAMS
     rf_model = RandomForestClassifier(
-        n_estimators=100,
-        max_depth=20,
+        **params,
         random_state=42,
         n_jobs=-1
     )
     
+    print(f"Parameters: {params}")
     print(f"Training samples: {len(X_train)}")
     print(f"Validation samples: {len(X_val)}")
     
     # Train the model
-    rf_model.fit(X_train, y_train)
+    start_time = time.perf_counter()
+    with tracing.span("fit", samples=len(X_train)):
+        rf_model.fit(X_train, y_train)
+    print(f"⏱️  Fit time: {time.perf_counter() - start_time:.2f}s")
     
     # Evaluate on validation set
-    y_pred = rf_model.predict(X_val)
+    with tracing.span("validation"):
+        y_pred = rf_model.predict(X_val)
     accuracy = accuracy_score(y_val, y_pred)
     
     print(f"Validation Accuracy: {accuracy:.4f} ({accuracy*100:.2f}%)")
@@ -113,27 +130,51 @@ def evaluate_model(model, X_test, y_test, label_names):
     print(f"\n📊 Evaluating model...")
     
     # Predictions
-    predictions = model.predict(X_test)
+    start_time = time.perf_counter()
+    with tracing.span("evaluate"):
+        predictions = model.predict(X_test)
+    predict_time = time.perf_counter() - start_time
+    
+    return report_predictions(y_test, predictions, label_names, predict_time)
+
+def report_predictions(y_test, predictions, label_names, predict_time):
+    """Print test accuracy, predict time and the classification report."""
+    from sklearn.metrics import accuracy_score, classification_report
     
     # Calculate accuracy
     accuracy = accuracy_score(y_test, predictions)
     print(f"Test Accuracy: {accuracy:.4f} ({accuracy*100:.2f}%)")
+    print(f"⏱️  Predict time: {predict_time * 1000 / max(len(y_test), 1):.3f} ms/image ({len(y_test)} images)")
     
     # Classification report
     print(f"\n📋 Classification Report:")
-    print(classification_report(y_test, predictions, target_names=label_names))
+    print(classification_report(y_test, predictions, labels=np.arange(len(label_names)),
+                                target_names=label_names, zero_division=0))
     
     return accuracy
 
-def save_model_and_labels(model, label_names, accuracy):
-    """Save the model and label mapping."""
+def save_model_and_labels(model, label_names, accuracy, spec, training=None):
+    """Save the model, label mapping and feature extractor spec."""
     print(f"\n💾 Saving model and labels...")
     
-    # Save the model
+    # Save the model, remembering which features it was trained on
+    model.feature_spec_ = spec
     with open('berlin_landmarks_model.pkl', 'wb') as f:
         pickle.dump(model, f)
     print(f"Model saved as: berlin_landmarks_model.pkl")
     
+    # Save the pickle-free, memory-mappable export (Random Forests only)
+    is_forest = hasattr(model, 'estimators_')
+    if is_forest:
+        export_forest(model, FOREST_PATH, label_names, spec)
+        print(f"Model exported as: {FOREST_PATH}.json + {FOREST_PATH}.bin")
+    else:
+        # predict_landmark.py and serve.py prefer the export, so drop a stale one
+        for ext in ('.json', '.bin'):
+            if os.path.exists(FOREST_PATH + ext):
+                os.remove(FOREST_PATH + ext)
+    framework = "Random Forest" if is_forest else "SGD logistic regression"
+    
     # Save label names
     with open('landmark_labels.txt', 'w') as f:
         for i, label in enumerate(label_names):
@@ -144,98 +185,421 @@ def save_model_and_labels(model, label_names, accuracy):
     model_info = {
         "model_name": "berlin_landmarks_model",
         "version": "1.0",
-        "description": "Random Forest model for Berlin landmarks recognition",
-        "input_shape": [IMG_SIZE * IMG_SIZE],
+        "description": f"{framework} model for Berlin landmarks recognition",
+        "input_shape": [spec["dim"]],
         "output_shape": [len(label_names)],
         "labels": label_names,
         "accuracy": accuracy,
-        "framework": "Random Forest",
-        "feature_type": "Flattened grayscale"
+        "framework": framework,
+        "feature_type": FEATURE_TYPES[spec["name"]],
+        "feature_extractor": spec,
+        "image_size": [spec["img_size"], spec["img_size"]]
     }
+    if training:
+        model_info["training"] = training
     
     with open('model_info.json', 'w') as f:
         json.dump(model_info, f, indent=2)
     print(f"Model info saved as: model_info.json")
 
-def create_simple_prediction_script():
-    """Create a simple prediction script for testing."""
-    script_content = '''#!/usr/bin/env python3
-"""
-Simple prediction script for Berlin landmarks model
-"""
-
-import pickle
-import numpy as np
-from PIL import Image
-
-def load_model():
-    """Load the trained model."""
-    with open('berlin_landmarks_model.pkl', 'rb') as f:
-        model = pickle.load(f)
+def compare_feature_extractors(images, y, label_names, files=None, params=None):
+    """Train one forest per feature extractor and compare their cost.
     
-    with open('landmark_labels.txt', 'r') as f:
-        labels = [line.strip().split(': ')[1] for line in f]
+    Uses the same split and forest parameters as a regular training run,
+    so the accuracies match what train_simple_model would get.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score
     
-    return model, labels
+    params = params or FOREST_PARAMS
+    print(f"\n🔬 Comparing feature extractors ({params})...")
+    
+    train_idx, _, test_idx = split_indices(y, files)
+    
+    results = []
+    for name in EXTRACTORS:
+        start_time = time.perf_counter()
+        X = extract_features(images, name)
+        extract_time = time.perf_counter() - start_time
+        
+        model = RandomForestClassifier(**params, random_state=42, n_jobs=-1)
+        start_time = time.perf_counter()
+        model.fit(X[train_idx], y[train_idx])
+        fit_time = time.perf_counter() - start_time
+        
+        start_time = time.perf_counter()
+        predictions = model.predict(X[test_idx])
+        predict_time = time.perf_counter() - start_time
+        
+        accuracy = accuracy_score(y[test_idx], predictions)
+        results.append((name, X.shape[1], extract_time, fit_time, predict_time * 1000 / len(test_idx), accuracy))
+    
+    print(f"\n{'Extractor':<18} {'Dim':>7} {'Extract s':>10} {'Fit s':>8} {'Predict ms/img':>15} {'Accuracy':>9}")
+    for name, dim, extract_time, fit_time, predict_ms, accuracy in results:
+        print(f"{name:<18} {dim:>7} {extract_time:>10.2f} {fit_time:>8.2f} {predict_ms:>15.3f} {accuracy:>9.2%}")
+    
+    return results
+
+def _search_task(task):
+    """Grow one forest configuration through SEARCH_TREE_COUNTS on shared features.
+    
+    The feature matrices are memory-mapped read-only, so every worker reads
+    the same page-cached arrays instead of receiving its own copy.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    
+    data_dir, extractor, max_depth, max_features = task
+    X_train = np.load(os.path.join(data_dir, f"{extractor}_train.npy"), mmap_mode='r')
+    X_val = np.load(os.path.join(data_dir, f"{extractor}_val.npy"), mmap_mode='r')
+    y_train = np.load(os.path.join(data_dir, "y_train.npy"))
+    y_val = np.load(os.path.join(data_dir, "y_val.npy"))
+    
+    model = RandomForestClassifier(
+        warm_start=True, max_depth=max_depth, max_features=max_features, random_state=42, n_jobs=1
+    )
+    results = []
+    fit_time = 0.0
+    for n_estimators in SEARCH_TREE_COUNTS:
+        # warm_start only fits the trees added since the previous size
+        model.set_params(n_estimators=n_estimators)
+        start_time = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_time += time.perf_counter() - start_time
+        
+        accuracy = float(np.mean(model.predict(X_val) == y_val))
+        
+        timings = []
+        for row in X_val[:LATENCY_SAMPLES]:
+            start_time = time.perf_counter()
+            model.predict_proba(row[np.newaxis])
+            timings.append(time.perf_counter() - start_time)
+        
+        results.append({
+            "feature_extractor": extractor,
+            "n_estimators": n_estimators,
+            "max_depth": max_depth,
+            "max_features": max_features,
+            "accuracy": accuracy,
+            "fit_s": fit_time,
+            "predict_ms": float(np.median(timings) * 1000),
+        })
+    return results
+
+def search_hyperparameters(images, y, workers=1, files=None):
+    """Parallel search over extractor, tree count, depth and max_features.
+    
+    Features are extracted once per extractor and written to a scratch
+    folder, then each worker grows one forest per configuration and scores
+    it on the validation split. Returns all results, best first.
+    """
+    train_idx, val_idx, _ = split_indices(y, files)
+    
+    with tempfile.TemporaryDirectory() as data_dir:
+        print(f"\n🧮 Extracting features once per extractor...")
+        for name in EXTRACTORS:
+            X = extract_features(images, name)
+            np.save(os.path.join(data_dir, f"{name}_train.npy"), X[train_idx])
+            np.save(os.path.join(data_dir, f"{name}_val.npy"), X[val_idx])
+        np.save(os.path.join(data_dir, "y_train.npy"), y[train_idx])
+        np.save(os.path.join(data_dir, "y_val.npy"), y[val_idx])
+        
+        tasks = [
+            (data_dir, name, max_depth, max_features)
+            for name in EXTRACTORS
+            for max_depth in SEARCH_MAX_DEPTHS
+            for max_features in SEARCH_MAX_FEATURES
+        ]
+        print(f"🔎 Searching {len(tasks) * len(SEARCH_TREE_COUNTS)} configurations "
+              f"with {workers} worker(s)...")
+        
+        results = []
+        start_time = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_search_task, task) for task in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                results.extend(future.result())
+                print(f"  {done}/{len(tasks)} forests grown", end='\r')
+        print(f"\n⏱️  Search took {time.perf_counter() - start_time:.1f}s")
+    
+    # Best validation accuracy first; faster prediction breaks ties
+    results.sort(key=lambda r: (-r["accuracy"], r["predict_ms"], r["fit_s"]))
+    return results
+
+def print_search_results(results, top=15):
+    """Ranked table of accuracy vs fit time vs predict latency."""
+    print(f"\n{'Rank':>4} {'Extractor':<18} {'Trees':>5} {'Depth':>5} {'Features':>8} "
+          f"{'Accuracy':>9} {'Fit s':>7} {'Predict ms':>11}")
+    for rank, r in enumerate(results[:top], 1):
+        print(f"{rank:>4} {r['feature_extractor']:<18} {r['n_estimators']:>5} {str(r['max_depth']):>5} "
+              f"{str(r['max_features']):>8} {r['accuracy']:>9.2%} {r['fit_s']:>7.2f} {r['predict_ms']:>11.3f}")
 
-def predict_landmark(image_path, model, labels):
-    """Predict landmark from image."""
-    # Load and preprocess image
-    img = Image.open(image_path)
-    img = img.resize((224, 224))
-    img_array = np.array(img)
-    
-    # Convert to grayscale and flatten
-    if len(img_array.shape) == 3:
-        img_gray = np.mean(img_array, axis=2)
+def open_image_source(pack_dir, img_size):
+    """Labels, label names, files and a chunk loader, without decoding any image.
+    
+    The loader returns the uint8 images of sorted sample indices. Packed
+    images are read with plain file reads rather than the memory map, so
+    no mapped pages stay resident once a chunk is done.
+    """
+    if pack_dir:
+        images, labels, label_names = load_packed_dataset(pack_dir)
+        shape = images.shape[1:]
+        if len(images) and shape[0] != img_size:
+            print(f"❌ Packed images are {shape[0]}x{shape[1]}, expected {img_size}x{img_size}")
+            print(f"Repack with: python pack_dataset.py --img-size {img_size}")
+            sys.exit(1)
+        y = np.array(labels)
+        files = packed_files(pack_dir)[:len(y)]
+        del images, labels
+        
+        path = os.path.join(pack_dir, IMAGES_FILE)
+        with open(path, 'rb') as f:
+            np.lib.format.read_magic(f)
+            np.lib.format.read_array_header_1_0(f)
+            offset = f.tell()
+        row_bytes = int(np.prod(shape))
+        
+        def load_chunk(indices):
+            chunk = np.empty((len(indices), *shape), dtype=np.uint8)
+            with open(path, 'rb', buffering=0) as f:
+                for j, i in enumerate(indices):
+                    f.seek(offset + int(i) * row_bytes)
+                    f.readinto(memoryview(chunk[j]).cast('B'))
+            return chunk
     else:
-        img_gray = img_array
+        samples, label_names = find_processed_images(".", img_size)
+        files = [image_file for image_file, _ in samples]
+        y = np.array([label for _, label in samples], dtype=np.int64)
+        print(f"Found {len(files)} images in {len(label_names)} landmark folders")
+        
+        def load_chunk(indices):
+            chunk = np.empty((len(indices), img_size, img_size, 3), dtype=np.uint8)
+            for j, i in enumerate(indices):
+                chunk[j] = load_image_array(files[i], img_size)
+            return chunk
+    
+    return y, label_names, files, load_chunk
+
+def chunk_size_for_budget(extractor, img_size, num_classes, budget_mb):
+    """Images per chunk that keep the process within `budget_mb` of resident memory.
+    
+    The cost of one image (its pixels, the extractor's temporaries and the
+    scaled feature copy) is measured on a few probe images with tracemalloc
+    and padded by CHUNK_HEADROOM for memory the allocator keeps after large
+    temporaries are freed. The model's coefficients and the memory already
+    in use are set aside first. Returns (images per chunk, bytes per image).
+    """
+    import tracemalloc
+    
+    probe = np.zeros((PROBE_IMAGES, img_size, img_size, 3), dtype=np.uint8)
+    tracemalloc.start()
+    features = extract_features(probe, extractor)
+    _, extract_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    per_image = (probe.nbytes + extract_peak + features.nbytes) / PROBE_IMAGES * CHUNK_HEADROOM
+    # Scaler mean/variance/scale plus SGD coefficients and their averaged copy
+    model_bytes = (2 * num_classes + 4) * features.shape[1] * 8
+    available = (budget_mb - current_rss_mb()) * 1024 * 1024 - model_bytes
+    return int(available // per_image), per_image
+
+def train_streaming(args):
+    """Fit a linear model through partial_fit, holding one chunk of images at a time.
+    
+    A first pass over the training split fits the feature scaler, then
+    every epoch streams the (reshuffled) training chunks into an
+    SGDClassifier with logistic loss, so predict_proba is available to
+    predict_landmark.py and serve.py. Validation and test predictions are
+    streamed the same way.
+    """
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    
+    start_time = time.perf_counter()
+    y, label_names, files, load_chunk = open_image_source(args.packed, args.img_size)
+    if len(y) == 0:
+        print("❌ No images found! Please add images to the folders first.")
+        return
     
-    # Normalize and flatten
-    img_normalized = img_gray / 255.0
-    img_flattened = img_normalized.flatten().reshape(1, -1)
+    # Same stratified (or group-aware) split as the in-memory mode
+    train_idx, val_idx, test_idx = split_indices(y, files)
+    print(f"\n📊 Data Split:")
+    print(f"  Training: {len(train_idx)} images")
+    print(f"  Validation: {len(val_idx)} images")
+    print(f"  Test: {len(test_idx)} images")
+    
+    extractor = args.feature_extractor
+    spec = feature_spec(extractor, args.img_size)
+    chunk_size, per_image = chunk_size_for_budget(extractor, args.img_size, len(label_names), args.memory_budget)
+    if chunk_size < 1:
+        print(f"❌ A {args.memory_budget} MB budget leaves no room for a chunk "
+              f"({current_rss_mb():.0f} MB already in use, {per_image / (1024 * 1024):.2f} MB per image)")
+        sys.exit(1)
+    chunk_size = min(chunk_size, len(train_idx))
+    print(f"\n🧩 Streaming {spec['name']} features ({spec['dim']} dims) in chunks of {chunk_size} images "
+          f"({per_image / (1024 * 1024):.2f} MB/image, {args.memory_budget} MB budget)")
+    
+    rng = np.random.default_rng(42)
+    
+    def for_each_chunk(indices, step, shuffle=False):
+        """Call step(batch, features) per chunk; each chunk is freed before the next is read."""
+        order = rng.permutation(indices) if shuffle else indices
+        for start in range(0, len(order), chunk_size):
+            # Sorted indices keep packed reads sequential
+            batch = np.sort(order[start:start + chunk_size])
+            with tracing.span("load_chunk", images=len(batch)):
+                images = load_chunk(batch)
+            with tracing.span("extract_features", extractor=extractor):
+                X = extract_features(images, extractor)
+            del images
+            step(batch, X)
+            del X
+    
+    def predict(model, indices):
+        predictions = np.empty(len(indices), dtype=np.int64)
+        position = np.argsort(indices)
+        sorted_indices = indices[position]
+        
+        def step(batch, X):
+            predictions[position[np.searchsorted(sorted_indices, batch)]] = model.predict(X)
+        
+        for_each_chunk(indices, step)
+        return predictions
+    
+    scaler = StandardScaler()
+    for_each_chunk(train_idx, lambda batch, X: scaler.partial_fit(X))
     
-    # Predict
-    prediction = model.predict(img_flattened)[0]
-    confidence = model.predict_proba(img_flattened)[0].max()
+    classifier = SGDClassifier(**SGD_PARAMS, random_state=42)
+    model = Pipeline([("scale", scaler), ("sgd", classifier)])
+    classes = np.arange(len(label_names))
+    
+    def train_step(batch, X):
+        with tracing.span("partial_fit", images=len(batch)):
+            classifier.partial_fit(scaler.transform(X), y[batch], classes=classes)
+    
+    print(f"\n🌊 Training SGD logistic regression for {args.epochs} epochs...")
+    for epoch in range(args.epochs):
+        epoch_start = time.perf_counter()
+        with tracing.span("epoch", epoch=epoch + 1):
+            for_each_chunk(train_idx, train_step, shuffle=True)
+        val_accuracy = float(np.mean(predict(model, val_idx) == y[val_idx])) if len(val_idx) else 0.0
+        print(f"  Epoch {epoch + 1}/{args.epochs}: validation accuracy {val_accuracy:.4f} "
+              f"({time.perf_counter() - epoch_start:.2f}s, peak RSS {peak_rss_mb():.0f} MB)")
+    
+    print(f"\n📊 Evaluating model...")
+    predict_start = time.perf_counter()
+    with tracing.span("evaluate"):
+        predictions = predict(model, test_idx)
+    accuracy = report_predictions(y[test_idx], predictions, label_names, time.perf_counter() - predict_start)
+    
+    elapsed = time.perf_counter() - start_time
+    training = {
+        "mode": "streaming",
+        "epochs": args.epochs,
+        "chunk_size": chunk_size,
+        "memory_budget_mb": args.memory_budget,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "wall_time_s": round(elapsed, 2),
+    }
+    save_model_and_labels(model, label_names, accuracy, spec, training)
     
-    return labels[prediction], confidence
+    print(f"\n🎉 Training completed successfully!")
+    print(f"Final Test Accuracy: {accuracy*100:.2f}%")
+    print(f"⏱️  Wall time: {elapsed:.2f}s, peak RSS: {peak_rss_mb():.0f} MB "
+          f"({args.memory_budget} MB budget, {len(y)} images)")
 
-if __name__ == "__main__":
-    model, labels = load_model()
-    print(f"Model loaded with {len(labels)} classes")
-    print(f"Classes: {labels}")
-'''
-    
-    with open('predict_landmark.py', 'w') as f:
-        f.write(script_content)
-    print(f"Prediction script saved as: predict_landmark.py")
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Train the Random Forest landmark model.")
+    parser.add_argument('--packed', metavar='DIR',
+                        help="load images from a dataset packed by pack_dataset.py")
+    parser.add_argument('--feature-extractor', choices=sorted(EXTRACTORS), default=DEFAULT_EXTRACTOR,
+                        help=f"features fed to the Random Forest (default: {DEFAULT_EXTRACTOR})")
+    parser.add_argument('--compare-extractors', action='store_true',
+                        help="train with every feature extractor, print fit/predict times and exit")
+    parser.add_argument('--search', action='store_true',
+                        help="search extractor, tree count, depth and max_features in parallel, "
+                             "then train and save the best configuration")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="worker processes for --search (0 = all cores, default: 0)")
+    parser.add_argument('--img-size', type=int, default=IMG_SIZE,
+                        help="square input resolution the features are computed at "
+                             f"(uses <landmark>_processed_<size> folders when present, default: {IMG_SIZE})")
+    parser.add_argument('--streaming', action='store_true',
+                        help="out-of-core mode: fit an SGD logistic regression chunk by chunk through "
+                             "partial_fit instead of loading every image into memory")
+    parser.add_argument('--memory-budget', type=int, default=MEMORY_BUDGET_MB, metavar='MB',
+                        help=f"resident memory the --streaming chunks are sized for (default: {MEMORY_BUDGET_MB})")
+    parser.add_argument('--epochs', type=int, default=STREAM_EPOCHS,
+                        help=f"passes over the training split with --streaming (default: {STREAM_EPOCHS})")
+    return parser.parse_args()
 
 def main():
     """Main training function."""
+    args = parse_args()
+    
     print("🏛️ Simple Berlin Landmarks Model Training")
     print("=" * 50)
     
     # Check if processed data exists
-    if not os.path.exists("."):
+    data_dir = args.packed or "."
+    if not os.path.exists(data_dir):
         print("❌ Error: No processed data found!")
-        print("Please run prepare_images.py first.")
+        print("Please run prepare_images.py (and pack_dataset.py for --packed) first.")
+        return
+    
+    if args.streaming:
+        train_streaming(args)
         return
     
+    run_start = time.perf_counter()
+    
     # Load data
-    X, y, label_names = load_and_preprocess_data(".")
+    if args.packed:
+        images, y, label_names = load_packed_dataset(args.packed)
+        if len(images) and images.shape[1] != args.img_size:
+            print(f"❌ Packed images are {images.shape[1]}x{images.shape[2]}, expected {args.img_size}x{args.img_size}")
+            print(f"Repack with: python pack_dataset.py --img-size {args.img_size}")
+            return
+        files = packed_files(args.packed)[:len(y)]
+    else:
+        with tracing.span("load_dataset"):
+            images, y, label_names, files = load_and_preprocess_data(".", args.img_size)
     
-    if len(X) == 0:
+    if len(images) == 0:
         print("❌ No images found! Please add images to the folders first.")
         return
     
+    if args.compare_extractors:
+        compare_feature_extractors(images, y, label_names, files)
+        return
+    
+    params = FOREST_PARAMS
+    extractor = args.feature_extractor
+    if args.search:
+        results = search_hyperparameters(images, y, args.workers or os.cpu_count() or 1, files)
+        print_search_results(results)
+        with open(SEARCH_RESULTS_PATH, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"📁 All results saved as: {SEARCH_RESULTS_PATH}")
+        
+        best = results[0]
+        extractor = best["feature_extractor"]
+        params = {key: best[key] for key in ("n_estimators", "max_depth", "max_features")}
+        print(f"\n🏆 Best: {extractor} features, {params}")
+    
+    # Extract features
+    spec = feature_spec(extractor, images.shape[1])
+    start_time = time.perf_counter()
+    with tracing.span("extract_features", extractor=extractor):
+        X = extract_features(images, extractor)
+    print(f"\n🧮 Features: {spec['name']} ({spec['dim']} dims, {time.perf_counter() - start_time:.2f}s)")
+    
     # Split data
-    X_train, X_temp, y_train, y_temp = train_test_split(
-        X, y, test_size=0.3, random_state=42, stratify=y
-    )
-    X_val, X_test, y_val, y_test = train_test_split(
-        X_temp, y_temp, test_size=0.5, random_state=42, stratify=y_temp
-    )
+    train_idx, val_idx, test_idx = split_indices(y, files)
+    X_train, y_train = X[train_idx], y[train_idx]
+    X_val, y_val = X[val_idx], y[val_idx]
+    X_test, y_test = X[test_idx], y[test_idx]
     
     print(f"\n📊 Data Split:")
     print(f"  Training: {len(X_train)} images")
@@ -243,24 +607,24 @@ def main():
     print(f"  Test: {len(X_test)} images")
     
     # Train model
-    model = train_simple_model(X_train, y_train, X_val, y_val, label_names)
+    model = train_simple_model(X_train, y_train, X_val, y_val, label_names, params)
     
     # Evaluate model
     accuracy = evaluate_model(model, X_test, y_test, label_names)
     
     # Save model and labels
-    save_model_and_labels(model, label_names, accuracy)
-    
-    # Create prediction script
-    create_simple_prediction_script()
+    elapsed = time.perf_counter() - run_start
+    training = {"mode": "in_memory", "peak_rss_mb": round(peak_rss_mb(), 1), "wall_time_s": round(elapsed, 2)}
+    save_model_and_labels(model, label_names, accuracy, spec, training)
     
     print(f"\n🎉 Training completed successfully!")
     print(f"Final Test Accuracy: {accuracy*100:.2f}%")
+    print(f"⏱️  Wall time: {elapsed:.2f}s, peak RSS: {peak_rss_mb():.0f} MB ({len(images)} images)")
     print(f"\n📁 Files created:")
     print(f"  - berlin_landmarks_model.pkl (Random Forest model)")
+    print(f"  - {FOREST_PATH}.json/.bin (pickle-free model export)")
     print(f"  - landmark_labels.txt (label mapping)")
     print(f"  - model_info.json (model information)")
-    print(f"  - predict_landmark.py (prediction script)")
     print(f"\n🚀 Next steps:")
     print(f"  1. Test the model: python predict_landmark.py")
     print(f"  2. Integrate with your Flutter app")
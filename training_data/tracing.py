@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Lightweight tracing for the Berlin landmarks scripts
+Spans and counters around pipeline stages, written on exit as Chrome
+trace JSON (open it in https://ui.perfetto.dev or chrome://tracing) and
+summarized in a table. Tracing is off unless LANDMARKS_TRACE names an
+output file (or landmarks.py runs with --trace); while off, span()
+returns a shared no-op and count() returns at once.
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+
+TRACE_ENV = "LANDMARKS_TRACE"
+# Pid of the process that writes the trace; worker processes only record
+OWNER_ENV = "LANDMARKS_TRACE_OWNER"
+SUMMARY_ROWS = 25
+
+_path = None
+_owner = None
+_events = []
+_counters = {}
+_lock = threading.Lock()
+
+class _Span:
+    """Times a `with` block and records it as a complete ("X") event."""
+
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        add_span(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+class _NullSpan:
+    """Shared stand-in for _Span while tracing is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+def enabled():
+    """Whether spans and counters are being recorded."""
+    return _path is not None
+
+def enable(path):
+    """Record from now on and write the trace to `path` when this process exits.
+
+    The setting is passed on through the environment, so worker processes
+    started afterwards record too (see drain and merge).
+    """
+    global _path, _owner
+    if _path is None:
+        atexit.register(_write_at_exit)
+    _path = path
+    _owner = os.getpid()
+    os.environ[TRACE_ENV] = path
+    os.environ[OWNER_ENV] = str(_owner)
+
+def span(name, **args):
+    """Context manager timing a stage; `args` show up on the event."""
+    if _path is None:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+def add_span(name, start, end, args=None):
+    """Record a stage timed elsewhere, from two time.perf_counter() readings."""
+    if _path is None:
+        return
+    _events.append({
+        "name": name, "ph": "X", "ts": start * 1e6, "dur": (end - start) * 1e6,
+        "pid": os.getpid(), "tid": threading.get_ident(), "args": args or {},
+    })
+
+def count(name, value=1):
+    """Add `value` to a counter, recording its running total over time."""
+    if _path is None:
+        return
+    with _lock:
+        total = _counters[name] = _counters.get(name, 0) + value
+    _events.append({
+        "name": name, "ph": "C", "ts": time.perf_counter() * 1e6,
+        "pid": os.getpid(), "args": {name: total},
+    })
+
+def drain():
+    """Take this worker's events and counters, to send back with its result."""
+    global _events, _counters
+    with _lock:
+        recorded = (_events, _counters)
+        _events, _counters = [], {}
+    return recorded
+
+def merge(recorded):
+    """Add the events and counters returned by a worker's drain()."""
+    if _path is None or not recorded:
+        return
+    events, counters = recorded
+    _events.extend(events)
+    with _lock:
+        for name, value in counters.items():
+            _counters[name] = _counters.get(name, 0) + value
+
+def summary_rows(events):
+    """(stage, calls, total ms, mean ms, max ms) per span name, slowest total first."""
+    stages = {}
+    for event in events:
+        if event["ph"] == "X":
+            stages.setdefault(event["name"], []).append(event["dur"] / 1000)
+    rows = [(name, len(d), sum(d), sum(d) / len(d), max(d)) for name, d in stages.items()]
+    return sorted(rows, key=lambda row: -row[2])
+
+def print_summary(events=None, counters=None):
+    """Print the per-stage timing table and the counter totals."""
+    events = _events if events is None else events
+    counters = _counters if counters is None else counters
+    spans = [event for event in events if event["ph"] == "X"]
+    if not spans and not counters:
+        return
+    wall = (max(e["ts"] + e["dur"] for e in spans) - min(e["ts"] for e in spans)) / 1000 if spans else 0.0
+
+    print(f"\n⏱️  Trace summary ({wall / 1000:.2f}s traced, nested and parallel stages overlap)")
+    print(f"{'Stage':<24} {'Calls':>7} {'Total ms':>10} {'Mean ms':>9} {'Max ms':>9} {'% wall':>7}")
+    for name, calls, total, mean, longest in summary_rows(events)[:SUMMARY_ROWS]:
+        share = total / wall if wall else 0.0
+        print(f"{name:<24} {calls:>7} {total:>10.1f} {mean:>9.2f} {longest:>9.2f} {share:>7.1%}")
+    for name, total in sorted(counters.items()):
+        print(f"🔢 {name}: {total:,}")
+
+def write(path):
+    """Write the recorded events as Chrome trace JSON."""
+    pids = sorted({event["pid"] for event in _events})
+    metadata = [
+        {"name": "process_name", "ph": "M", "pid": pid,
+         "args": {"name": os.path.basename(sys.argv[0]) if pid == _owner else f"worker {pid}"}}
+        for pid in pids
+    ]
+    with open(path, 'w') as f:
+        json.dump({
+            "traceEvents": metadata + _events,
+            "displayTimeUnit": "ms",
+            "otherData": {"command": " ".join(sys.argv), "counters": _counters},
+        }, f)
+
+def _write_at_exit():
+    if _path is None or os.getpid() != _owner:
+        return
+    write(_path)
+    print_summary()
+    print(f"📁 Trace saved as: {_path}")
+
+def _reset_in_child():
+    """Forked workers start with empty buffers instead of a copy of the parent's."""
+    global _events, _counters, _lock
+    _events, _counters, _lock = [], {}, threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_in_child)
+
+if os.environ.get(TRACE_ENV):
+    _path = os.environ[TRACE_ENV]
+    _owner = int(os.environ.get(OWNER_ENV, os.getpid()))
+    os.environ[OWNER_ENV] = str(_owner)
+    atexit.register(_write_at_exit)
@@ -6,18 +6,18 @@ Trains a custom TensorFlow model for Berlin landmark recognition.
 
 import os
 import sys
+import math
+import time
+import shutil
+import argparse
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout
-from tensorflow.keras.models import Model
-from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint, ReduceLROnPlateau
-from tensorflow.keras.optimizers import Adam
-import matplotlib.pyplot as plt
-from sklearn.model_selection import train_test_split
 import glob
 from PIL import Image
+from pack_dataset import find_processed_folders, find_processed_images, load_packed_dataset, packed_files, split_indices
+from input_pipeline import make_file_dataset, make_packed_dataset
+from embedding_cache import EmbeddingCache, embed_files, CACHE_DIR as EMBEDDING_CACHE_DIR
+from training_state import CHECKPOINT_DIR, create_full_state_checkpoint
+import tracing
 
 # Configuration
 IMG_SIZE = 224
@@ -25,39 +25,42 @@ BATCH_SIZE = 32
 EPOCHS = 50
 LEARNING_RATE = 0.001
 VALIDATION_SPLIT = 0.2
+TFDATA_CACHE_DIR = "tfdata_cache"
+BENCHMARK_STEPS = 20
 
-def load_and_preprocess_data(data_dir):
+def load_and_preprocess_data(data_dir, img_size=IMG_SIZE):
     """Load and preprocess images from processed folders."""
     print("📸 Loading training data...")
     
     images = []
     labels = []
     label_names = []
+    files = []
     
-    # Get all processed folders
-    processed_folders = glob.glob(os.path.join(data_dir, "*_processed"))
-    processed_folders.sort()
+    # Get all processed folders for this resolution
+    processed_folders = find_processed_folders(data_dir, img_size)
     
     print(f"Found {len(processed_folders)} landmark folders:")
     
-    for i, folder in enumerate(processed_folders):
-        landmark_name = os.path.basename(folder).replace("_processed", "")
+    for i, (landmark_name, folder) in enumerate(processed_folders):
         label_names.append(landmark_name)
         
         print(f"  {i+1}. {landmark_name}")
         
         # Get all images in the folder
-        image_files = glob.glob(os.path.join(folder, "*.jpg"))
+        image_files = sorted(glob.glob(os.path.join(folder, "*.jpg")))
         
         for image_file in image_files:
             try:
                 # Load and preprocess image
                 img = Image.open(image_file)
-                img = img.resize((IMG_SIZE, IMG_SIZE))
+                img = img.resize((img_size, img_size))
                 img_array = np.array(img) / 255.0  # Normalize to [0,1]
+                tracing.count("images_loaded")
                 
                 images.append(img_array)
                 labels.append(i)
+                files.append(image_file)
                 
             except Exception as e:
                 print(f"Error loading {image_file}: {e}")
@@ -77,17 +80,149 @@ def load_and_preprocess_data(data_dir):
     for i, (label, count) in enumerate(zip(unique, counts)):
         print(f"  {label_names[label]}: {count} images")
     
-    return X, y, label_names
+    return X, y, label_names, files
 
-def create_model(num_classes):
+def create_packed_sequence(images, labels, indices, batch_size=BATCH_SIZE, datagen=None, shuffle=False):
+    """Keras Sequence of batches read from a packed uint8 dataset and normalized per batch.
+    
+    Only one batch is ever converted to float32, so memory use does not
+    depend on the dataset size. With a `datagen`, every image goes through
+    the same random transform that `ImageDataGenerator.flow` applies.
+    """
+    import tensorflow as tf
+    
+    class PackedImageSequence(tf.keras.utils.Sequence):
+        def __init__(self):
+            super().__init__()
+            self.indices = np.sort(np.asarray(indices))
+            if shuffle:
+                np.random.shuffle(self.indices)
+        
+        def __len__(self):
+            return math.ceil(len(self.indices) / batch_size)
+        
+        def __getitem__(self, index):
+            # Sorted indices keep the memory-mapped reads sequential
+            batch_indices = np.sort(self.indices[index * batch_size:(index + 1) * batch_size])
+            x = images[batch_indices].astype(np.float32) / 255.0
+            if datagen is not None:
+                x = np.stack([datagen.random_transform(img) for img in x])
+            return x, labels[batch_indices]
+        
+        def on_epoch_end(self):
+            if shuffle:
+                np.random.shuffle(self.indices)
+    
+    return PackedImageSequence()
+
+def bfloat16_supported():
+    """Whether the CPU has native bfloat16 instructions (AVX512-BF16 or AMX)."""
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+def set_precision(policy):
+    """Set the global Keras precision policy, falling back to float32 without bfloat16 support.
+    
+    Under mixed_bfloat16 layers compute in bfloat16 and keep float32 weights.
+    """
+    import tensorflow as tf
+    
+    if policy == 'mixed_bfloat16' and not bfloat16_supported():
+        print("⚠️  This CPU has no native bfloat16 support, training in float32")
+        policy = 'float32'
+    tf.keras.mixed_precision.set_global_policy(policy)
+    return policy
+
+def create_step_timer():
+    """Callback timing training steps/sec per epoch, excluding the first (compiling) epoch from the mean."""
+    import tensorflow as tf
+    
+    class StepTimer(tf.keras.callbacks.Callback):
+        def __init__(self):
+            super().__init__()
+            self.rates = []
+        
+        def on_epoch_begin(self, epoch, logs=None):
+            self.steps = 0
+            self.start_time = time.perf_counter()
+        
+        def on_train_batch_end(self, batch, logs=None):
+            self.steps += 1
+            self.end_time = time.perf_counter()
+        
+        def on_epoch_end(self, epoch, logs=None):
+            # Timed up to the last training batch, so validation is not counted
+            rate = self.steps / (self.end_time - self.start_time)
+            self.rates.append(rate)
+            print(f"⚡ {rate:.2f} steps/sec")
+        
+        def steps_per_sec(self):
+            return float(np.mean(self.rates[1:] or self.rates)) if self.rates else 0.0
+    
+    return StepTimer()
+
+def create_trace_callback():
+    """Callback recording epochs, training steps and validation passes as trace spans.
+    
+    Gaps between consecutive train_step spans are time spent waiting for input.
+    """
+    import tensorflow as tf
+    
+    class TraceCallback(tf.keras.callbacks.Callback):
+        def on_epoch_begin(self, epoch, logs=None):
+            self.epoch_start = time.perf_counter()
+        
+        def on_train_batch_begin(self, batch, logs=None):
+            self.batch_start = time.perf_counter()
+        
+        def on_train_batch_end(self, batch, logs=None):
+            tracing.add_span("train_step", self.batch_start, time.perf_counter())
+            tracing.count("train_steps")
+        
+        def on_test_begin(self, logs=None):
+            self.test_start = time.perf_counter()
+        
+        def on_test_end(self, logs=None):
+            tracing.add_span("validation", self.test_start, time.perf_counter())
+        
+        def on_epoch_end(self, epoch, logs=None):
+            metrics = {name: float(value) for name, value in (logs or {}).items()}
+            tracing.add_span("epoch", self.epoch_start, time.perf_counter(), {"epoch": epoch + 1, **metrics})
+    
+    return TraceCallback()
+
+# Layers of the classification head, shared by the full and head-only models
+HEAD_LAYERS = ['head_dense_1', 'head_dense_2', 'head_predictions']
+
+def add_classification_head(x, num_classes):
+    """Add the Dense/Dropout classification layers on top of pooled features."""
+    from tensorflow.keras.layers import Dense, Dropout
+    
+    x = Dense(1024, activation='relu', name='head_dense_1')(x)
+    x = Dropout(0.5, name='head_dropout_1')(x)
+    x = Dense(512, activation='relu', name='head_dense_2')(x)
+    x = Dropout(0.3, name='head_dropout_2')(x)
+    # Softmax stays in float32 under mixed precision for stable probabilities
+    return Dense(num_classes, activation='softmax', dtype='float32', name='head_predictions')(x)
+
+def create_model(num_classes, jit_compile=False, img_size=IMG_SIZE):
     """Create the neural network model."""
-    print(f"\n🏗️ Creating model for {num_classes} classes...")
+    from tensorflow.keras.applications import MobileNetV2
+    from tensorflow.keras.layers import GlobalAveragePooling2D
+    from tensorflow.keras.models import Model
+    from tensorflow.keras.optimizers import Adam
+    
+    print(f"\n🏗️ Creating model for {num_classes} classes ({img_size}x{img_size} input)...")
     
     # Use MobileNetV2 as base model (good for mobile deployment)
     base_model = MobileNetV2(
         weights='imagenet',
         include_top=False,
-        input_shape=(IMG_SIZE, IMG_SIZE, 3)
+        input_shape=(img_size, img_size, 3)
     )
     
     # Freeze base model layers
@@ -96,11 +231,7 @@ def create_model(num_classes):
     # Add custom classification layers
     x = base_model.output
     x = GlobalAveragePooling2D()(x)
-    x = Dense(1024, activation='relu')(x)
-    x = Dropout(0.5)(x)
-    x = Dense(512, activation='relu')(x)
-    x = Dropout(0.3)(x)
-    predictions = Dense(num_classes, activation='softmax')(x)
+    predictions = add_classification_head(x, num_classes)
     
     model = Model(inputs=base_model.input, outputs=predictions)
     
@@ -108,7 +239,8 @@ def create_model(num_classes):
     model.compile(
         optimizer=Adam(learning_rate=LEARNING_RATE),
         loss='sparse_categorical_crossentropy',
-        metrics=['accuracy']
+        metrics=['accuracy'],
+        jit_compile=jit_compile
     )
     
     print(f"Model created successfully!")
@@ -116,14 +248,39 @@ def create_model(num_classes):
     
     return model
 
-def train_model(model, X_train, y_train, X_val, y_val, label_names):
-    """Train the model with callbacks."""
-    print(f"\n🎯 Starting training...")
-    print(f"Training samples: {len(X_train)}")
-    print(f"Validation samples: {len(X_val)}")
+def create_head_model(num_classes, feature_dim, jit_compile=False):
+    """Create the classification head alone, fed with cached backbone embeddings."""
+    from tensorflow.keras.layers import Input
+    from tensorflow.keras.models import Model
+    from tensorflow.keras.optimizers import Adam
     
-    # Data augmentation for training
-    datagen = ImageDataGenerator(
+    inputs = Input(shape=(feature_dim,))
+    model = Model(inputs=inputs, outputs=add_classification_head(inputs, num_classes))
+    
+    model.compile(
+        optimizer=Adam(learning_rate=LEARNING_RATE),
+        loss='sparse_categorical_crossentropy',
+        metrics=['accuracy'],
+        jit_compile=jit_compile
+    )
+    
+    return model
+
+def attach_backbone(head_model, num_classes, img_size=IMG_SIZE):
+    """Build the full model and copy the trained head weights into it."""
+    import tensorflow as tf
+    
+    tf.keras.mixed_precision.set_global_policy('float32')
+    model = create_model(num_classes, img_size=img_size)
+    for name in HEAD_LAYERS:
+        model.get_layer(name).set_weights(head_model.get_layer(name).get_weights())
+    return model
+
+def create_augmentation():
+    """Data augmentation used for training."""
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+    
+    return ImageDataGenerator(
         rotation_range=20,
         width_shift_range=0.2,
         height_shift_range=0.2,
@@ -131,18 +288,23 @@ def train_model(model, X_train, y_train, X_val, y_val, label_names):
         zoom_range=0.2,
         brightness_range=[0.8, 1.2]
     )
+
+def create_callbacks(checkpoint_path='best_berlin_landmarks_model.h5'):
+    """Training callbacks."""
+    from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint, ReduceLROnPlateau
     
-    # Callbacks
-    callbacks = [
+    return [
         EarlyStopping(
             monitor='val_accuracy',
+            mode='max',
             patience=10,
             restore_best_weights=True,
             verbose=1
         ),
         ModelCheckpoint(
-            'best_berlin_landmarks_model.h5',
+            checkpoint_path,
             monitor='val_accuracy',
+            mode='max',
             save_best_only=True,
             verbose=1
         ),
@@ -154,15 +316,54 @@ def train_model(model, X_train, y_train, X_val, y_val, label_names):
             verbose=1
         )
     ]
+
+def train_model(model, X_train, y_train, X_val, y_val, label_names, resume=False):
+    """Train the model with callbacks."""
+    # Data augmentation for training
+    datagen = create_augmentation()
     
-    # Train the model
-    history = model.fit(
+    return fit_model(
+        model,
         datagen.flow(X_train, y_train, batch_size=BATCH_SIZE),
-        validation_data=(X_val, y_val),
-        epochs=EPOCHS,
-        callbacks=callbacks,
-        verbose=1
+        (X_val, y_val),
+        len(X_train), len(X_val),
+        resume=resume
     )
+
+def fit_model(model, train_data, val_data, n_train, n_val,
+              checkpoint_path='best_berlin_landmarks_model.h5', resume=False):
+    """Train the model on batched training/validation inputs with callbacks.
+    
+    Full training state is checkpointed every epoch under CHECKPOINT_DIR
+    (one folder per checkpoint_path); with `resume` the run continues from
+    the newest checkpoint instead of epoch 0.
+    """
+    print(f"\n🎯 Starting training...")
+    print(f"Training samples: {n_train}")
+    print(f"Validation samples: {n_val}")
+    
+    callbacks = create_callbacks(checkpoint_path)
+    state_dir = os.path.join(CHECKPOINT_DIR, os.path.splitext(os.path.basename(checkpoint_path))[0])
+    if not resume:
+        shutil.rmtree(state_dir, ignore_errors=True)
+    full_state = create_full_state_checkpoint(state_dir, callbacks)
+    initial_epoch = full_state.load_latest() if resume else 0
+    
+    step_timer = create_step_timer()
+    trace = [create_trace_callback()] if tracing.enabled() else []
+    try:
+        with tracing.span("fit", samples=n_train):
+            history = model.fit(
+                train_data,
+                validation_data=val_data,
+                epochs=EPOCHS,
+                initial_epoch=initial_epoch,
+                callbacks=callbacks + [full_state, step_timer] + trace,
+                verbose=1
+            )
+    finally:
+        full_state.close()
+    print(f"⚡ Mean training speed: {step_timer.steps_per_sec():.2f} steps/sec")
     
     return history
 
@@ -171,7 +372,8 @@ def evaluate_model(model, X_test, y_test, label_names):
     print(f"\n📊 Evaluating model...")
     
     # Predictions
-    predictions = model.predict(X_test)
+    with tracing.span("evaluate"):
+        predictions = model.predict(X_test)
     predicted_classes = np.argmax(predictions, axis=1)
     
     # Calculate accuracy
@@ -189,11 +391,22 @@ def evaluate_model(model, X_test, y_test, label_names):
 
 def save_model_and_labels(model, label_names):
     """Save the model and label mapping."""
+    import tensorflow as tf
+    
     print(f"\n💾 Saving model and labels...")
     
+    # Mixed-precision models are saved as their float32 equivalent, so
+    # convert_to_tflite.py gets the same artifact as in the default mode
+    if tf.keras.mixed_precision.global_policy().name != 'float32':
+        trained = model
+        tf.keras.mixed_precision.set_global_policy('float32')
+        model = create_model(len(label_names), img_size=trained.input_shape[1])
+        model.set_weights(trained.get_weights())
+    
     # Save the model
-    model.save('berlin_landmarks_model.h5')
-    print(f"Model saved as: berlin_landmarks_model.h5")
+    with tracing.span("save_model"):
+        model.save('berlin_landmarks_model.h5')
+    print(f"Model saved as: berlin_landmarks_model.h5 ({model.input_shape[1]}x{model.input_shape[2]} input)")
     
     # Save label names
     with open('landmark_labels.txt', 'w') as f:
@@ -208,6 +421,8 @@ def save_model_and_labels(model, label_names):
 
 def plot_training_history(history):
     """Plot training history."""
+    import matplotlib.pyplot as plt
+    
     print(f"\n📈 Plotting training history...")
     
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 5))
@@ -234,31 +449,21 @@ def plot_training_history(history):
     plt.savefig('training_history.png', dpi=300, bbox_inches='tight')
     print(f"Training history saved as: training_history.png")
 
-def main():
-    """Main training function."""
-    print("🏛️ Berlin Landmarks ML Model Training")
-    print("=" * 50)
-    
-    # Check if processed data exists
-    if not os.path.exists("."):
-        print("❌ Error: No processed data found!")
-        print("Please run prepare_images.py first.")
-        return
-    
+def run_training(data_dir, jit_compile=False, resume=False, img_size=IMG_SIZE):
+    """Load the processed folders into memory, then train and evaluate."""
     # Load data
-    X, y, label_names = load_and_preprocess_data(".")
+    with tracing.span("load_dataset"):
+        X, y, label_names, files = load_and_preprocess_data(data_dir, img_size)
     
     if len(X) == 0:
         print("❌ No images found! Please add images to the folders first.")
-        return
+        return None, None
     
     # Split data
-    X_train, X_temp, y_train, y_temp = train_test_split(
-        X, y, test_size=0.3, random_state=42, stratify=y
-    )
-    X_val, X_test, y_val, y_test = train_test_split(
-        X_temp, y_temp, test_size=0.5, random_state=42, stratify=y_temp
-    )
+    train_idx, val_idx, test_idx = split_indices(y, files)
+    X_train, y_train = X[train_idx], y[train_idx]
+    X_val, y_val = X[val_idx], y[val_idx]
+    X_test, y_test = X[test_idx], y[test_idx]
     
     print(f"\n📊 Data Split:")
     print(f"  Training: {len(X_train)} images")
@@ -266,10 +471,10 @@ def main():
     print(f"  Test: {len(X_test)} images")
     
     # Create model
-    model = create_model(len(label_names))
+    model = create_model(len(label_names), jit_compile, img_size)
     
     # Train model
-    history = train_model(model, X_train, y_train, X_val, y_val, label_names)
+    history = train_model(model, X_train, y_train, X_val, y_val, label_names, resume)
     
     # Evaluate model
     accuracy, cm = evaluate_model(model, X_test, y_test, label_names)
@@ -277,6 +482,219 @@ def main():
     # Save model and labels
     save_model_and_labels(model, label_names)
     
+    return history, accuracy
+
+def run_streaming_training(pack_dir, pipeline, cache_dir=TFDATA_CACHE_DIR, jit_compile=False, resume=False,
+                           img_size=IMG_SIZE):
+    """Train and evaluate without loading the whole dataset into memory.
+    
+    Samples come from a packed dataset when `pack_dir` is given, otherwise
+    (tf.data pipeline only) straight from the processed JPEG folders.
+    """
+    if pack_dir:
+        images, labels, label_names = load_packed_dataset(pack_dir)
+        if len(images) and images.shape[1:3] != (img_size, img_size):
+            print(f"❌ Packed images are {images.shape[1]}x{images.shape[2]}, expected {img_size}x{img_size}")
+            print(f"Repack with: python pack_dataset.py --img-size {img_size}")
+            return None, None
+        files = packed_files(pack_dir)[:len(labels)]
+    else:
+        samples, label_names = find_processed_images(".", img_size)
+        files = np.array([image_file for image_file, _ in samples])
+        labels = np.array([label for _, label in samples], dtype=np.int32)
+        print(f"Found {len(files)} images in {len(label_names)} landmark folders")
+    
+    if len(labels) == 0:
+        print("❌ No images found! Please add images to the folders first.")
+        return None, None
+    
+    train_idx, val_idx, test_idx = split_indices(labels, files)
+    # Evaluation inputs yield samples in sorted index order
+    val_idx = np.sort(val_idx)
+    test_idx = np.sort(test_idx)
+    
+    print(f"\n📊 Data Split:")
+    print(f"  Training: {len(train_idx)} images")
+    print(f"  Validation: {len(val_idx)} images")
+    print(f"  Test: {len(test_idx)} images")
+    
+    if pipeline == 'tfdata' and pack_dir:
+        train_data = make_packed_dataset(images, labels, train_idx, training=True)
+        val_data = make_packed_dataset(images, labels, val_idx)
+        test_data = make_packed_dataset(images, labels, test_idx)
+    elif pipeline == 'tfdata':
+        train_data = make_file_dataset(files[train_idx], labels[train_idx], training=True,
+                                       img_size=img_size, cache_dir=cache_dir)
+        val_data = make_file_dataset(files[val_idx], labels[val_idx], img_size=img_size, cache_dir=cache_dir)
+        test_data = make_file_dataset(files[test_idx], labels[test_idx], img_size=img_size, cache_dir=cache_dir)
+    else:
+        train_data = create_packed_sequence(images, labels, train_idx, datagen=create_augmentation(), shuffle=True)
+        val_data = create_packed_sequence(images, labels, val_idx)
+        test_data = create_packed_sequence(images, labels, test_idx)
+    
+    model = create_model(len(label_names), jit_compile, img_size)
+    history = fit_model(model, train_data, val_data, len(train_idx), len(val_idx), resume=resume)
+    accuracy, cm = evaluate_model(model, test_data, labels[test_idx], label_names)
+    
+    save_model_and_labels(model, label_names)
+    
+    return history, accuracy
+
+def run_head_training(variants=0, cache_dir=EMBEDDING_CACHE_DIR, jit_compile=False, resume=False, img_size=IMG_SIZE):
+    """Train only the classification head on cached backbone embeddings.
+    
+    The frozen backbone runs once per new image (and per augmented variant
+    of training images); the head then trains on the cached vectors and is
+    copied into the full model, so the saved artifacts are unchanged.
+    """
+    import tensorflow as tf
+    
+    samples, label_names = find_processed_images(".", img_size)
+    files = [image_file for image_file, _ in samples]
+    labels = np.array([label for _, label in samples], dtype=np.int32)
+    print(f"Found {len(files)} images in {len(label_names)} landmark folders")
+    
+    if len(labels) == 0:
+        print("❌ No images found! Please add images to the folders first.")
+        return None, None
+    
+    train_idx, val_idx, test_idx = split_indices(labels, files)
+    
+    print(f"\n📊 Data Split:")
+    print(f"  Training: {len(train_idx)} images ({variants} augmented variants each)")
+    print(f"  Validation: {len(val_idx)} images")
+    print(f"  Test: {len(test_idx)} images")
+    
+    cache = EmbeddingCache(cache_dir, img_size)
+    embeddings = embed_files(files, cache)[:, 0]
+    if variants:
+        train_files = [files[i] for i in train_idx]
+        train_embeddings = embed_files(train_files, cache, variants, create_augmentation())
+        X_train = train_embeddings.reshape(-1, train_embeddings.shape[-1])
+        y_train = np.repeat(labels[train_idx], variants + 1)
+    else:
+        X_train = embeddings[train_idx]
+        y_train = labels[train_idx]
+    
+    train_data = tf.data.Dataset.from_tensor_slices((X_train, y_train))
+    train_data = train_data.shuffle(len(X_train)).batch(BATCH_SIZE)
+    
+    head_model = create_head_model(len(label_names), embeddings.shape[1], jit_compile)
+    history = fit_model(
+        head_model,
+        train_data,
+        (embeddings[val_idx], labels[val_idx]),
+        len(X_train), len(val_idx),
+        checkpoint_path='best_berlin_landmarks_head.h5',
+        resume=resume
+    )
+    accuracy, cm = evaluate_model(head_model, embeddings[test_idx], labels[test_idx], label_names)
+    
+    save_model_and_labels(attach_backbone(head_model, len(label_names), img_size), label_names)
+    
+    return history, accuracy
+
+def compare_training_modes(num_classes, steps=BENCHMARK_STEPS, img_size=IMG_SIZE):
+    """Time training steps of the full model for each precision / XLA combination."""
+    import tensorflow as tf
+    
+    print(f"\n⏱️  Comparing training modes ({steps} steps of batch {BATCH_SIZE}, {img_size}x{img_size})...")
+    
+    rng = np.random.default_rng(42)
+    x = rng.random((BATCH_SIZE, img_size, img_size, 3), dtype=np.float32)
+    y = rng.integers(0, num_classes, BATCH_SIZE)
+    data = tf.data.Dataset.from_tensors((x, y)).repeat(steps)
+    
+    policies = ['float32'] + (['mixed_bfloat16'] if bfloat16_supported() else [])
+    results = []
+    for policy in policies:
+        for jit_compile in (False, True):
+            set_precision(policy)
+            model = create_model(num_classes, jit_compile, img_size)
+            # The first epoch traces (and with XLA compiles) the training step
+            step_timer = create_step_timer()
+            model.fit(data, epochs=2, callbacks=[step_timer], verbose=0)
+            results.append((f"{policy}{' + XLA' if jit_compile else ''}", step_timer.steps_per_sec()))
+    
+    print(f"\n{'Mode':<24} {'steps/sec':>10} {'img/sec':>9} {'Speedup':>8}")
+    for mode, rate in results:
+        print(f"{mode:<24} {rate:>10.2f} {rate * BATCH_SIZE:>9.1f} {rate / results[0][1]:>7.2f}x")
+    
+    set_precision('float32')
+    return results
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Train the MobileNetV2 landmark model.")
+    parser.add_argument('--packed', metavar='DIR',
+                        help="load images from a dataset packed by pack_dataset.py")
+    parser.add_argument('--pipeline', choices=['numpy', 'tfdata'], default='numpy',
+                        help="input pipeline: in-memory arrays / packed batches (numpy) "
+                             "or parallel tf.data streaming with in-graph augmentation (tfdata)")
+    parser.add_argument('--cache-dir', default=TFDATA_CACHE_DIR,
+                        help="where tf.data caches decoded images when streaming from disk "
+                             f"(empty = in memory, default: {TFDATA_CACHE_DIR})")
+    parser.add_argument('--cached-embeddings', action='store_true',
+                        help="train only the classification head on cached MobileNetV2 embeddings")
+    parser.add_argument('--augmented-variants', type=int, default=0,
+                        help="cached augmented copies per training image for --cached-embeddings (default: 0)")
+    parser.add_argument('--embedding-cache', default=EMBEDDING_CACHE_DIR,
+                        help=f"embedding cache folder (default: {EMBEDDING_CACHE_DIR})")
+    parser.add_argument('--precision', choices=['float32', 'mixed_bfloat16'], default='float32',
+                        help="Keras precision policy; mixed_bfloat16 needs a CPU with native bfloat16 "
+                             "(saved model stays float32, default: float32)")
+    parser.add_argument('--jit-compile', action='store_true',
+                        help="compile training steps with XLA")
+    parser.add_argument('--performance', action='store_true',
+                        help="shorthand for --precision mixed_bfloat16 --jit-compile")
+    parser.add_argument('--img-size', type=int, default=IMG_SIZE,
+                        help="square input resolution; smaller sizes give faster on-device inference "
+                             f"(uses <landmark>_processed_<size> folders when present, default: {IMG_SIZE})")
+    parser.add_argument('--resume', action='store_true',
+                        help=f"continue an interrupted run from its newest checkpoint in {CHECKPOINT_DIR}/")
+    parser.add_argument('--compare-modes', action='store_true',
+                        help="time training steps for every precision / XLA combination and exit")
+    return parser.parse_args()
+
+def main():
+    """Main training function."""
+    args = parse_args()
+    
+    print("🏛️ Berlin Landmarks ML Model Training")
+    print("=" * 50)
+    
+    # Check if processed data exists
+    data_dir = args.packed or "."
+    if not os.path.exists(data_dir):
+        print("❌ Error: No processed data found!")
+        print("Please run prepare_images.py (and pack_dataset.py for --packed) first.")
+        return
+    
+    if args.compare_modes:
+        _, label_names = find_processed_images(".", args.img_size)
+        compare_training_modes(max(len(label_names), 2), img_size=args.img_size)
+        return
+    
+    policy = set_precision('mixed_bfloat16' if args.performance else args.precision)
+    jit_compile = args.performance or args.jit_compile
+    if policy != 'float32' or jit_compile:
+        print(f"⚡ Training mode: {policy}, XLA jit_compile={jit_compile}")
+    
+    # Load data, train, evaluate and save
+    if args.cached_embeddings:
+        history, accuracy = run_head_training(
+            args.augmented_variants, args.embedding_cache, jit_compile, args.resume, args.img_size
+        )
+    elif args.packed or args.pipeline == 'tfdata':
+        history, accuracy = run_streaming_training(
+            args.packed, args.pipeline, args.cache_dir, jit_compile, args.resume, args.img_size
+        )
+    else:
+        history, accuracy = run_training(".", jit_compile, args.resume, args.img_size)
+    
+    if history is None:
+        return
+    
     # Plot training history
     plot_training_history(history)
     
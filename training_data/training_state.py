@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Resumable training state for the Berlin landmarks trainer
+Periodically snapshots everything a Keras run needs to continue after an
+interruption (weights, optimizer slots, learning rate, epoch, callback
+counters and RNG states) and writes it on a background thread, keeping
+only the newest few checkpoints.
+"""
+
+import os
+import json
+import queue
+import random
+import shutil
+import threading
+import numpy as np
+
+CHECKPOINT_DIR = "training_checkpoints"
+KEEP_CHECKPOINTS = 3
+CHECKPOINT_EVERY = 1
+
+# Counters kept by EarlyStopping, ReduceLROnPlateau and ModelCheckpoint
+CALLBACK_ATTRIBUTES = ['wait', 'best', 'best_epoch', 'stopped_epoch', 'cooldown_counter']
+
+def _to_json(value):
+    """Plain Python value for numpy scalars in callback state."""
+    return value.item() if isinstance(value, np.generic) else value
+
+class AsyncCheckpointWriter:
+    """Writes checkpoint folders on a background thread.
+
+    Each checkpoint is written to a temporary folder and renamed into place,
+    so an interrupted write never leaves a half-written checkpoint behind.
+    At most one snapshot waits in the queue; a second one blocks training
+    until the disk catches up, bounding memory.
+    """
+
+    def __init__(self, directory, keep=KEEP_CHECKPOINTS):
+        self.directory = directory
+        self.keep = keep
+        self.pending = queue.Queue(maxsize=1)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, name, arrays, state):
+        if self.error:
+            raise self.error
+        self.pending.put((name, arrays, state))
+
+    def _run(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            try:
+                self._write(*item)
+            except Exception as e:
+                self.error = e
+
+    def _write(self, name, arrays, state):
+        os.makedirs(self.directory, exist_ok=True)
+        target = os.path.join(self.directory, name)
+        temp = target + '.tmp'
+        shutil.rmtree(temp, ignore_errors=True)
+        os.makedirs(temp)
+
+        for group, values in arrays.items():
+            np.savez(os.path.join(temp, f"{group}.npz"), *values)
+        with open(os.path.join(temp, 'state.json'), 'w') as f:
+            json.dump(state, f, indent=2)
+
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(temp, target)
+
+        # Rotate: keep only the newest checkpoints
+        for old in list_checkpoints(self.directory)[:-self.keep]:
+            shutil.rmtree(os.path.join(self.directory, old), ignore_errors=True)
+
+    def close(self):
+        """Wait for queued writes to finish."""
+        self.pending.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
+
+def list_checkpoints(directory):
+    """Completed checkpoint folders, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory)
+                  if name.startswith('epoch-') and not name.endswith('.tmp'))
+
+def _load_arrays(path):
+    with np.load(path) as data:
+        return [data[f"arr_{i}"] for i in range(len(data.files))]
+
+def create_full_state_checkpoint(directory, tracked_callbacks, every=CHECKPOINT_EVERY, keep=KEEP_CHECKPOINTS):
+    """Callback that saves and restores the complete training state of a Keras run.
+
+    Put it after the callbacks whose state it tracks: Keras resets their
+    counters in on_train_begin, and this callback restores them right after.
+    """
+    import tensorflow as tf
+
+    class FullStateCheckpoint(tf.keras.callbacks.Callback):
+        def __init__(self, directory, tracked_callbacks, every=CHECKPOINT_EVERY, keep=KEEP_CHECKPOINTS):
+            super().__init__()
+            self.directory = directory
+            self.tracked = tracked_callbacks
+            self.every = every
+            self.writer = AsyncCheckpointWriter(directory, keep)
+            self.restored = None
+
+        def load_latest(self):
+            """Read the newest checkpoint; returns the epoch to resume from (0 if none)."""
+            checkpoints = list_checkpoints(self.directory)
+            if not checkpoints:
+                return 0
+            path = os.path.join(self.directory, checkpoints[-1])
+            with open(os.path.join(path, 'state.json'), 'r') as f:
+                state = json.load(f)
+            arrays = {
+                name[:-4]: _load_arrays(os.path.join(path, name))
+                for name in os.listdir(path) if name.endswith('.npz')
+            }
+            self.restored = (state, arrays)
+            print(f"♻️  Resuming from {path} (epoch {state['epoch']})")
+            return state['epoch']
+
+        def on_train_begin(self, logs=None):
+            if self.restored is None:
+                return
+            state, arrays = self.restored
+            model = self.model
+
+            # Model variables include dropout seed generators, unlike get_weights()
+            for variable, value in zip(model.variables, arrays['variables']):
+                variable.assign(value)
+            optimizer = model.optimizer
+            optimizer.build(model.trainable_variables)
+            for variable, value in zip(optimizer.variables, arrays['optimizer']):
+                variable.assign(value)
+            optimizer.learning_rate = state['learning_rate']
+
+            for callback, saved in zip(self.tracked, state['callbacks']):
+                for name, value in saved.items():
+                    setattr(callback, name, value)
+                if 'best_weights' in arrays and hasattr(callback, 'best_weights'):
+                    callback.best_weights = arrays['best_weights']
+
+            random.setstate((state['python_rng'][0], tuple(state['python_rng'][1]), state['python_rng'][2]))
+            np.random.set_state((state['numpy_rng'][0], arrays['numpy_rng'][0], *state['numpy_rng'][1:]))
+            tf.random.get_global_generator().reset(arrays['tf_rng'][0])
+            self.restored = None
+
+        def on_epoch_end(self, epoch, logs=None):
+            if (epoch + 1) % self.every:
+                return
+
+            # Copy everything on the training thread; only the disk write is deferred
+            optimizer = self.model.optimizer
+            numpy_rng = np.random.get_state()
+            python_rng = random.getstate()
+            arrays = {
+                "variables": [variable.numpy() for variable in self.model.variables],
+                "optimizer": [variable.numpy() for variable in optimizer.variables],
+                "numpy_rng": [numpy_rng[1]],
+                "tf_rng": [tf.random.get_global_generator().state.numpy()],
+            }
+            callbacks = []
+            for callback in self.tracked:
+                callbacks.append({name: _to_json(getattr(callback, name))
+                                  for name in CALLBACK_ATTRIBUTES if hasattr(callback, name)})
+                if getattr(callback, 'best_weights', None) is not None:
+                    arrays["best_weights"] = [np.array(w) for w in callback.best_weights]
+
+            state = {
+                "epoch": epoch + 1,
+                "learning_rate": float(optimizer.learning_rate.numpy()),
+                "callbacks": callbacks,
+                "python_rng": [python_rng[0], list(python_rng[1]), python_rng[2]],
+                "numpy_rng": [numpy_rng[0], *[_to_json(v) for v in numpy_rng[2:]]],
+                "logs": {name: float(value) for name, value in (logs or {}).items()},
+            }
+            self.writer.submit(f"epoch-{epoch + 1:04d}", arrays, state)
+
+        def close(self):
+            """Flush pending checkpoint writes."""
+            self.writer.close()
+
+    return FullStateCheckpoint(directory, tracked_callbacks, every, keep)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Watch mode for Berlin landmarks image preparation
+Polls the landmark folders and keeps the *_processed folders up to date
+while new photos keep arriving. Bursts are debounced per folder, only
+new or changed images go to a bounded process pool, and every finished
+update is appended to an events file and counted in a state file that a
+retrain trigger can poll.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from prepare_images import (
+    DEFAULT_PRESET, DEFAULT_SIZE, LANDMARK_FOLDERS, RESIZE_PRESETS, _pool_resize_task, find_images,
+    plan_sizes, processed_folder_name, remove_stale_outputs, save_manifest
+)
+import tracing
+
+POLL_INTERVAL = 1.0
+DEBOUNCE_SECONDS = 2.0
+MAX_DELAY_SECONDS = 10.0
+TASKS_PER_WORKER = 4
+EVENTS_PATH = "watch_events.jsonl"
+STATE_PATH = "watch_state.json"
+
+def snapshot(landmark_folder):
+    """(size, mtime_ns) of every source image in a landmark folder."""
+    files = {}
+    for path in find_images(landmark_folder):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            # Deleted between listing and stat; the next poll sees it gone
+            continue
+        files[path] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+def load_state(path=STATE_PATH):
+    """Counters of earlier watch runs, so generations keep increasing across restarts."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"generation": 0, "images_processed": 0, "images_failed": 0, "sources_removed": 0, "folders": {}}
+
+class FolderState:
+    """Debounce state of one landmark folder.
+
+    A folder becomes dirty when its snapshot changes, and is processed once
+    it has been quiet for `debounce` seconds, or `max_delay` seconds after
+    it first became dirty while changes keep coming. A folder is never
+    planned again while its previous update is still in the pool.
+    """
+
+    def __init__(self, landmark_folder, now, debounce):
+        self.folder = landmark_folder
+        self.files = None
+        # Start dirty, to catch up with changes made while nothing was watching
+        self.dirty_since = now
+        self.last_change = now - debounce
+        self.update = None
+
+    def observe(self, files, now):
+        if files != self.files:
+            if self.files is not None:
+                self.last_change = now
+                if self.dirty_since is None:
+                    self.dirty_since = now
+            self.files = files
+
+    def ready(self, now, debounce, max_delay):
+        if self.dirty_since is None or self.update is not None:
+            return False
+        return now - self.last_change >= debounce or now - self.dirty_since >= max_delay
+
+class FolderUpdate:
+    """One planned update of a landmark folder while its images are in the pool."""
+
+    def __init__(self, landmark_folder, plans, work, detected):
+        self.folder = landmark_folder
+        self.plans = plans
+        self.remaining = len(work)
+        self.processed = 0
+        self.failed = 0
+        self.detected = detected
+        # Sources whose outputs were removed (the most over all sizes)
+        self.removed = max((len(stale) for _, stale in plans.values()), default=0)
+
+class Watcher:
+    """Polls landmark folders and feeds changed images to a bounded process pool."""
+
+    def __init__(self, landmark_folders, sizes=(DEFAULT_SIZE,), preset=DEFAULT_PRESET, workers=1,
+                 debounce=DEBOUNCE_SECONDS, max_delay=MAX_DELAY_SECONDS, skip=frozenset(),
+                 events_path=EVENTS_PATH, state_path=STATE_PATH):
+        now = time.monotonic()
+        self.folders = [FolderState(folder, now, debounce) for folder in landmark_folders]
+        self.sizes = sizes
+        self.preset = preset
+        self.workers = workers
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.skip = skip
+        self.events_path = events_path
+        self.state_path = state_path
+        self.state = load_state(state_path)
+        self.queue = deque()
+        self.in_flight = {}
+        self.max_in_flight = workers * TASKS_PER_WORKER
+
+    def scan(self):
+        """Snapshot every folder and start updates of the ones that settled."""
+        now = time.monotonic()
+        with tracing.span("watch_scan"):
+            for folder in self.folders:
+                folder.observe(snapshot(folder.folder), now)
+        for folder in self.folders:
+            if folder.ready(now, self.debounce, self.max_delay):
+                self.start_update(folder)
+
+    def start_update(self, folder):
+        """Plan a folder against its manifests and queue its new or changed images."""
+        detected = folder.dirty_since
+        folder.dirty_since = None
+        with tracing.span("plan", folder=folder.folder):
+            _, plans, work = plan_sizes(folder.folder, self.sizes, preset=self.preset, skip=self.skip)
+        for _, stale_outputs in plans.values():
+            remove_stale_outputs(stale_outputs)
+
+        update = FolderUpdate(folder.folder, plans, work, detected)
+        if work:
+            print(f"🔄 {folder.folder}: {len(work)} new or changed images")
+        folder.update = update
+        for image_path, outputs in work:
+            task = (image_path, [(output_path, (size, size)) for output_path, size, _ in outputs], self.preset)
+            self.queue.append((folder, update, image_path, outputs, task))
+        if not work:
+            self.finish_update(folder)
+
+    def submit(self, executor):
+        """Move queued images into the pool, keeping at most max_in_flight there."""
+        while self.queue and len(self.in_flight) < self.max_in_flight:
+            folder, update, image_path, outputs, task = self.queue.popleft()
+            self.in_flight[executor.submit(_pool_resize_task, task)] = (folder, update, image_path, outputs)
+
+    def collect(self, timeout):
+        """Record finished images; finish the folder updates they complete."""
+        if not self.in_flight:
+            time.sleep(timeout)
+            return
+        done, _ = wait(self.in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            folder, update, image_path, outputs = self.in_flight.pop(future)
+            ok, elapsed, recorded = future.result()
+            tracing.merge(recorded)
+            filename = os.path.basename(image_path)
+            if ok:
+                for _, size, entry in outputs:
+                    update.plans[size][0][image_path] = entry
+                update.processed += 1
+                print(f"✅ {filename} ({elapsed * 1000:.1f} ms)")
+            else:
+                update.failed += 1
+                print(f"❌ {filename}")
+            update.remaining -= 1
+            if update.remaining == 0:
+                self.finish_update(folder)
+
+    def finish_update(self, folder):
+        """Save the folder's manifests and publish an event when anything changed."""
+        update = folder.update
+        folder.update = None
+        for size, (up_to_date, _) in update.plans.items():
+            save_manifest(processed_folder_name(update.folder, size), up_to_date, size, self.preset)
+        if not (update.processed or update.failed or update.removed):
+            return
+
+        state = self.state
+        state["generation"] += 1
+        state["images_processed"] += update.processed
+        state["images_failed"] += update.failed
+        state["sources_removed"] += update.removed
+        state["folders"][update.folder] = state["generation"]
+        latency = time.monotonic() - update.detected
+        event = {
+            "generation": state["generation"],
+            "time": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "folder": update.folder,
+            "processed": update.processed,
+            "failed": update.failed,
+            "removed": update.removed,
+            "latency_s": round(latency, 3),
+        }
+
+        # Append the event first: a consumer that sees a new generation finds its event
+        with open(self.events_path, 'a') as f:
+            f.write(json.dumps(event) + "\n")
+        state["updated"] = event["time"]
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+        tracing.count("watch_images_processed", update.processed)
+        tracing.count("watch_updates")
+        print(f"📤 Update {state['generation']}: {update.folder} +{update.processed} processed, "
+              f"{update.failed} failed, {update.removed} removed, {latency:.2f}s after the first change")
+
+    def idle(self):
+        """Whether nothing is dirty, queued or in the pool."""
+        return not self.queue and not self.in_flight and all(
+            folder.dirty_since is None and folder.update is None for folder in self.folders
+        )
+
+    def run(self, interval=POLL_INTERVAL, once=False):
+        """Poll until interrupted (or, with `once`, until the first catch-up is done)."""
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            last_scan = None
+            while True:
+                now = time.monotonic()
+                if last_scan is None or now - last_scan >= interval:
+                    self.scan()
+                    last_scan = now
+                self.submit(executor)
+                if once and self.idle():
+                    return
+                self.collect(max(0.0, interval - (time.monotonic() - last_scan)))
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Keep the *_processed folders up to date as new images arrive.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes resizing images (0 = all CPU cores, default: 1)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[DEFAULT_SIZE],
+                        help=f"square output resolutions, as in prepare_images.py (default: {DEFAULT_SIZE})")
+    parser.add_argument('--preset', choices=list(RESIZE_PRESETS), default=DEFAULT_PRESET,
+                        help=f"decode/resize preset, as in prepare_images.py (default: {DEFAULT_PRESET})")
+    parser.add_argument('--skip-duplicates', action='store_true',
+                        help="leave out near-duplicates found by dedup.py, keeping one image per group")
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL,
+                        help=f"seconds between folder scans (default: {POLL_INTERVAL})")
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE_SECONDS,
+                        help=f"seconds a folder must be unchanged before it is processed (default: {DEBOUNCE_SECONDS})")
+    parser.add_argument('--max-delay', type=float, default=MAX_DELAY_SECONDS,
+                        help="longest a change waits while a folder keeps changing "
+                             f"(default: {MAX_DELAY_SECONDS})")
+    parser.add_argument('--events', default=EVENTS_PATH,
+                        help=f"JSON lines file each finished update is appended to (default: {EVENTS_PATH})")
+    parser.add_argument('--state', default=STATE_PATH,
+                        help=f"counter file with the latest update generation (default: {STATE_PATH})")
+    parser.add_argument('--once', action='store_true',
+                        help="process whatever changed since the last run, then exit")
+    return parser.parse_args()
+
+def main():
+    """Watch the landmark folders until interrupted."""
+    args = parse_args()
+    workers = args.workers or os.cpu_count() or 1
+
+    print("👀 Berlin Landmarks Image Watcher")
+    print("=" * 50)
+
+    landmark_folders = [folder for folder in LANDMARK_FOLDERS if os.path.exists(folder)]
+    if not landmark_folders:
+        print("❌ No landmark folders found!")
+        sys.exit(1)
+
+    skip = frozenset()
+    if args.skip_duplicates:
+        from dedup import INDEX_PATH, duplicate_keys, load_index
+        index = load_index()
+        if index is None:
+            print(f"❌ Error: {INDEX_PATH} not found! Run dedup.py first.")
+            sys.exit(1)
+        skip = duplicate_keys(index)
+
+    watcher = Watcher(landmark_folders, args.sizes, args.preset, workers, args.debounce, args.max_delay,
+                      skip, args.events, args.state)
+    print(f"📂 Watching {len(landmark_folders)} folders every {args.interval:g}s "
+          f"({workers} worker(s), {args.debounce:g}s debounce, {args.max_delay:g}s max delay)")
+    print(f"📤 Events: {args.events}, counter: {args.state} (generation {watcher.state['generation']})")
+    try:
+        watcher.run(args.interval, args.once)
+    except KeyboardInterrupt:
+        print("\n👋 Stopped; unfinished images are picked up on the next run")
+
+if __name__ == "__main__":
+    main()